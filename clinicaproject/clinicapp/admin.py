@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Service, Specialist, Appointment, PacienteProfile
+from .models import (
+    Service, Specialist, Appointment, AppointmentAudit, PacienteProfile, WorkingHours, TimeOff, Holiday,
+    WaitlistEntry, Notification,
+)
 
 # ---------------------------------------------------
 # ADMIN DEL PERFIL DEL PACIENTE
@@ -15,19 +18,43 @@ class PacienteProfileAdmin(admin.ModelAdmin):
 # ---------------------------------------------------
 @admin.register(Service)
 class ServiceAdmin(admin.ModelAdmin):
-    list_display = ('name', 'price')
+    list_display = ('name', 'price', 'duration_minutes')
     search_fields = ('name',)
     list_filter = ('price',)
+    filter_horizontal = ('specialists',)
 
 
 # ---------------------------------------------------
 # ADMIN DE ESPECIALISTAS
 # ---------------------------------------------------
+class WorkingHoursInline(admin.TabularInline):
+    model = WorkingHours
+    extra = 0
+
+
 @admin.register(Specialist)
 class SpecialistAdmin(admin.ModelAdmin):
-    list_display = ('first_name', 'last_name', 'specialty', 'email')
+    list_display = ('first_name', 'last_name', 'specialty', 'email', 'user')
     search_fields = ('first_name', 'last_name', 'email')
+    raw_id_fields = ('user',)
     list_filter = ('specialty',)
+    inlines = [WorkingHoursInline]
+
+
+# ---------------------------------------------------
+# ADMIN DE AUSENCIAS Y FERIADOS
+# ---------------------------------------------------
+@admin.register(TimeOff)
+class TimeOffAdmin(admin.ModelAdmin):
+    list_display = ('specialist', 'kind', 'start_date', 'end_date', 'reason')
+    list_filter = ('kind', 'specialist')
+    date_hierarchy = 'start_date'
+
+
+@admin.register(Holiday)
+class HolidayAdmin(admin.ModelAdmin):
+    list_display = ('date', 'name')
+    date_hierarchy = 'date'
 
 
 # ---------------------------------------------------
@@ -48,3 +75,42 @@ class AppointmentAdmin(admin.ModelAdmin):
     list_filter = ('status', 'service', 'specialist', 'date')
     search_fields = ('patient__username',)
     ordering = ('date', 'time')
+
+
+# ---------------------------------------------------
+# ADMIN DE LISTA DE ESPERA
+# ---------------------------------------------------
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('patient', 'service', 'specialist', 'start_date', 'end_date', 'status', 'appointment')
+    list_filter = ('status', 'service', 'specialist')
+    search_fields = ('patient__username',)
+    raw_id_fields = ('patient', 'appointment')
+
+
+# ---------------------------------------------------
+# ADMIN DE AVISOS (OUTBOX)
+# ---------------------------------------------------
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ('appointment', 'kind', 'recipient', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'kind')
+    search_fields = ('recipient', 'appointment__id')
+    raw_id_fields = ('appointment',)
+
+
+# ---------------------------------------------------
+# ADMIN DE AUDITORÍA DE CITAS (solo lectura)
+# ---------------------------------------------------
+@admin.register(AppointmentAudit)
+class AppointmentAuditAdmin(admin.ModelAdmin):
+    list_display = ('appointment', 'transition', 'from_status', 'to_status', 'actor', 'created_at')
+    list_filter = ('transition', 'to_status')
+    search_fields = ('appointment__id', 'actor__username')
+    raw_id_fields = ('appointment', 'actor')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
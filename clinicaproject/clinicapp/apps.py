@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ClinicappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'clinicapp'
+
+    def ready(self):
+        # Registra los receptores de señales
+        from . import signals  # noqa: F401
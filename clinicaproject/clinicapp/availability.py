@@ -0,0 +1,407 @@
+import heapq
+import logging
+from datetime import date, datetime, time, timedelta
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import checks
+from django.utils import timezone
+
+from .models import Appointment, Holiday, Specialist, SpecialistAvailability, TimeOff, WorkingHours
+
+# --- CONFIGURACIÓN DE LA GRILLA DE HORARIOS ---
+# Valores por defecto equivalentes al horario fijo original (09:00 a 17:00, cada hora).
+# Se pueden sobrescribir desde settings.py.
+DEFAULT_OPENING_TIME = time(9, 0)
+DEFAULT_CLOSING_TIME = time(18, 0)
+DEFAULT_SLOT_MINUTES = 60
+
+# Semanas hacia adelante que se mantienen en SpecialistAvailability
+DEFAULT_AVAILABILITY_WEEKS = 8
+
+# Las máscaras se guardan en un BigIntegerField (con signo): hasta 63 slots por día.
+# Una grilla más fina no se guarda y se calcula en cada consulta (se avisa con
+# el check clinicapp.W001 y una vez por proceso en el log).
+MAX_STORED_SLOTS = 63
+
+logger = logging.getLogger(__name__)
+_unstored_grids = set()
+
+
+def get_slot_grid():
+    """Devuelve (apertura, cierre, minutos por slot) según la configuración."""
+    opening = getattr(settings, 'CLINIC_OPENING_TIME', DEFAULT_OPENING_TIME)
+    closing = getattr(settings, 'CLINIC_CLOSING_TIME', DEFAULT_CLOSING_TIME)
+    minutes = getattr(settings, 'CLINIC_SLOT_MINUTES', DEFAULT_SLOT_MINUTES)
+    return opening, closing, minutes
+
+
+def grid_signature():
+    """Identifica la grilla vigente (ej. '09:00-18:00/60') para validar filas precalculadas."""
+    opening, closing, minutes = get_slot_grid()
+    return f"{opening:%H:%M}-{closing:%H:%M}/{minutes}"
+
+
+def _minutes(t):
+    return t.hour * 60 + t.minute
+
+
+def _grid_too_large_message(size):
+    return (
+        f"La grilla {grid_signature()} tiene {size} slots por día y solo se guardan hasta "
+        f"{MAX_STORED_SLOTS}: la disponibilidad no se precalcula y se calcula en cada consulta."
+    )
+
+
+@checks.register()
+def check_slot_grid(app_configs, **kwargs):
+    """Avisa (manage.py check, runserver, migrate) si la grilla no entra en las máscaras guardadas."""
+    size = DayAvailability().size
+    if size <= MAX_STORED_SLOTS:
+        return []
+    return [checks.Warning(
+        _grid_too_large_message(size),
+        hint="Aumente CLINIC_SLOT_MINUTES o acorte CLINIC_OPENING_TIME / CLINIC_CLOSING_TIME.",
+        id='clinicapp.W001',
+    )]
+
+
+class DayAvailability:
+    """
+    Disponibilidad de un especialista en un día, guardada como bitset.
+
+    El bit i vale 1 si el slot i (apertura + i * slot_minutes) está libre.
+    Reservar o consultar N slots consecutivos son operaciones de bits sobre
+    un único entero, sin recorrer listas de horas. `working` marca los slots
+    en que el especialista atiende (por defecto, toda la grilla).
+    """
+
+    def __init__(self, opening=None, closing=None, slot_minutes=None, working=None, free=None):
+        grid_opening, grid_closing, grid_minutes = get_slot_grid()
+        self.opening = opening or grid_opening
+        self.closing = closing or grid_closing
+        self.slot_minutes = slot_minutes or grid_minutes
+        self.size = max(0, (_minutes(self.closing) - _minutes(self.opening)) // self.slot_minutes)
+        full = (1 << self.size) - 1
+        self.working = full if working is None else working & full
+        self.free = self.working if free is None else free & self.working
+
+    # --- Conversión hora <-> índice de slot ---
+    def slot_index(self, t):
+        """Índice del slot que contiene la hora t, o None si está fuera de la grilla."""
+        offset = _minutes(t) - _minutes(self.opening)
+        if offset < 0:
+            return None
+        index = offset // self.slot_minutes
+        return index if index < self.size else None
+
+    def slot_time(self, index):
+        start = datetime.combine(date.min, self.opening) + timedelta(minutes=index * self.slot_minutes)
+        return start.time()
+
+    def interval_mask(self, start, end):
+        """Máscara de los slots que caben completos dentro de [start, end)."""
+        opening = _minutes(self.opening)
+        first = max(0, -(-(_minutes(start) - opening) // self.slot_minutes))
+        last = min(self.size, (_minutes(end) - opening) // self.slot_minutes)
+        if first >= last:
+            return 0
+        return ((1 << (last - first)) - 1) << first
+
+    def is_aligned(self, t):
+        """Indica si la hora t coincide exactamente con el inicio de un slot."""
+        index = self.slot_index(t)
+        return index is not None and t.second == 0 and self.slot_time(index) == t.replace(microsecond=0)
+
+    # --- Operaciones sobre el bitset ---
+    def _run_mask(self, slots):
+        """Máscara de inicios desde los que hay `slots` slots libres consecutivos."""
+        mask = self.free
+        for shift in range(1, slots):
+            mask &= self.free >> shift
+        return mask
+
+    def slots_for(self, minutes):
+        """Cantidad de slots que ocupa una duración en minutos (redondeando hacia arriba)."""
+        return max(1, -(-minutes // self.slot_minutes))
+
+    def book(self, t, slots=1):
+        """Marca como ocupados los `slots` slots que empiezan en la hora t."""
+        index = self.slot_index(t)
+        if index is None:
+            return
+        block = ((1 << slots) - 1) << index
+        self.free &= ~block & ((1 << self.size) - 1)
+
+    def book_interval(self, start, end=None):
+        """
+        Marca como ocupado todo slot que se cruce con [start, end).
+        Sin end (citas antiguas sin hora de término) se ocupa un solo slot.
+        """
+        if end is None:
+            return self.book(start)
+        opening = _minutes(self.opening)
+        first = max(0, (_minutes(start) - opening) // self.slot_minutes)
+        last = min(self.size, -(-(_minutes(end) - opening) // self.slot_minutes))
+        if first >= last:
+            return
+        block = ((1 << (last - first)) - 1) << first
+        self.free &= ~block & ((1 << self.size) - 1)
+
+    def is_working(self, start, end=None):
+        """Indica si el especialista atiende en todos los slots que toca [start, end) (sin end, un slot)."""
+        opening = _minutes(self.opening)
+        first = (_minutes(start) - opening) // self.slot_minutes
+        last = first + 1 if end is None else -(-(_minutes(end) - opening) // self.slot_minutes)
+        if first < 0 or last > self.size or first >= last:
+            return False
+        block = ((1 << (last - first)) - 1) << first
+        return self.working & block == block
+
+    def is_free(self, t, slots=1):
+        index = self.slot_index(t)
+        if index is None or index + slots > self.size:
+            return False
+        return bool(self._run_mask(slots) >> index & 1)
+
+    def iter_free(self, slots=1):
+        """Horas (datetime.time), en orden, donde caben `slots` slots libres consecutivos."""
+        mask = self._run_mask(slots)
+        index = 0
+        while mask:
+            if mask & 1:
+                yield self.slot_time(index)
+            mask >>= 1
+            index += 1
+
+    def free_slots(self, slots=1):
+        """Lista de horas 'HH:MM' donde caben `slots` slots libres consecutivos."""
+        return [t.strftime('%H:%M') for t in self.iter_free(slots)]
+
+
+def slot_choices():
+    """Todas las horas de inicio de la grilla, como opciones para un Select."""
+    day = DayAvailability()
+    return [(t, t) for t in day.free_slots()]
+
+
+# --- DISPONIBILIDAD PRECALCULADA ---
+# La disponibilidad de cada (especialista, día) combina su horario semanal
+# (WorkingHours), sus ausencias (TimeOff), los feriados (Holiday) y las citas
+# activas. Se guarda en SpecialistAvailability para las próximas semanas y se
+# recalcula solo para los pares afectados cuando algo de eso cambia (signals.py),
+# así que consultar la disponibilidad es leer una fila.
+
+def availability_horizon(today=None):
+    """Rango [hoy, hoy + N semanas) que se mantiene precalculado."""
+    today = today or timezone.localdate()
+    weeks = getattr(settings, 'CLINIC_AVAILABILITY_WEEKS', DEFAULT_AVAILABILITY_WEEKS)
+    return today, today + timedelta(weeks=weeks)
+
+
+def compute_availability(pairs, exclude_pk=None):
+    """
+    Calcula la disponibilidad de los pares (specialist_id, fecha) dados con
+    cuatro consultas en total: horarios, ausencias, feriados y citas activas.
+    Devuelve {(specialist_id, fecha): DayAvailability}.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return {}
+    specialist_ids = {specialist_id for specialist_id, _ in pairs}
+    days = {day for _, day in pairs}
+    first, last = min(days), max(days)
+
+    templates = {}
+    for specialist_id, weekday, start, end in WorkingHours.objects.filter(
+        specialist_id__in=specialist_ids,
+    ).values_list('specialist_id', 'weekday', 'start_time', 'end_time'):
+        templates.setdefault(specialist_id, []).append((weekday, start, end))
+
+    time_off = {}
+    for specialist_id, start, end in TimeOff.objects.filter(
+        specialist_id__in=specialist_ids, start_date__lte=last, end_date__gte=first,
+    ).values_list('specialist_id', 'start_date', 'end_date'):
+        time_off.setdefault(specialist_id, []).append((start, end))
+
+    holidays = set(Holiday.objects.filter(date__range=(first, last)).values_list('date', flat=True))
+
+    result = {}
+    for specialist_id, day in pairs:
+        availability = DayAvailability()
+        if day in holidays or any(start <= day <= end for start, end in time_off.get(specialist_id, ())):
+            working = 0
+        elif specialist_id in templates:
+            # Con horario cargado solo se atiende en sus tramos; sin horario, en toda la grilla
+            working = 0
+            for weekday, start, end in templates[specialist_id]:
+                if weekday == day.weekday():
+                    working |= availability.interval_mask(start, end)
+        else:
+            working = None
+        if working is not None:
+            availability = DayAvailability(working=working)
+        result[specialist_id, day] = availability
+
+    booked = Appointment.objects.active().filter(specialist_id__in=specialist_ids, date__range=(first, last))
+    if exclude_pk is not None:
+        booked = booked.exclude(pk=exclude_pk)
+    for specialist_id, day, start, end in booked.values_list('specialist_id', 'date', 'time', 'end_time'):
+        if (specialist_id, day) in result:
+            result[specialist_id, day].book_interval(start, end)
+    return result
+
+
+def _store(computed):
+    """Guarda (upsert) en SpecialistAvailability los pares dentro del horizonte."""
+    first, last = availability_horizon()
+    size = DayAvailability().size
+    if size > MAX_STORED_SLOTS:
+        if grid_signature() not in _unstored_grids:
+            _unstored_grids.add(grid_signature())
+            logger.warning(_grid_too_large_message(size))
+        return
+    rows = [
+        SpecialistAvailability(
+            specialist_id=specialist_id, date=day, grid=grid_signature(),
+            working_mask=availability.working, free_mask=availability.free,
+        )
+        for (specialist_id, day), availability in computed.items()
+        if first <= day < last
+    ]
+    SpecialistAvailability.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['specialist', 'date'],
+        update_fields=['grid', 'working_mask', 'free_mask', 'updated_at'],
+    )
+
+
+def refresh_availability(pairs):
+    """Recalcula y guarda la disponibilidad de los pares (specialist_id, fecha) dados."""
+    computed = compute_availability(pairs)
+    _store(computed)
+    return computed
+
+
+def refresh_specialists(specialist_ids=None, start=None, end=None):
+    """
+    Recalcula todo el horizonte (o [start, end]) de los especialistas dados
+    (todos por defecto) y borra las filas de días ya pasados.
+    """
+    first, last = availability_horizon()
+    start = start or first
+    end = end or last - timedelta(days=1)
+    if specialist_ids is None:
+        specialist_ids = list(Specialist.objects.values_list('pk', flat=True))
+    SpecialistAvailability.objects.filter(date__lt=first).delete()
+    days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    computed = {}
+    for specialist_id in specialist_ids:
+        # Por especialista, para no armar un IN gigante con toda la clínica
+        computed.update(refresh_availability((specialist_id, day) for day in days))
+    return computed
+
+
+def _from_row(grid, working_mask, free_mask):
+    if grid != grid_signature():
+        return None
+    return DayAvailability(working=working_mask, free=free_mask)
+
+
+def get_day_availability(specialist_id, day, exclude_pk=None):
+    """
+    Disponibilidad de un especialista para una fecha. Se lee de la tabla
+    precalculada; si la fila no existe (fuera del horizonte, grilla distinta)
+    o hay que ignorar una cita (exclude_pk, al reprogramar), se calcula.
+    """
+    if exclude_pk is None:
+        row = SpecialistAvailability.objects.filter(specialist_id=specialist_id, date=day).values_list(
+            'grid', 'working_mask', 'free_mask'
+        ).first()
+        availability = _from_row(*row) if row else None
+        if availability is not None:
+            return availability
+        return refresh_availability([(specialist_id, day)])[specialist_id, day]
+    return compute_availability([(specialist_id, day)], exclude_pk=exclude_pk)[specialist_id, day]
+
+
+async def aget_day_availability(specialist_id, day, exclude_pk=None):
+    """Versión asíncrona de get_day_availability (vistas ASGI): lee la fila con el ORM async."""
+    if exclude_pk is None:
+        row = await SpecialistAvailability.objects.filter(specialist_id=specialist_id, date=day).values_list(
+            'grid', 'working_mask', 'free_mask'
+        ).afirst()
+        availability = _from_row(*row) if row else None
+        if availability is not None:
+            return availability
+    # Falta la fila (o hay que excluir una cita): se calcula como en la versión síncrona
+    return await sync_to_async(get_day_availability)(specialist_id, day, exclude_pk)
+
+
+def is_slot_available(specialist_id, day, t, duration_minutes=None, exclude_pk=None):
+    """Comprueba si la hora t (y la duración dada) está libre para el especialista."""
+    availability = get_day_availability(specialist_id, day, exclude_pk=exclude_pk)
+    slots = availability.slots_for(duration_minutes) if duration_minutes else 1
+    return availability.is_free(t, slots)
+
+
+def load_availability(specialist_ids, start, end):
+    """
+    Disponibilidad de varios especialistas para un rango de fechas, como
+    {(specialist_id, fecha): DayAvailability}. Lee las filas precalculadas del
+    rango en una consulta; los días que falten se calculan juntos
+    (compute_availability) y se guardan. La cantidad de consultas no depende
+    de cuántos especialistas o días se pidan.
+    """
+    days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    grid = {}
+    for specialist_id, day, *row in SpecialistAvailability.objects.filter(
+        specialist_id__in=specialist_ids, date__range=(start, end),
+    ).values_list('specialist_id', 'date', 'grid', 'working_mask', 'free_mask'):
+        availability = _from_row(*row)
+        if availability is not None:
+            grid[specialist_id, day] = availability
+
+    missing = [(specialist_id, day) for specialist_id in specialist_ids for day in days if (specialist_id, day) not in grid]
+    if missing:
+        grid.update(refresh_availability(missing))
+    return grid
+
+
+def get_availability_calendar(specialist_ids, start, end, duration_minutes=None):
+    """
+    Calendario de horas libres para varios especialistas y un rango de fechas,
+    para una cita de la duración dada (por defecto, un slot).
+    Devuelve {specialist_id: {'YYYY-MM-DD': ['HH:MM', ...]}}.
+    """
+    days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    grid = load_availability(specialist_ids, start, end)
+    slots = DayAvailability().slots_for(duration_minutes) if duration_minutes else 1
+    return {
+        specialist_id: {day.isoformat(): grid[specialist_id, day].free_slots(slots) for day in days}
+        for specialist_id in specialist_ids
+    }
+
+
+def first_available_slots(specialist_ids, start, end, duration_minutes=None, limit=5, after=None):
+    """
+    Las primeras `limit` horas libres entre todos los especialistas dados,
+    ordenadas por (fecha, hora, especialista). Cada especialista aporta sus
+    horas ya ordenadas y heapq.merge las combina (k-way merge), así solo se
+    recorre lo necesario para juntar `limit` resultados. Con `after`
+    (datetime) se descartan las horas anteriores, ej. las ya pasadas de hoy.
+    Devuelve [(fecha, hora, specialist_id), ...].
+    """
+    days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    grid = load_availability(specialist_ids, start, end)
+    slots = DayAvailability().slots_for(duration_minutes) if duration_minutes else 1
+
+    def free_for(specialist_id):
+        for day in days:
+            for t in grid[specialist_id, day].iter_free(slots):
+                if after is None or datetime.combine(day, t) > after:
+                    yield day, t, specialist_id
+
+    return list(islice(heapq.merge(*(free_for(specialist_id) for specialist_id in specialist_ids)), limit))
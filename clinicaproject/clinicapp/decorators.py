@@ -1,15 +1,103 @@
+import time
+from django.conf import settings
 from django.shortcuts import redirect
 from django.contrib import messages
-from functools import wraps
-from django.contrib.auth.models import Group # Importación necesaria
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, urlencode
+from functools import partial, wraps
+from .models import Specialist, get_group_names
 
 # --- FUNCIÓN AUXILIAR PARA VERIFICAR GRUPO ---
 def is_in_group(user, group_name):
     """Verifica si el usuario pertenece al grupo dado."""
     if not user.is_authenticated:
         return False
-    # Usamos Group.objects.filter para evitar errores si el grupo no existe.
-    return user.groups.filter(name=group_name).exists()
+    # Los grupos se cargan una vez por request (ver models.get_group_names).
+    return group_name in get_group_names(user)
+
+
+# --- CLAIMS DE ROL EN LA SESIÓN ---
+# Al iniciar sesión se guardan en la sesión el rol del usuario y el id de su
+# Specialist. Los decoradores autorizan con esos claims sin consultar grupos
+# ni perfiles; pasado CLINIC_ROLE_CLAIMS_MAX_AGE segundos se revalidan contra
+# la base. Un cambio del usuario (grupos, is_active, contraseña, especialista)
+# sube su versión en la caché (signals.py): los claims con otra versión se
+# descartan en el siguiente request, sin esperar a que venzan.
+ROLE_CLAIMS_SESSION_KEY = 'role_claims'
+ROLE_CLAIMS_VERSION_KEY = 'clinicapp:role_claims_version:{}'
+DEFAULT_ROLE_CLAIMS_MAX_AGE = 120
+
+ROLE_RECEPCIONISTA = 'Recepcionista'
+ROLE_ESTILISTA = 'Estilista'
+ROLE_PACIENTE = 'paciente'
+
+# Panel al que se redirige a cada rol después del login
+ROLE_HOME = {
+    ROLE_RECEPCIONISTA: 'panel_recepcion',
+    ROLE_ESTILISTA: 'panel_estilista',
+    ROLE_PACIENTE: 'my_appointments',
+}
+
+
+def get_user_role(user):
+    """Rol principal del usuario: Recepcionista, Estilista o paciente."""
+    groups = get_group_names(user)
+    if ROLE_RECEPCIONISTA in groups:
+        return ROLE_RECEPCIONISTA
+    if ROLE_ESTILISTA in groups:
+        return ROLE_ESTILISTA
+    return ROLE_PACIENTE
+
+
+def role_claims_max_age():
+    return getattr(settings, 'CLINIC_ROLE_CLAIMS_MAX_AGE', DEFAULT_ROLE_CLAIMS_MAX_AGE)
+
+
+def revoke_role_claims(user_id):
+    """
+    Invalida los claims guardados en todas las sesiones del usuario. La versión
+    solo necesita durar lo que duran los claims: pasado ese tiempo vencen igual.
+    """
+    cache.set(ROLE_CLAIMS_VERSION_KEY.format(user_id), time.time_ns(), role_claims_max_age())
+
+
+def set_role_claims(request, user):
+    """Calcula y guarda en la sesión los claims del usuario (llamar tras login())."""
+    claims = {
+        'user_id': str(user.pk),
+        'version': cache.get(ROLE_CLAIMS_VERSION_KEY.format(user.pk)),
+        'role': get_user_role(user),
+        'specialist_id': Specialist.objects.filter(user=user).values_list('pk', flat=True).first(),
+        'is_staff': user.is_staff or user.is_superuser,
+        'checked_at': int(time.time()),
+    }
+    request.session[ROLE_CLAIMS_SESSION_KEY] = claims
+    return claims
+
+
+def get_role_claims(request):
+    """
+    Devuelve los claims del usuario logueado, o None si no hay sesión iniciada.
+    Mientras estén vigentes (y su versión sea la actual) solo se lee la caché;
+    si no, se recalculan cargando request.user, que además verifica el hash de
+    sesión y que la cuenta siga activa.
+    """
+    user_id = request.session.get(SESSION_KEY)
+    if user_id is None:
+        return None
+    claims = request.session.get(ROLE_CLAIMS_SESSION_KEY)
+    if (
+        claims
+        and claims['user_id'] == str(user_id)
+        and time.time() - claims['checked_at'] < role_claims_max_age()
+        and claims.get('version') == cache.get(ROLE_CLAIMS_VERSION_KEY.format(user_id))
+    ):
+        return claims
+    if not request.user.is_authenticated:
+        return None
+    return set_role_claims(request, request.user)
 
 
 def recepcionista_required(view_func):
@@ -18,12 +106,13 @@ def recepcionista_required(view_func):
     """
     @wraps(view_func)
     def wrapper(request, *args, **kwargs):
-        if not request.user.is_authenticated:
+        claims = get_role_claims(request)
+        if claims is None:
             messages.error(request, "Debe iniciar sesión para acceder a esta área.")
             return redirect('login')
             
-        # *** VERIFICACIÓN CORRECTA DEL GRUPO ***
-        if not is_in_group(request.user, 'Recepcionista'):
+        # *** VERIFICACIÓN DEL ROL (claims de la sesión) ***
+        if claims['role'] != ROLE_RECEPCIONISTA:
             messages.error(request, "No tiene permisos para acceder a esta página (Requiere Recepcionista).")
             return redirect('home')
             
@@ -37,12 +126,13 @@ def estilista_required(view_func):
     """
     @wraps(view_func)
     def wrapper(request, *args, **kwargs):
-        if not request.user.is_authenticated:
+        claims = get_role_claims(request)
+        if claims is None:
             messages.error(request, "Debe iniciar sesión para acceder a esta área.")
             return redirect('login')
             
-        # *** VERIFICACIÓN CORRECTA DEL GRUPO ***
-        if not is_in_group(request.user, 'Estilista'):
+        # *** VERIFICACIÓN DEL ROL (claims de la sesión) ***
+        if claims['role'] != ROLE_ESTILISTA:
             messages.error(request, "No tiene permisos para acceder a esta página (Requiere Estilista).")
             return redirect('home')
             
@@ -54,18 +144,89 @@ def admin_or_recepcionista_required(view_func):
     """
     @wraps(view_func)
     def wrapper(request, *args, **kwargs):
-        if not request.user.is_authenticated:
+        claims = get_role_claims(request)
+        if claims is None:
             messages.error(request, "Debe iniciar sesión.")
             return redirect('login')
             
-        is_admin_or_staff = request.user.is_superuser or request.user.is_staff
-        
-        # Asume que el rol de 'reception' está en el campo 'role' del modelo User o Profile
-        is_recepcionista = hasattr(request.user, 'role') and request.user.role == 'reception'
-        
-        if not (is_admin_or_staff or is_recepcionista):
+        if not (claims['is_staff'] or claims['role'] == ROLE_RECEPCIONISTA):
             messages.error(request, "No tiene permisos de Administrador o Recepcionista para realizar esta acción.")
             return redirect('home')
             
         return view_func(request, *args, **kwargs)
     return wrapper
+
+
+# --- CACHÉ DE PÁGINAS PÚBLICAS ---
+# Inicio, servicios y equipo solo cambian cuando se edita un Service o un
+# Specialist. Las señales de signals.py suben la "versión" y todas las copias
+# anteriores quedan obsoletas.
+PUBLIC_PAGES_VERSION_KEY = 'clinicapp:public_pages_version'
+PUBLIC_PAGE_TIMEOUT = 60 * 60 * 24
+
+
+def get_public_pages_version():
+    """Devuelve la versión actual (marca de tiempo entera) de las páginas públicas."""
+    version = cache.get(PUBLIC_PAGES_VERSION_KEY)
+    if version is None:
+        version = int(time.time())
+        cache.add(PUBLIC_PAGES_VERSION_KEY, version, None)
+        version = cache.get(PUBLIC_PAGES_VERSION_KEY, version)
+    return version
+
+
+def bump_public_pages_version():
+    """Invalida todas las páginas públicas cacheadas."""
+    previous = cache.get(PUBLIC_PAGES_VERSION_KEY) or 0
+    cache.set(PUBLIC_PAGES_VERSION_KEY, max(int(time.time()), previous + 1), None)
+
+
+def public_page_cache(view_func=None, *, query_params=()):
+    """
+    Cachea la respuesta completa para visitantes anónimos y la marca con
+    ETag / Last-Modified, así el navegador o el proxy revalidan con un 304.
+    Usuarios logueados o con mensajes pendientes ven la página sin caché.
+
+    La clave es la ruta más los parámetros de `query_params`, los únicos que
+    la vista lee (ej. @public_page_cache(query_params=('page',))); cualquier
+    otro (utm_*, fbclid, ...) comparte la misma copia.
+    """
+    if view_func is None:
+        return partial(public_page_cache, query_params=query_params)
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if (
+            request.method not in ('GET', 'HEAD')
+            or request.user.is_authenticated
+            or len(messages.get_messages(request))
+        ):
+            return view_func(request, *args, **kwargs)
+
+        version = get_public_pages_version()
+        etag = f'"{view_func.__name__}-{version}"'
+        last_modified = version
+
+        def finish(response):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, public=True, no_cache=True)
+            patch_vary_headers(response, ('Cookie',))
+            return response
+
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return finish(not_modified)
+
+        params = urlencode(sorted(
+            (name, value) for name in query_params for value in request.GET.getlist(name)
+        ))
+        key = f'clinicapp:page:{view_func.__name__}:{version}:{request.path}?{params}'
+        response = cache.get(key)
+        if response is None:
+            response = view_func(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            cache.set(key, response, PUBLIC_PAGE_TIMEOUT)
+        return finish(response)
+    return wrapper
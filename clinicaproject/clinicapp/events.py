@@ -0,0 +1,102 @@
+import itertools
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# --- FEED DE CAMBIOS DE CITAS (SSE) ---
+# Los cambios de citas se publican en un broker y la vista SSE los reenvía
+# a los paneles abiertos, que actualizan solo las filas afectadas.
+# El broker se elige con settings.CLINIC_EVENT_BROKER; por defecto vive en la
+# memoria del proceso, lo que alcanza con un solo worker. Con varios workers
+# se debe configurar uno compartido (ej. sobre Redis pub/sub) con la misma
+# interfaz: publish(data), subscribe(last_event_id) y unsubscribe(subscription).
+
+DEFAULT_EVENT_BROKER = 'clinicapp.events.InProcessBroker'
+
+
+class Subscription:
+    """Cola de eventos de un cliente conectado."""
+
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize)
+        # Si el cliente no alcanza a leer (o se perdió eventos), debe recargar la página
+        self.overflowed = False
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        """Siguiente evento (id, data), o None si no llegó ninguno en `timeout` segundos."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class InProcessBroker:
+    """
+    Broker en memoria: reparte cada evento a las suscripciones del proceso y
+    guarda los últimos para que un cliente que se reconecta (Last-Event-ID)
+    reciba lo que se perdió.
+    """
+
+    def __init__(self, history_size=500, queue_size=1000):
+        self.lock = threading.Lock()
+        self.subscriptions = set()
+        self.history = []
+        self.history_size = history_size
+        self.queue_size = queue_size
+        # Los ids incluyen el arranque del proceso: un id de otro proceso no se confunde
+        self.prefix = f'{time.time_ns():x}'
+        self.counter = itertools.count(1)
+
+    def publish(self, data):
+        with self.lock:
+            event = (f'{self.prefix}-{next(self.counter)}', data)
+            self.history.append(event)
+            del self.history[:-self.history_size]
+            for subscription in self.subscriptions:
+                subscription.put(event)
+        return event[0]
+
+    def subscribe(self, last_event_id=None):
+        subscription = Subscription(self.queue_size)
+        with self.lock:
+            if last_event_id:
+                ids = [event_id for event_id, _ in self.history]
+                if last_event_id in ids:
+                    for event in self.history[ids.index(last_event_id) + 1:]:
+                        subscription.put(event)
+                else:
+                    # Evento demasiado viejo o de otro proceso: no se puede reponer
+                    subscription.overflowed = True
+            self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Instancia única del broker configurado."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(getattr(settings, 'CLINIC_EVENT_BROKER', DEFAULT_EVENT_BROKER))()
+    return _broker
+
+
+def publish(data):
+    return get_broker().publish(data)
@@ -0,0 +1,71 @@
+import csv
+
+from .models import Appointment
+
+# --- EXPORTACIÓN DE CITAS Y PAGOS (CONTABILIDAD) ---
+# Las filas se leen con values_list + iterator(chunk_size), sin instanciar
+# modelos ni cargar todo el rango en memoria, y se escriben a medida que llegan.
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_COLUMNS = [
+    ('id', "ID Cita"),
+    ('date', "Fecha"),
+    ('time', "Hora"),
+    ('status', "Estado"),
+    ('patient__username', "Usuario Paciente"),
+    ('patient__first_name', "Nombre Paciente"),
+    ('patient__last_name', "Apellido Paciente"),
+    ('patient__email', "Email Paciente"),
+    ('service__name', "Servicio"),
+    ('specialist__first_name', "Nombre Especialista"),
+    ('specialist__last_name', "Apellido Especialista"),
+    ('final_price', "Precio Final"),
+    ('is_paid', "Pagada"),
+]
+
+
+def export_rows(start, end, chunk_size=EXPORT_CHUNK_SIZE):
+    """Genera la cabecera y luego una tupla por cita de [start, end], en orden de fecha."""
+    yield [label for _, label in EXPORT_COLUMNS]
+    rows = (
+        Appointment.objects.filter(date__range=(start, end))
+        .order_by('date', 'time', 'pk')
+        .values_list(*[field for field, _ in EXPORT_COLUMNS])
+        .iterator(chunk_size=chunk_size)
+    )
+    status_labels = dict(Appointment.STATUS_CHOICES)
+    status_index = [field for field, _ in EXPORT_COLUMNS].index('status')
+    for row in rows:
+        row = list(row)
+        row[status_index] = status_labels.get(row[status_index], row[status_index])
+        yield row
+
+
+# Una celda de texto que empieza con estos caracteres la interpreta como
+# fórmula la planilla que abra el archivo (inyección de fórmulas CSV)
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _safe_cell(value):
+    """Antepone una comilla a los textos que una planilla ejecutaría como fórmula."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class _Echo:
+    """Pseudo-archivo: csv.writer devuelve la línea en vez de acumularla."""
+
+    def write(self, value):
+        return value
+
+
+def export_csv_lines(start, end, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Líneas CSV listas para StreamingHttpResponse o para escribir a un archivo.
+    Los textos con forma de fórmula se escapan (ver _safe_cell).
+    """
+    writer = csv.writer(_Echo())
+    for row in export_rows(start, end, chunk_size):
+        yield writer.writerow([_safe_cell(value) for value in row])
@@ -1,7 +1,9 @@
+from datetime import date
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django import forms
 from django.db import transaction
-from .models import Service, Specialist, Appointment, PacienteProfile
+from .models import Service, Specialist, Appointment, PacienteProfile, WaitlistEntry, performs_service
+from .availability import get_day_availability, slot_choices
 from django.forms.widgets import DateInput, TimeInput
 
 class RegisterForm(UserCreationForm):
@@ -49,7 +51,57 @@ class AppointmentForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['time'].choices = [('', '--- Seleccione la hora ---')]
+        self.fields['time'].widget.choices = [('', '--- Seleccione la hora ---')] + slot_choices()
+
+    def clean(self):
+        """Verifica que el especialista realice el servicio y que el horario siga libre."""
+        cleaned_data = super().clean()
+        specialist = cleaned_data.get("specialist")
+        selected_date = cleaned_data.get("date")
+        selected_time = cleaned_data.get("time")
+        service = cleaned_data.get("service")
+
+        if specialist and service and not performs_service(specialist.pk, service.pk):
+            self.add_error('specialist', "El especialista seleccionado no realiza este servicio.")
+        elif specialist and selected_date and selected_time:
+            availability = get_day_availability(specialist.pk, selected_date)
+            slots = availability.slots_for(service.duration_minutes) if service else 1
+            if not availability.is_aligned(selected_time):
+                self.add_error('time', "La hora seleccionada no corresponde a un horario de atención.")
+            elif not availability.is_free(selected_time, slots):
+                self.add_error('time', "La hora seleccionada ya no está disponible.")
+
+        return cleaned_data
+
+
+class WaitlistForm(forms.ModelForm):
+    start_date = forms.DateField(widget=DateInput(attrs={'type': 'date'}), input_formats=['%Y-%m-%d', '%d-%m-%Y'], label="Desde")
+    end_date = forms.DateField(widget=DateInput(attrs={'type': 'date'}), input_formats=['%Y-%m-%d', '%d-%m-%Y'], label="Hasta")
+
+    class Meta:
+        model = WaitlistEntry
+        fields = ['service', 'specialist', 'start_date', 'end_date']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['specialist'].empty_label = "Cualquier especialista"
+        for name, field in self.fields.items():
+            field.widget.attrs['class'] = 'form-select' if name in ('service', 'specialist') else 'form-control'
+
+    def clean(self):
+        cleaned_data = super().clean()
+        service = cleaned_data.get("service")
+        specialist = cleaned_data.get("specialist")
+        start_date = cleaned_data.get("start_date")
+        end_date = cleaned_data.get("end_date")
+
+        if start_date and start_date < date.today():
+            self.add_error('start_date', "La fecha no puede ser en el pasado.")
+        if start_date and end_date and end_date < start_date:
+            self.add_error('end_date', "La fecha final no puede ser anterior a la inicial.")
+        if service and specialist and not performs_service(specialist.pk, service.pk):
+            self.add_error('specialist', "El especialista seleccionado no realiza este servicio.")
+        return cleaned_data
 
 
 # ---------------------------
@@ -108,13 +160,14 @@ class ModifyAppointmentForm(forms.ModelForm):
         new_time = cleaned_data.get("time")
 
         if new_date and new_time and self.instance:
-            specialist = self.instance.specialist
             # Excluye la cita que se está modificando (self.instance)
-            if Appointment.objects.filter(
-                specialist=specialist,
-                date=new_date,
-                time=new_time
-            ).exclude(pk=self.instance.pk).exists():
+            availability = get_day_availability(
+                self.instance.specialist_id, new_date, exclude_pk=self.instance.pk
+            )
+            slots = availability.slots_for(self.instance.service.duration_minutes)
+            if not availability.is_aligned(new_time):
+                self.add_error('time', "La hora seleccionada no corresponde a un horario de atención.")
+            elif not availability.is_free(new_time, slots):
                 self.add_error(None, "El especialista ya tiene una cita reservada para esa hora. Por favor, seleccione otra.")
         
         return cleaned_data
\ No newline at end of file
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher,
+    BCryptSHA256PasswordHasher,
+    PBKDF2PasswordHasher,
+)
+
+# --- HASHERS CON COSTO CONFIGURABLE ---
+# Mismos algoritmos que los de Django (los hashes guardados siguen siendo
+# compatibles), pero el costo se lee de settings. Al iniciar sesión Django
+# llama a must_update(): si el hash guardado se generó con otro costo, la
+# contraseña se vuelve a hashear con el actual de forma transparente.
+
+
+class ClinicPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return getattr(settings, 'CLINIC_PBKDF2_ITERATIONS', None) or PBKDF2PasswordHasher.iterations
+
+
+class ClinicArgon2PasswordHasher(Argon2PasswordHasher):
+    @property
+    def time_cost(self):
+        return getattr(settings, 'CLINIC_ARGON2_TIME_COST', None) or Argon2PasswordHasher.time_cost
+
+    @property
+    def memory_cost(self):
+        return getattr(settings, 'CLINIC_ARGON2_MEMORY_COST', None) or Argon2PasswordHasher.memory_cost
+
+    @property
+    def parallelism(self):
+        return getattr(settings, 'CLINIC_ARGON2_PARALLELISM', None) or Argon2PasswordHasher.parallelism
+
+
+class ClinicBCryptSHA256PasswordHasher(BCryptSHA256PasswordHasher):
+    @property
+    def rounds(self):
+        return getattr(settings, 'CLINIC_BCRYPT_ROUNDS', None) or BCryptSHA256PasswordHasher.rounds
+
+
+# Nombre corto -> clase, para settings y para el comando benchmark_login
+CLINIC_HASHERS = {
+    'pbkdf2': ClinicPBKDF2PasswordHasher,
+    'argon2': ClinicArgon2PasswordHasher,
+    'bcrypt': ClinicBCryptSHA256PasswordHasher,
+}
+
+# Parámetros de costo que acepta cada hasher
+COST_PARAMETERS = {
+    'pbkdf2': ('iterations',),
+    'argon2': ('time_cost', 'memory_cost', 'parallelism'),
+    'bcrypt': ('rounds',),
+}
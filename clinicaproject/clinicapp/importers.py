@@ -0,0 +1,223 @@
+import csv
+import json
+from datetime import date, time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .models import (
+    Appointment, DailyAppointmentSummary, PacienteProfile, Service, Specialist, add_minutes, appointments_changed,
+)
+
+# --- IMPORTACIÓN MASIVA (MIGRACIÓN DE OTRAS CLÍNICAS) ---
+# Cada importador recibe un lote de filas (dicts), resuelve las claves foráneas
+# con diccionarios en memoria (una consulta por lote), inserta con bulk_create
+# y devuelve las filas rechazadas como (número de fila, motivo, fila).
+
+
+class RowError(Exception):
+    """Fila inválida: se informa en el reporte de rechazados."""
+
+
+def read_rows(path):
+    """Lee filas de un .csv, .jsonl (un objeto por línea) o .json (lista) de a una."""
+    if path.endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as source:
+            yield from csv.DictReader(source)
+    elif path.endswith('.jsonl'):
+        with open(path, encoding='utf-8') as source:
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+    elif path.endswith('.json'):
+        with open(path, encoding='utf-8') as source:
+            yield from json.load(source)
+    else:
+        raise ValueError("Formato no soportado: use .csv, .jsonl o .json")
+
+
+def chunked(rows, size):
+    """Agrupa las filas en lotes de `size`, numerando cada fila desde 1."""
+    numbered = enumerate(rows, start=1)
+    while True:
+        batch = list(islice(numbered, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _required(row, field):
+    value = (row.get(field) or '').strip() if isinstance(row.get(field), str) else row.get(field)
+    if value in (None, ''):
+        raise RowError(f"Falta el campo '{field}'")
+    return value
+
+
+def _password(row):
+    """
+    Las contraseñas no se hashean al importar (sería lo más lento de la carga):
+    se acepta un hash ya calculado o se deja la cuenta sin contraseña utilizable.
+    """
+    password = (row.get('password') or '').strip()
+    if not password:
+        return make_password(None)
+    try:
+        identify_hasher(password)
+    except ValueError:
+        raise RowError("La contraseña debe venir hasheada (ej. pbkdf2_sha256$...)")
+    return password
+
+
+# --- PACIENTES ---
+def import_patients(batch):
+    rejected = []
+    usernames = [row.get('username') for _, row in batch]
+    existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+
+    users, birthdays = [], {}
+    for number, row in batch:
+        try:
+            username = _required(row, 'username')
+            if username in existing or username in birthdays:
+                raise RowError(f"El usuario '{username}' ya existe")
+            birthday = date.fromisoformat(_required(row, 'fecha_nacimiento'))
+            users.append(User(
+                username=username,
+                email=row.get('email') or '',
+                first_name=row.get('first_name') or '',
+                last_name=row.get('last_name') or '',
+                password=_password(row),
+            ))
+            birthdays[username] = birthday
+        except (RowError, ValueError) as exc:
+            rejected.append((number, str(exc), row))
+
+    with transaction.atomic():
+        User.objects.bulk_create(users)
+        ids = dict(User.objects.filter(username__in=birthdays).values_list('username', 'pk'))
+        PacienteProfile.objects.bulk_create(
+            PacienteProfile(user_id=ids[username], fecha_nacimiento=birthday)
+            for username, birthday in birthdays.items()
+        )
+    return rejected
+
+
+# --- ESPECIALISTAS ---
+def import_specialists(batch):
+    rejected = []
+    emails = [row.get('email') for _, row in batch]
+    existing = set(Specialist.objects.filter(email__in=emails).values_list('email', flat=True))
+    users = dict(
+        User.objects.filter(
+            username__in=[row.get('username') for _, row in batch if row.get('username')],
+            specialist_profile__isnull=True,
+        ).values_list('username', 'pk')
+    )
+
+    specialists, seen, linked = [], set(), set()
+    for number, row in batch:
+        try:
+            email = _required(row, 'email')
+            if email in existing or email in seen:
+                raise RowError(f"El especialista '{email}' ya existe")
+            username = row.get('username')
+            if username and username not in users:
+                raise RowError(f"El usuario '{username}' no existe o ya tiene un especialista")
+            if username in linked:
+                raise RowError(f"El usuario '{username}' está repetido en el archivo")
+            specialists.append(Specialist(
+                first_name=_required(row, 'first_name'),
+                last_name=_required(row, 'last_name'),
+                specialty=row.get('specialty') or '',
+                email=email,
+                user_id=users.get(username),
+            ))
+            seen.add(email)
+            if username:
+                linked.add(username)
+        except RowError as exc:
+            rejected.append((number, str(exc), row))
+
+    Specialist.objects.bulk_create(specialists)
+    return rejected
+
+
+# --- CITAS HISTÓRICAS ---
+def lookup_tables():
+    """Servicios y especialistas son pocos: se cargan una sola vez para toda la importación."""
+    services = {name: (pk, duration) for pk, name, duration in Service.objects.values_list('pk', 'name', 'duration_minutes')}
+    specialists = dict(Specialist.objects.values_list('email', 'pk'))
+    return services, specialists
+
+
+def import_appointments(batch, lookups):
+    services, specialists = lookups
+    rejected = []
+    patients = dict(User.objects.filter(username__in=[row.get('patient') for _, row in batch]).values_list('username', 'pk'))
+    status_codes = dict(Appointment.STATUS_CHOICES)
+
+    parsed = []
+    for number, row in batch:
+        try:
+            patient_id = patients.get(_required(row, 'patient'))
+            if patient_id is None:
+                raise RowError(f"No existe el paciente '{row['patient']}'")
+            service = services.get(_required(row, 'service'))
+            if service is None:
+                raise RowError(f"No existe el servicio '{row['service']}'")
+            specialist_id = specialists.get(_required(row, 'specialist'))
+            if specialist_id is None:
+                raise RowError(f"No existe el especialista '{row['specialist']}'")
+            status = row.get('status') or 'F'
+            if status not in status_codes:
+                raise RowError(f"Estado inválido '{status}'")
+            start = time.fromisoformat(_required(row, 'time'))
+            final_price = Decimal(row['final_price']) if row.get('final_price') not in (None, '') else None
+            is_paid = str(row.get('is_paid', '')).strip().lower() in ('1', 'true', 'si', 'sí', 'yes')
+            parsed.append((number, row, Appointment(
+                patient_id=patient_id,
+                service_id=service[0],
+                specialist_id=specialist_id,
+                date=date.fromisoformat(_required(row, 'date')),
+                time=start,
+                end_time=add_minutes(start, service[1]),
+                status=status,
+                is_paid=is_paid,
+                final_price=final_price,
+            )))
+        except (RowError, ValueError, InvalidOperation) as exc:
+            rejected.append((number, str(exc), row))
+
+    # Las citas activas no pueden solaparse con otra activa del mismo especialista:
+    # una consulta trae los intervalos ya reservados de los (especialista, día)
+    # del lote y las filas aceptadas se van sumando a esas listas
+    active = [appointment for _, _, appointment in parsed if appointment.status in Appointment.ACTIVE_STATUSES]
+    booked = {}
+    if active:
+        for specialist_id, day, start, end in Appointment.objects.active().filter(
+            specialist_id__in={a.specialist_id for a in active},
+            date__in={a.date for a in active},
+        ).values_list('specialist_id', 'date', 'time', 'end_time'):
+            # Citas antiguas sin hora de término: se toma solo su hora de inicio
+            booked.setdefault((specialist_id, day), []).append((start, end or add_minutes(start, 1)))
+
+    appointments = []
+    for number, row, appointment in parsed:
+        if appointment.status in Appointment.ACTIVE_STATUSES:
+            intervals = booked.setdefault((appointment.specialist_id, appointment.date), [])
+            if any(start < appointment.end_time and appointment.time < end for start, end in intervals):
+                rejected.append((number, "El especialista ya tiene una cita activa en ese horario", row))
+                continue
+            intervals.append((appointment.time, appointment.end_time))
+        appointments.append(appointment)
+
+    # bulk_create no pasa por save(): el resumen diario se actualiza con un delta por lote
+    # y la disponibilidad precalculada, una vez por (especialista, día) del lote
+    with transaction.atomic():
+        Appointment.objects.bulk_create(appointments)
+        DailyAppointmentSummary.apply_changes([], [a.rollup_state() for a in appointments])
+        appointments_changed.send(sender=Appointment, days={(a.specialist_id, a.date) for a in appointments})
+    return rejected
@@ -0,0 +1,108 @@
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode, urljoin
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+# Mezcla de peticiones de la página de reserva: por cada carga de la página,
+# el formulario consulta varias veces las horas libres y el estado de la cita.
+BOOKING_MIX = (
+    ('reserve_page', 1),
+    ('available_times', 6),
+    ('appointment_status', 3),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Prueba de carga de la página de reserva contra un servidor en marcha. "
+        "Correr una vez contra gunicorn (clinicaproject.wsgi) y otra contra "
+        "uvicorn/daphne (clinicaproject.asgi:application) con --async-endpoints "
+        "para comparar el rendimiento de WSGI y ASGI."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000/', help="URL base del servidor")
+        parser.add_argument('--username', required=True, help="Paciente con el que iniciar sesión")
+        parser.add_argument('--password', required=True)
+        parser.add_argument('--specialist-id', type=int, required=True)
+        parser.add_argument('--service-id', type=int)
+        parser.add_argument('--date', required=True, help="Fecha consultada (YYYY-MM-DD)")
+        parser.add_argument('--appointment-id', type=int, required=True, help="Cita del paciente cuyo estado se consulta")
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument(
+            '--async-endpoints', action='store_true',
+            help="Usa la versión asíncrona de horas disponibles (para ASGI)",
+        )
+
+    def login(self, base_url, username, password):
+        """Inicia sesión como lo haría el navegador y devuelve el header Cookie."""
+        jar = CookieJar()
+        opener = build_opener(HTTPCookieProcessor(jar))
+        login_url = urljoin(base_url, reverse('login'))
+        opener.open(login_url).read()
+        csrf = next((cookie.value for cookie in jar if cookie.name == 'csrftoken'), '')
+        data = urlencode({'username': username, 'password': password, 'csrfmiddlewaretoken': csrf}).encode()
+        opener.open(Request(login_url, data=data, headers={'Referer': login_url})).read()
+        cookies = {cookie.name: cookie.value for cookie in jar}
+        if 'sessionid' not in cookies:
+            raise CommandError("No se pudo iniciar sesión con esas credenciales.")
+        return '; '.join(f'{name}={value}' for name, value in cookies.items())
+
+    def handle(self, *args, **options):
+        base_url = options['url']
+        try:
+            cookie = self.login(base_url, options['username'], options['password'])
+        except URLError as exc:
+            raise CommandError(f"No se pudo conectar con {base_url}: {exc}")
+
+        times_url = reverse('get_available_times_async' if options['async_endpoints'] else 'get_available_times')
+        query = {'specialist_id': options['specialist_id'], 'date': options['date']}
+        if options['service_id']:
+            query['service_id'] = options['service_id']
+        urls = {
+            'reserve_page': reverse('reserve_appointment'),
+            'available_times': f"{times_url}?{urlencode(query)}",
+            'appointment_status': reverse('appointment_status', args=[options['appointment_id']]),
+        }
+        names, weights = zip(*BOOKING_MIX)
+        plan = random.choices(names, weights=weights, k=options['requests'])
+
+        def fetch(name):
+            request = Request(urljoin(base_url, urls[name]), headers={'Cookie': cookie})
+            started = time.perf_counter()
+            try:
+                with build_opener().open(request) as response:
+                    response.read()
+                    ok = response.status == 200
+            except (HTTPError, URLError):
+                ok = False
+            return name, time.perf_counter() - started, ok
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(fetch, plan))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"{len(results)} peticiones, {options['concurrency']} concurrentes, {elapsed:.2f} s "
+            f"-> {len(results) / elapsed:.1f} req/s"
+        )
+        self.stdout.write(f"{'endpoint':22} {'n':>6} {'errores':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        for name in names:
+            latencies = sorted(latency for kind, latency, _ in results if kind == name)
+            if not latencies:
+                continue
+            errors = sum(1 for kind, _, ok in results if kind == name and not ok)
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            self.stdout.write(
+                f"{name:22} {len(latencies):6} {errors:8} "
+                f"{statistics.median(latencies) * 1000:8.1f} {p95 * 1000:8.1f}"
+            )
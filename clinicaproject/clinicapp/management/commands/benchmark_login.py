@@ -0,0 +1,79 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from clinicapp.hashers import CLINIC_HASHERS, COST_PARAMETERS
+
+
+def build_hasher(spec):
+    """
+    Arma un hasher a partir de 'nombre' o 'nombre:param=valor,param=valor',
+    por ejemplo 'argon2:time_cost=2,memory_cost=51200' o 'pbkdf2:iterations=600000'.
+    """
+    name, _, params = spec.partition(':')
+    if name not in CLINIC_HASHERS:
+        raise CommandError(f"Hasher desconocido '{name}'. Opciones: {', '.join(CLINIC_HASHERS)}")
+    overrides = {}
+    for item in filter(None, params.split(',')):
+        key, _, value = item.partition('=')
+        if key not in COST_PARAMETERS[name]:
+            raise CommandError(f"'{key}' no es un parámetro de {name}: {', '.join(COST_PARAMETERS[name])}")
+        try:
+            overrides[key] = int(value)
+        except ValueError:
+            raise CommandError(f"El valor de '{key}' debe ser entero")
+    hasher_class = type(f'Benchmark{CLINIC_HASHERS[name].__name__}', (CLINIC_HASHERS[name],), overrides)
+    return hasher_class()
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide cuántos inicios de sesión por segundo soporta este servidor con cada "
+        "configuración de hasher, simulando logins concurrentes (cambio de turno)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hasher', action='append', dest='hashers',
+            help="Configuración a medir, ej. 'pbkdf2:iterations=600000' o 'argon2:time_cost=2'. "
+                 "Se puede repetir. Por defecto: pbkdf2, argon2 y bcrypt con el costo de settings.",
+        )
+        parser.add_argument('--logins', type=int, default=50, help="Verificaciones por configuración")
+        parser.add_argument('--concurrency', type=int, default=4, help="Logins simultáneos")
+
+    def handle(self, *args, **options):
+        specs = options['hashers'] or list(CLINIC_HASHERS)
+        hashers = [(spec, build_hasher(spec)) for spec in specs]
+        logins, concurrency = options['logins'], options['concurrency']
+        if logins < 1 or concurrency < 1:
+            raise CommandError("--logins y --concurrency deben ser mayores que cero.")
+
+        self.stdout.write(f"{logins} logins por configuración, {concurrency} en paralelo.\n")
+        self.stdout.write(f"{'configuración':45} {'logins/s':>9} {'p50 ms':>8} {'p95 ms':>8}")
+        for spec, hasher in hashers:
+            try:
+                encoded = hasher.encode('clave-de-prueba', hasher.salt())
+            except ValueError as exc:
+                # Falta la librería (argon2-cffi / bcrypt)
+                self.stdout.write(self.style.WARNING(f"{spec:45} omitido: {exc}"))
+                continue
+            params = ','.join(f"{key}={getattr(hasher, key)}" for key in COST_PARAMETERS[spec.partition(':')[0]])
+            label = f"{hasher.algorithm}:{params}"
+
+            def login(_):
+                started = time.perf_counter()
+                hasher.verify('clave-de-prueba', encoded)
+                return time.perf_counter() - started
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                latencies = sorted(pool.map(login, range(logins)))
+            elapsed = time.perf_counter() - started
+
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            self.stdout.write(
+                f"{label:45} {logins / elapsed:9.1f} "
+                f"{statistics.median(latencies) * 1000:8.1f} {p95 * 1000:8.1f}"
+            )
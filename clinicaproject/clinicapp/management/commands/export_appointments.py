@@ -0,0 +1,33 @@
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from clinicapp.exports import EXPORT_CHUNK_SIZE, export_csv_lines
+
+
+class Command(BaseCommand):
+    help = "Exporta citas y pagos de un rango de fechas a CSV (en streaming, memoria constante)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', required=True, help="Fecha inicial YYYY-MM-DD")
+        parser.add_argument('--end', required=True, help="Fecha final YYYY-MM-DD")
+        parser.add_argument('--output', help="Archivo de salida (por defecto, salida estándar)")
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options['start'])
+            end = date.fromisoformat(options['end'])
+        except ValueError:
+            raise CommandError("Las fechas deben tener formato YYYY-MM-DD.")
+        if end < start:
+            raise CommandError("La fecha final no puede ser anterior a la inicial.")
+
+        lines = export_csv_lines(start, end, options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(lines)
+            self.stderr.write(self.style.SUCCESS(f"Exportación guardada en {options['output']}."))
+        else:
+            sys.stdout.writelines(lines)
@@ -0,0 +1,53 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from clinicapp.importers import (
+    lookup_tables, chunked, import_appointments, import_patients, import_specialists, read_rows,
+)
+
+IMPORT_BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa pacientes, especialistas o citas históricas desde CSV/JSON en lotes "
+        "(bulk_create). Las filas rechazadas se guardan en un reporte CSV."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['patients', 'specialists', 'appointments'])
+        parser.add_argument('path', help="Archivo .csv, .jsonl o .json")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument('--rejected', help="Reporte de filas rechazadas (por defecto, <archivo>.rejected.csv)")
+
+    def handle(self, *args, **options):
+        kind, path = options['kind'], options['path']
+        if kind == 'appointments':
+            lookups = lookup_tables()
+            importer = lambda batch: import_appointments(batch, lookups)
+        else:
+            importer = import_patients if kind == 'patients' else import_specialists
+
+        rejected_path = options['rejected'] or f'{path}.rejected.csv'
+        total = rejected_count = 0
+        try:
+            with open(rejected_path, 'w', newline='', encoding='utf-8') as report:
+                writer = csv.writer(report)
+                writer.writerow(['row', 'reason', 'data'])
+                for batch in chunked(read_rows(path), options['batch_size']):
+                    rejected = importer(batch)
+                    for number, reason, row in sorted(rejected, key=lambda item: item[0]):
+                        writer.writerow([number, reason, json.dumps(row, ensure_ascii=False, default=str)])
+                    total += len(batch)
+                    rejected_count += len(rejected)
+                    self.stdout.write(f"{total} filas procesadas ({rejected_count} rechazadas)...")
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Importación terminada: {total - rejected_count} filas importadas, {rejected_count} rechazadas."
+        ))
+        if rejected_count:
+            self.stdout.write(f"Detalle de rechazos en {rejected_path}.")
@@ -0,0 +1,20 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from clinicapp.notifications import queue_reminders
+
+
+class Command(BaseCommand):
+    help = "Encola recordatorios para las citas Confirmadas de mañana (o de --date). Conviene correrlo una vez por día."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Fecha de las citas YYYY-MM-DD (por defecto, mañana).")
+
+    def handle(self, *args, **options):
+        try:
+            day = date.fromisoformat(options['date']) if options['date'] else None
+        except ValueError:
+            raise CommandError("La fecha debe tener formato YYYY-MM-DD.")
+        queued = queue_reminders(day)
+        self.stdout.write(self.style.SUCCESS(f"Citas con recordatorio encolado: {queued}."))
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from clinicapp.models import DailyAppointmentSummary
+
+KEY_FIELDS = ('date', 'specialist_id', 'service_id', 'status')
+VALUE_FIELDS = ('count', 'paid_count', 'revenue')
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el resumen diario de citas desde cero o lo verifica contra las citas."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help="Solo compara el resumen con las citas y reporta diferencias (no modifica nada).",
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            return self.verify()
+
+        with transaction.atomic():
+            DailyAppointmentSummary.objects.all().delete()
+            batch = []
+            total = 0
+            for row in DailyAppointmentSummary.expected_rows().iterator(chunk_size=options['batch_size']):
+                batch.append(DailyAppointmentSummary(**row))
+                if len(batch) >= options['batch_size']:
+                    DailyAppointmentSummary.objects.bulk_create(batch)
+                    total += len(batch)
+                    batch = []
+            DailyAppointmentSummary.objects.bulk_create(batch)
+            total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Resumen diario reconstruido: {total} filas."))
+
+    def verify(self):
+        expected = {
+            tuple(row[field] for field in KEY_FIELDS): tuple(row[field] for field in VALUE_FIELDS)
+            for row in DailyAppointmentSummary.expected_rows()
+        }
+        stored = {
+            row[:4]: row[4:]
+            for row in DailyAppointmentSummary.objects.filter(count__gt=0).values_list(*KEY_FIELDS, *VALUE_FIELDS)
+        }
+
+        differences = []
+        for key in sorted(expected.keys() | stored.keys(), key=str):
+            if expected.get(key) != stored.get(key):
+                differences.append(f"{key}: esperado {expected.get(key)}, resumen {stored.get(key)}")
+
+        for line in differences:
+            self.stdout.write(line)
+        if differences:
+            raise CommandError(f"El resumen diario no coincide con las citas ({len(differences)} diferencias).")
+        self.stdout.write(self.style.SUCCESS(f"Resumen diario verificado: {len(expected)} filas coinciden."))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from clinicapp.availability import availability_horizon, refresh_specialists
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula la disponibilidad precalculada de las próximas semanas y borra "
+        "la de días pasados. Conviene correrlo una vez por día para avanzar el horizonte."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--specialist', type=int, action='append', dest='specialists',
+            help="Solo este especialista (se puede repetir). Por defecto, todos.",
+        )
+
+    def handle(self, *args, **options):
+        first, last = availability_horizon()
+        computed = refresh_specialists(options['specialists'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Disponibilidad recalculada del {first} al {last}: {len(computed)} días."
+        ))
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from clinicapp.notifications import send_pending
+
+
+class Command(BaseCommand):
+    help = (
+        "Envía los avisos pendientes del outbox por lotes, con reintentos y límite de tasa. "
+        "Con --loop queda corriendo como worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--rate', type=float, help="Avisos por segundo (por defecto, CLINIC_NOTIFICATION_RATE).")
+        parser.add_argument('--max-attempts', type=int, help="Por defecto, CLINIC_NOTIFICATION_MAX_ATTEMPTS.")
+        parser.add_argument('--loop', action='store_true', help="Sigue revisando el outbox en vez de terminar.")
+        parser.add_argument('--interval', type=float, default=5, help="Segundos de espera cuando no hay pendientes.")
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = send_pending(options['batch_size'], options['max_attempts'], options['rate'])
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f"Lote: {sent} enviados, {failed} con error.")
+            if sent + failed < options['batch_size']:
+                # Outbox vacío (o solo reintentos a futuro): termina o espera
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Avisos enviados: {total_sent}; con error: {total_failed}."))
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:59
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def link_specialists_by_email(apps, schema_editor):
+    """Vincula cada Specialist existente al User con el mismo email."""
+    Specialist = apps.get_model('clinicapp', 'Specialist')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    for specialist in Specialist.objects.filter(user__isnull=True):
+        user = User.objects.filter(email__iexact=specialist.email).order_by('pk').first()
+        if user and not Specialist.objects.filter(user=user).exists():
+            specialist.user = user
+            specialist.save(update_fields=['user'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinicapp', '0007_alter_appointment_options_alter_service_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='specialist',
+            name='user',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='specialist_profile', to=settings.AUTH_USER_MODEL, verbose_name='Usuario'),
+        ),
+        migrations.AlterField(
+            model_name='appointment',
+            name='date',
+            field=models.DateField(default=django.utils.timezone.localdate, verbose_name='Fecha de la Cita'),
+        ),
+        migrations.AlterField(
+            model_name='appointment',
+            name='patient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='appointments', to=settings.AUTH_USER_MODEL, verbose_name='Paciente'),
+        ),
+        migrations.AlterField(
+            model_name='appointment',
+            name='status',
+            field=models.CharField(choices=[('P', 'Pendiente'), ('C', 'Confirmada'), ('X', 'Cancelada'), ('F', 'Finalizada (Atendida)')], default='P', max_length=1, verbose_name='Estado'),
+        ),
+        migrations.AlterField(
+            model_name='pacienteprofile',
+            name='fecha_nacimiento',
+            field=models.DateField(verbose_name='Fecha de Nacimiento'),
+        ),
+        migrations.AlterField(
+            model_name='pacienteprofile',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='paciente_profile', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(link_specialists_by_email, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinicapp', '0009_appointment_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='appointment',
+            unique_together=set(),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['specialist', 'date', 'time'], name='appt_spec_date_time_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ('P', 'C'))), fields=('specialist', 'date', 'time'), name='unique_active_appointment_slot'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:04
+
+from datetime import date, datetime, timedelta
+
+from django.db import migrations, models
+
+
+def fill_end_time(apps, schema_editor):
+    """Calcula end_time de las citas existentes con la duración de su servicio."""
+    Appointment = apps.get_model('clinicapp', 'Appointment')
+    for appointment in Appointment.objects.select_related('service').filter(end_time__isnull=True).iterator():
+        start = datetime.combine(date.min, appointment.time)
+        appointment.end_time = (start + timedelta(minutes=appointment.service.duration_minutes)).time()
+        appointment.save(update_fields=['end_time'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinicapp', '0010_active_slot_constraint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='end_time',
+            field=models.TimeField(blank=True, editable=False, null=True, verbose_name='Hora de Término'),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='duration_minutes',
+            field=models.PositiveSmallIntegerField(default=60, verbose_name='Duración (minutos)'),
+        ),
+        migrations.RunPython(fill_end_time, migrations.RunPython.noop),
+    ]
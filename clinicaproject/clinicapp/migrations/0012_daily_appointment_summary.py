@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_summary(apps, schema_editor):
+    """Carga el resumen inicial a partir de las citas existentes."""
+    Appointment = apps.get_model('clinicapp', 'Appointment')
+    DailyAppointmentSummary = apps.get_model('clinicapp', 'DailyAppointmentSummary')
+    rows = (
+        Appointment.objects.order_by()
+        .values('date', 'specialist_id', 'service_id', 'status')
+        .annotate(
+            count=models.Count('id'),
+            paid_count=models.Count('id', filter=models.Q(is_paid=True)),
+            revenue=models.Sum('final_price', filter=models.Q(is_paid=True)),
+        )
+    )
+    DailyAppointmentSummary.objects.bulk_create(
+        [DailyAppointmentSummary(**dict(row, revenue=row['revenue'] or 0)) for row in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinicapp', '0011_service_duration_appointment_end_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAppointmentSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Fecha')),
+                ('status', models.CharField(choices=[('P', 'Pendiente'), ('C', 'Confirmada'), ('X', 'Cancelada'), ('F', 'Finalizada (Atendida)')], max_length=1, verbose_name='Estado')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Citas')),
+                ('paid_count', models.PositiveIntegerField(default=0, verbose_name='Citas Pagadas')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Ingresos')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='clinicapp.service', verbose_name='Servicio')),
+                ('specialist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='clinicapp.specialist', verbose_name='Especialista')),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario',
+                'verbose_name_plural': 'Resúmenes Diarios',
+                'constraints': [models.UniqueConstraint(fields=('date', 'specialist', 'service', 'status'), name='unique_daily_summary_key')],
+            },
+        ),
+        migrations.RunPython(build_summary, migrations.RunPython.noop),
+    ]
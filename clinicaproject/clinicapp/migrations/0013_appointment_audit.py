@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinicapp', '0012_daily_appointment_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentAudit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transition', models.CharField(blank=True, max_length=20, verbose_name='Transición')),
+                ('from_status', models.CharField(choices=[('P', 'Pendiente'), ('C', 'Confirmada'), ('X', 'Cancelada'), ('F', 'Finalizada (Atendida)')], max_length=1, verbose_name='Estado Anterior')),
+                ('to_status', models.CharField(choices=[('P', 'Pendiente'), ('C', 'Confirmada'), ('X', 'Cancelada'), ('F', 'Finalizada (Atendida)')], max_length=1, verbose_name='Estado Nuevo')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha')),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+                ('appointment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='audit_log', to='clinicapp.appointment', verbose_name='Cita')),
+            ],
+            options={
+                'verbose_name': 'Auditoría de Cita',
+                'verbose_name_plural': 'Auditoría de Citas',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinicapp', '0013_appointment_audit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Holiday',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='Fecha')),
+                ('name', models.CharField(max_length=100, verbose_name='Nombre')),
+            ],
+            options={
+                'verbose_name': 'Feriado',
+                'verbose_name_plural': 'Feriados',
+                'ordering': ['date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SpecialistAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Fecha')),
+                ('grid', models.CharField(max_length=20, verbose_name='Grilla')),
+                ('working_mask', models.BigIntegerField(verbose_name='Slots de Atención')),
+                ('free_mask', models.BigIntegerField(verbose_name='Slots Libres')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Actualizado')),
+                ('specialist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability', to='clinicapp.specialist', verbose_name='Especialista')),
+            ],
+            options={
+                'verbose_name': 'Disponibilidad Precalculada',
+                'verbose_name_plural': 'Disponibilidad Precalculada',
+                'constraints': [models.UniqueConstraint(fields=('specialist', 'date'), name='availability_specialist_date_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TimeOff',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField(verbose_name='Desde')),
+                ('end_date', models.DateField(verbose_name='Hasta')),
+                ('kind', models.CharField(choices=[('V', 'Vacaciones'), ('E', 'Licencia Médica'), ('O', 'Otro')], default='V', max_length=1, verbose_name='Tipo')),
+                ('reason', models.CharField(blank=True, max_length=200, verbose_name='Motivo')),
+                ('specialist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='time_off', to='clinicapp.specialist', verbose_name='Especialista')),
+            ],
+            options={
+                'verbose_name': 'Ausencia',
+                'verbose_name_plural': 'Ausencias',
+                'ordering': ['specialist', 'start_date'],
+                'indexes': [models.Index(fields=['specialist', 'end_date'], name='timeoff_spec_end_idx')],
+                'constraints': [models.CheckConstraint(condition=models.Q(('end_date__gte', models.F('start_date'))), name='time_off_end_after_start')],
+            },
+        ),
+        migrations.CreateModel(
+            name='WorkingHours',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Lunes'), (1, 'Martes'), (2, 'Miércoles'), (3, 'Jueves'), (4, 'Viernes'), (5, 'Sábado'), (6, 'Domingo')], verbose_name='Día de la Semana')),
+                ('start_time', models.TimeField(verbose_name='Desde')),
+                ('end_time', models.TimeField(verbose_name='Hasta')),
+                ('specialist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='working_hours', to='clinicapp.specialist', verbose_name='Especialista')),
+            ],
+            options={
+                'verbose_name': 'Horario de Atención',
+                'verbose_name_plural': 'Horarios de Atención',
+                'ordering': ['specialist', 'weekday', 'start_time'],
+                'constraints': [models.CheckConstraint(condition=models.Q(('end_time__gt', models.F('start_time'))), name='working_hours_end_after_start')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:12
+
+from django.db import migrations, models
+
+
+def allow_all_existing(apps, schema_editor):
+    """
+    Hasta ahora cualquier especialista podía tomar cualquier servicio: se
+    conserva eso para los datos existentes y recepción ajusta después.
+    """
+    Service = apps.get_model('clinicapp', 'Service')
+    Specialist = apps.get_model('clinicapp', 'Specialist')
+    Capability = Service.specialists.through
+    Capability.objects.bulk_create([
+        Capability(service_id=service_id, specialist_id=specialist_id)
+        for service_id in Service.objects.values_list('pk', flat=True)
+        for specialist_id in Specialist.objects.values_list('pk', flat=True)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinicapp', '0014_specialist_calendar'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='specialists',
+            field=models.ManyToManyField(blank=True, related_name='services', to='clinicapp.specialist', verbose_name='Especialistas que lo Realizan'),
+        ),
+        migrations.RunPython(allow_all_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinicapp', '0015_service_specialists'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField(verbose_name='Desde')),
+                ('end_date', models.DateField(verbose_name='Hasta')),
+                ('status', models.CharField(choices=[('W', 'En Espera'), ('B', 'Cita Asignada'), ('X', 'Retirada')], default='W', max_length=1, verbose_name='Estado')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Inscripción')),
+                ('appointment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='clinicapp.appointment', verbose_name='Cita Asignada')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to=settings.AUTH_USER_MODEL, verbose_name='Paciente')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='clinicapp.service', verbose_name='Servicio')),
+                ('specialist', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='clinicapp.specialist', verbose_name='Especialista')),
+            ],
+            options={
+                'verbose_name': 'Inscripción en Lista de Espera',
+                'verbose_name_plural': 'Lista de Espera',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'specialist', 'start_date'], name='waitlist_status_spec_idx')],
+                'constraints': [models.CheckConstraint(condition=models.Q(('end_date__gte', models.F('start_date'))), name='waitlist_end_after_start')],
+            },
+        ),
+    ]
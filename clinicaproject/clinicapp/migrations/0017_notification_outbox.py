@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:17
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinicapp', '0016_waitlist'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('confirmation', 'Confirmación'), ('reminder', 'Recordatorio')], max_length=20, verbose_name='Tipo')),
+                ('recipient', models.EmailField(max_length=254, verbose_name='Destinatario')),
+                ('subject', models.CharField(max_length=200, verbose_name='Asunto')),
+                ('body', models.TextField(verbose_name='Mensaje')),
+                ('status', models.CharField(choices=[('P', 'Pendiente'), ('S', 'Enviado'), ('F', 'Fallido')], default='P', max_length=1, verbose_name='Estado')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Próximo Intento')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Enviado')),
+                ('last_error', models.TextField(blank=True, verbose_name='Último Error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Creado')),
+                ('appointment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='clinicapp.appointment', verbose_name='Cita')),
+            ],
+            options={
+                'verbose_name': 'Aviso',
+                'verbose_name_plural': 'Avisos',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='notification_queue_idx')],
+                'constraints': [models.UniqueConstraint(fields=('appointment', 'kind'), name='notification_appointment_kind_uniq')],
+            },
+        ),
+    ]
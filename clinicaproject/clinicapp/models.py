@@ -1,13 +1,32 @@
-from django.db import models
+import hashlib
+import json
+from datetime import date, datetime, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+from .events import publish
+
+
+def add_minutes(t, minutes):
+    """Suma minutos a una hora (datetime.time)."""
+    return (datetime.combine(date.min, t) + timedelta(minutes=minutes)).time()
+
 # --- MODELOS PRINCIPALES ---
 
 class Service(models.Model):
     name = models.CharField(max_length=100, unique=True, verbose_name="Nombre del Servicio")
     description = models.TextField(verbose_name="Descripción")
     price = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True, verbose_name="Precio Estimado")
+    duration_minutes = models.PositiveSmallIntegerField(default=60, verbose_name="Duración (minutos)")
+    # Especialistas capacitados para realizarlo (ver get_capability_map)
+    specialists = models.ManyToManyField(
+        'Specialist', blank=True, related_name='services', verbose_name="Especialistas que lo Realizan"
+    )
 
     class Meta:
         verbose_name = "Servicio"
@@ -22,6 +41,10 @@ class Specialist(models.Model):
     last_name = models.CharField(max_length=50, verbose_name="Apellido")
     specialty = models.CharField(max_length=100, verbose_name="Especialidad Principal")
     email = models.EmailField(unique=True, verbose_name="Correo Electrónico")
+    user = models.OneToOneField(
+        User, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='specialist_profile', verbose_name="Usuario"
+    )
 
     class Meta:
         verbose_name = "Especialista"
@@ -78,10 +101,271 @@ class PacienteProfile(models.Model):
 
 
 # --- ROLES ---
+def get_group_names(user):
+    """
+    Devuelve un frozenset con los nombres de los grupos del usuario.
+    Se consulta una sola vez y se guarda en la instancia (que vive lo que dura
+    el request), así decoradores, vistas y plantillas no repiten la consulta.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    if not hasattr(user, '_group_names_cache'):
+        user._group_names_cache = frozenset(user.groups.values_list('name', flat=True))
+    return user._group_names_cache
+
+
+def clear_group_names_cache(user):
+    """Olvida los grupos cacheados (ej. al cambiar la membresía del usuario)."""
+    user.__dict__.pop('_group_names_cache', None)
+
+
 def is_recepcionista(user):
-    return user.groups.filter(name='Recepcionista').exists()
+    return 'Recepcionista' in get_group_names(user)
 
 User.add_to_class('is_recepcionista', is_recepcionista)
+
+
+# --- RESUMEN DIARIO (ROLLUP) ---
+# Posiciones dentro de la tupla de estado de Appointment.ROLLUP_FIELDS
+ROLLUP_DATE, ROLLUP_SPECIALIST, ROLLUP_SERVICE, ROLLUP_STATUS, ROLLUP_IS_PAID, ROLLUP_FINAL_PRICE = range(6)
+
+
+def _replace(row, index, value):
+    """Copia de la tupla `row` con `value` en la posición `index`."""
+    return row[:index] + (value,) + row[index + 1:]
+
+
+# --- EVENTOS PARA LOS PANELES EN TIEMPO REAL ---
+# Clase CSS (Bootstrap) del badge de cada estado
+STATUS_BADGE_CLASSES = {
+    'P': 'bg-warning text-dark',
+    'C': 'bg-primary',
+    'X': 'bg-danger',
+    'F': 'bg-success',
+}
+
+# Tipo de evento según el estado al que pasa la cita
+STATUS_EVENT_TYPES = {'P': 'updated', 'C': 'confirmed', 'X': 'cancelled', 'F': 'attended'}
+
+
+def appointment_event(pk, before, after, start=None, previous_start=None):
+    """
+    Delta de una cita para los paneles, a partir de sus estados (tuplas de
+    Appointment.ROLLUP_FIELDS) antes y después del cambio; None = no existía / ya no existe.
+    `start` y `previous_start` son la hora de inicio después y antes del cambio
+    (previous_start=None si no cambió o no se conoce).
+    """
+    state = after or before
+    if before is None:
+        kind = 'created'
+    elif after is None:
+        kind = 'deleted'
+    elif after[ROLLUP_STATUS] != before[ROLLUP_STATUS]:
+        kind = STATUS_EVENT_TYPES[after[ROLLUP_STATUS]]
+        if kind == 'attended' and after[ROLLUP_IS_PAID]:
+            kind = 'paid'
+    elif after[ROLLUP_IS_PAID] and not before[ROLLUP_IS_PAID]:
+        kind = 'paid'
+    elif after[ROLLUP_DATE] != before[ROLLUP_DATE]:
+        kind = 'rescheduled'
+    elif previous_start is not None and start is not None and previous_start != start:
+        kind = 'rescheduled'
+    else:
+        kind = 'updated'
+
+    event = {
+        'id': pk,
+        'type': kind,
+        'status': state[ROLLUP_STATUS],
+        'status_display': dict(Appointment.STATUS_CHOICES)[state[ROLLUP_STATUS]],
+        'badge_class': STATUS_BADGE_CLASSES.get(state[ROLLUP_STATUS], 'bg-secondary'),
+        'is_paid': state[ROLLUP_IS_PAID],
+        'date': state[ROLLUP_DATE].isoformat(),
+        'specialist_id': state[ROLLUP_SPECIALIST],
+        'service_id': state[ROLLUP_SERVICE],
+    }
+    if start is not None:
+        event['time'] = start.strftime('%H:%M')
+    return event
+
+
+# Se envía dentro de la transacción con los pares (specialist_id, fecha) cuyas
+# citas cambiaron; signals.py recalcula ahí la disponibilidad precalculada.
+appointments_changed = Signal()
+
+# Se envía después de appointments_changed con los pk de las citas activas que
+# pasaron a Cancelada; signals.py ofrece esos horarios a la lista de espera.
+appointments_cancelled = Signal()
+
+# Igual, con los pk de las citas que pasaron a Confirmada; signals.py encola el
+# aviso al paciente en la tabla Notification (lo envía send_notifications).
+appointments_confirmed = Signal()
+
+
+def publish_appointment_changes(changes):
+    """
+    Avisa de cambios de citas, dados como (pk, antes, después, hora, hora anterior)
+    con los estados de Appointment.ROLLUP_FIELDS (ver appointment_event). La disponibilidad se actualiza en la
+    misma transacción, como las cancelaciones (a la lista de espera) y las
+    confirmaciones (al outbox de avisos); los eventos a los paneles salen solo
+    si la transacción se confirma.
+    """
+    if not changes:
+        return
+    days = {
+        (state[ROLLUP_SPECIALIST], state[ROLLUP_DATE])
+        for _, before, after, *_ in changes
+        for state in (before, after) if state
+    }
+    appointments_changed.send(sender=Appointment, days=days)
+    cancelled = [
+        pk for pk, before, after, *_ in changes
+        if before and after and after[ROLLUP_STATUS] == 'X' and before[ROLLUP_STATUS] in Appointment.ACTIVE_STATUSES
+    ]
+    if cancelled:
+        appointments_cancelled.send(sender=Appointment, pks=cancelled)
+    confirmed = [
+        pk for pk, before, after, *_ in changes
+        if after and after[ROLLUP_STATUS] == 'C' and (not before or before[ROLLUP_STATUS] != 'C')
+    ]
+    if confirmed:
+        appointments_confirmed.send(sender=Appointment, pks=confirmed)
+    events = [appointment_event(*change) for change in changes]
+    transaction.on_commit(lambda: [publish(event) for event in events])
+
+
+# --- CONSULTAS DE CITAS ---
+# Cada método corresponde a un patrón de acceso de los paneles y tiene un índice
+# compuesto en Appointment.Meta.indexes que lo respalda.
+class AppointmentQuerySet(models.QuerySet):
+    def active(self):
+        """Citas que ocupan horario (Pendientes o Confirmadas)."""
+        return self.filter(status__in=Appointment.ACTIVE_STATUSES)
+
+    def upcoming(self, today=None):
+        """Citas activas desde hoy en adelante (panel de recepción)."""
+        return self.active().filter(date__gte=today or timezone.localdate()).order_by('date', 'time')
+
+    def for_specialist_day(self, specialist_id, day):
+        """Citas activas de un especialista en un día (panel del estilista, disponibilidad)."""
+        return self.active().filter(specialist_id=specialist_id, date=day).order_by('time')
+
+    def overlapping(self, specialist_id, day, start, end):
+        """Citas activas del especialista cuyo intervalo [time, end_time) se cruza con [start, end)."""
+        return self.active().filter(specialist_id=specialist_id, date=day, time__lt=end, end_time__gt=start)
+
+    def for_patient(self, user):
+        """Historial de citas de un paciente, de la más reciente a la más antigua."""
+        return self.filter(patient=user).order_by('-date', '-time')
+
+    def bulk_transition(self, ids, from_statuses, to_status, actor=None, transition=''):
+        """
+        Cambia el estado de varias citas con un único UPDATE condicional
+        (... WHERE id IN (...) AND status IN from_statuses). Solo escribe la
+        columna status. Debe llamarse dentro de una transacción. Con
+        settings.CLINIC_APPOINTMENT_AUDIT registra un AppointmentAudit por cita.
+
+        Devuelve {id: resultado}, con resultado 'ok', 'not_found' o el estado
+        actual de la cita si no admitía la transición.
+        """
+        rows = {
+            row[0]: row[1:]
+            for row in self.select_for_update().filter(pk__in=ids).values_list('pk', *Appointment.ROLLUP_FIELDS)
+        }
+        current = {pk: row[ROLLUP_STATUS] for pk, row in rows.items()}
+        eligible = [pk for pk, status in current.items() if status in from_statuses]
+        if eligible:
+            self.filter(pk__in=eligible, status__in=from_statuses).update(status=to_status)
+            DailyAppointmentSummary.apply_changes(
+                [rows[pk] for pk in eligible],
+                [_replace(rows[pk], ROLLUP_STATUS, to_status) for pk in eligible],
+            )
+            publish_appointment_changes([
+                (pk, rows[pk], _replace(rows[pk], ROLLUP_STATUS, to_status), None, None) for pk in eligible
+            ])
+            if getattr(settings, 'CLINIC_APPOINTMENT_AUDIT', True):
+                AppointmentAudit.objects.bulk_create(
+                    AppointmentAudit(
+                        appointment_id=pk, transition=transition,
+                        from_status=rows[pk][ROLLUP_STATUS], to_status=to_status, actor=actor,
+                    )
+                    for pk in eligible
+                )
+
+        outcomes = {}
+        for pk in ids:
+            if pk not in current:
+                outcomes[pk] = 'not_found'
+            elif current[pk] in from_statuses:
+                outcomes[pk] = 'ok'
+            else:
+                outcomes[pk] = current[pk]
+        return outcomes
+
+    def bulk_reschedule(self, ids, new_date):
+        """
+        Mueve varias citas activas a new_date conservando su hora, con un único
+        UPDATE. Las que caerían fuera del horario del especialista ese día
+        (horario semanal, ausencias, feriados) quedan como 'off_schedule'; las
+        que chocarían con otra cita del mismo especialista, como 'conflict'.
+        Debe llamarse dentro de una transacción.
+        """
+        # availability importa este módulo: se importa aquí para evitar el ciclo
+        from .availability import compute_availability
+
+        rows = {
+            row[0]: row[1:]
+            for row in self.select_for_update().filter(pk__in=ids).values_list(
+                'pk', 'time', 'end_time', *Appointment.ROLLUP_FIELDS
+            )
+        }
+        current = {
+            pk: (row[2 + ROLLUP_STATUS], row[2 + ROLLUP_SPECIALIST], row[0], row[1])
+            for pk, row in rows.items()
+        }
+        # Intervalos ya ocupados en la fecha destino, por especialista
+        taken = {}
+        for specialist_id, start, end in (
+            self.active().filter(date=new_date, specialist_id__in={row[1] for row in current.values()})
+            .exclude(pk__in=ids)
+            .values_list('specialist_id', 'time', 'end_time')
+        ):
+            taken.setdefault(specialist_id, []).append((start, end))
+        # Calendario de cada especialista en la fecha destino (consultas fijas para todo el lote)
+        calendar = compute_availability({(row[1], new_date) for row in current.values()})
+
+        outcomes = {}
+        movable = []
+        for pk in ids:
+            if pk not in current:
+                outcomes[pk] = 'not_found'
+                continue
+            status, specialist_id, start, end = current[pk]
+            intervals = taken.setdefault(specialist_id, [])
+            if status not in Appointment.ACTIVE_STATUSES:
+                outcomes[pk] = status
+            elif not calendar[specialist_id, new_date].is_working(start, end):
+                outcomes[pk] = 'off_schedule'
+            elif any(start < other_end and other_start < end for other_start, other_end in intervals):
+                outcomes[pk] = 'conflict'
+            else:
+                intervals.append((start, end))
+                movable.append(pk)
+                outcomes[pk] = 'ok'
+
+        if movable:
+            self.filter(pk__in=movable).update(date=new_date)
+            DailyAppointmentSummary.apply_changes(
+                [rows[pk][2:] for pk in movable],
+                [_replace(rows[pk][2:], ROLLUP_DATE, new_date) for pk in movable],
+            )
+            publish_appointment_changes([
+                (pk, rows[pk][2:], _replace(rows[pk][2:], ROLLUP_DATE, new_date), rows[pk][0], None)
+                for pk in movable
+            ])
+        return outcomes
+
+
 class Appointment(models.Model):
     # ... (contenido existente) ...
     patient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='appointments', verbose_name="Paciente")
@@ -89,6 +373,8 @@ class Appointment(models.Model):
     specialist = models.ForeignKey(Specialist, on_delete=models.CASCADE, verbose_name="Especialista")
     date = models.DateField(default=timezone.localdate, verbose_name="Fecha de la Cita")
     time = models.TimeField(default=timezone.now, verbose_name="Hora de la Cita")
+    # Hora de término (time + duración del servicio); se calcula al guardar
+    end_time = models.TimeField(null=True, blank=True, editable=False, verbose_name="Hora de Término")
 
     STATUS_CHOICES = [
         ('P', 'Pendiente'),
@@ -96,6 +382,16 @@ class Appointment(models.Model):
         ('X', 'Cancelada'),
         ('F', 'Finalizada (Atendida)'), # Nuevo estado para el estilista
     ]
+    # Estados que ocupan un horario del especialista
+    ACTIVE_STATUSES = ('P', 'C')
+    # Máquina de estados: transición -> estados de origen, estado destino,
+    # campos que además fija y condiciones extra sobre la fila
+    TRANSITIONS = {
+        'confirm': {'from': ('P',), 'to': 'C'},
+        'cancel': {'from': ('P', 'C'), 'to': 'X'},
+        'attend': {'from': ('P', 'C'), 'to': 'F'},
+        'pay': {'from': ('C', 'F'), 'to': 'F', 'set': {'is_paid': True}, 'guard': {'is_paid': False}},
+    }
     status = models.CharField(max_length=1, choices=STATUS_CHOICES, default='P', verbose_name="Estado")
     
     is_paid = models.BooleanField(default=False, verbose_name="¿Pagada?")
@@ -103,11 +399,36 @@ class Appointment(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
 
+    objects = AppointmentQuerySet.as_manager()
+
+    # Campos que determinan la fila de DailyAppointmentSummary a la que aporta la cita
+    ROLLUP_FIELDS = ('date', 'specialist_id', 'service_id', 'status', 'is_paid', 'final_price')
+
     class Meta:
         verbose_name = "Cita"
         verbose_name_plural = "Citas"
-        unique_together = ('specialist', 'date', 'time')
         ordering = ['date', 'time']
+        constraints = [
+            # Un especialista no puede tener dos citas activas a la misma hora.
+            # Las canceladas/finalizadas no cuentan, así un horario cancelado se puede volver a reservar.
+            models.UniqueConstraint(
+                fields=['specialist', 'date', 'time'],
+                condition=models.Q(status__in=('P', 'C')),
+                name='unique_active_appointment_slot',
+            ),
+        ]
+        indexes = [
+            # Mis citas: patient = ? ORDER BY date, time
+            models.Index(fields=['patient', 'date', 'time'], name='appt_patient_date_time_idx'),
+            # Recepción: date >= ? AND status IN ('P', 'C') ORDER BY date, time
+            # No es parcial: SQLite no usa un índice parcial cuando el estado
+            # llega como parámetro (status IN (?, ?)), que es como lo envía Django.
+            models.Index(fields=['date', 'time'], name='appt_date_time_idx'),
+            # Estilista / disponibilidad / solapamiento:
+            # specialist = ? AND date = ? AND time < ? AND end_time > ?
+            # (el índice parcial de la restricción única no sirve para consultas parametrizadas)
+            models.Index(fields=['specialist', 'date', 'time'], name='appt_spec_date_time_idx'),
+        ]
 
     def __str__(self):
         return f"Cita {self.id} - {self.patient.username} con {self.specialist} para {self.service.name}"
@@ -116,18 +437,455 @@ class Appointment(models.Model):
     def precio_estimado(self):
         return self.service.price or 0.00
         
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Estado al cargar, para calcular el delta del resumen diario al guardar
+        if not instance.get_deferred_fields() & set(cls.ROLLUP_FIELDS):
+            instance._rollup_snapshot = instance.rollup_state()
+        # Y la hora, para avisar a los paneles de un cambio de hora como reprogramación
+        if 'time' not in instance.get_deferred_fields():
+            instance._time_snapshot = instance.time
+        return instance
+
+    def rollup_state(self):
+        return tuple(getattr(self, field) for field in self.ROLLUP_FIELDS)
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        # El snapshot de from_db queda en otra instancia: se renueva aquí
+        if self.get_deferred_fields() & set(self.ROLLUP_FIELDS):
+            self.__dict__.pop('_rollup_snapshot', None)
+        else:
+            self._rollup_snapshot = self.rollup_state()
+        if 'time' in self.get_deferred_fields():
+            self.__dict__.pop('_time_snapshot', None)
+        else:
+            self._time_snapshot = self.time
+
+    def save(self, *args, **kwargs):
+        # Mantiene end_time al día con la hora y la duración del servicio
+        if self.time and self.service_id:
+            self.end_time = add_minutes(self.time, self.service.duration_minutes)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'time' in update_fields:
+                kwargs['update_fields'] = set(update_fields) | {'end_time'}
+
+        with transaction.atomic():
+            if self._state.adding:
+                before = previous_time = None
+            else:
+                before = getattr(self, '_rollup_snapshot', None)
+                previous_time = getattr(self, '_time_snapshot', None)
+                if before is None or previous_time is None:
+                    row = Appointment.objects.filter(pk=self.pk).values_list('time', *self.ROLLUP_FIELDS).first()
+                    if row:
+                        previous_time, before = row[0], before or row[1:]
+            super().save(*args, **kwargs)
+            after = self.rollup_state()
+            if before != after:
+                DailyAppointmentSummary.apply_changes([before] if before else [], [after])
+            publish_appointment_changes([(self.pk, before, after, self.time, previous_time)])
+        self._rollup_snapshot = after
+        self._time_snapshot = self.time
+
+    def transition(self, name, actor=None, **values):
+        """
+        Aplica la transición `name` (ver TRANSITIONS) con un único UPDATE condicional:
+        UPDATE ... WHERE id = ? AND status = <estado leído> [AND guardas].
+        Solo escribe las columnas que cambian; `values` agrega otras (ej. final_price).
+
+        Devuelve True si se aplicó. False si el estado leído no admite la transición
+        o si la cita cambió entre la lectura y el UPDATE (refresh_from_db para verlo).
+        Al aplicarse actualiza el resumen diario, avisa a los paneles y, con
+        settings.CLINIC_APPOINTMENT_AUDIT, registra un AppointmentAudit.
+        """
+        rule = self.TRANSITIONS[name]
+        before = getattr(self, '_rollup_snapshot', None) or self.rollup_state()
+        guard = rule.get('guard', {})
+        from_status = before[ROLLUP_STATUS]
+        if from_status not in rule['from'] or any(getattr(self, field) != value for field, value in guard.items()):
+            return False
+
+        changes = {'status': rule['to'], **rule.get('set', {}), **values}
+        with transaction.atomic():
+            applied = Appointment.objects.filter(pk=self.pk, status=from_status, **guard).update(**changes)
+            if not applied:
+                return False
+            for field, value in changes.items():
+                setattr(self, field, value)
+            after = self.rollup_state()
+            DailyAppointmentSummary.apply_changes([before], [after])
+            publish_appointment_changes([(self.pk, before, after, self.time, None)])
+            if getattr(settings, 'CLINIC_APPOINTMENT_AUDIT', True):
+                AppointmentAudit.objects.create(
+                    appointment_id=self.pk, transition=name,
+                    from_status=from_status, to_status=rule['to'], actor=actor,
+                )
+        self._rollup_snapshot = after
+        return True
+
+    class SlotTaken(Exception):
+        """El horario ya fue tomado por otra cita activa del especialista."""
+
+    def reserve(self):
+        """
+        Guarda la cita insertando primero y validando después, dentro de la misma
+        transacción (en vez de check-then-insert):
+          - la restricción única rechaza dos citas activas con la misma hora de inicio;
+          - luego se buscan solapamientos de intervalo con otras citas activas.
+        El bloqueo sobre el especialista serializa sus reservas en PostgreSQL;
+        en SQLite la escritura ya es exclusiva. Si el horario no está libre,
+        lanza Appointment.SlotTaken.
+        """
+        try:
+            with transaction.atomic():
+                list(Specialist.objects.select_for_update().filter(pk=self.specialist_id).values_list('pk'))
+                self.save()
+                if Appointment.objects.overlapping(
+                    self.specialist_id, self.date, self.time, self.end_time
+                ).exclude(pk=self.pk).exists():
+                    raise Appointment.SlotTaken()
+        except IntegrityError as exc:
+            raise Appointment.SlotTaken() from exc
+
     @property
     def get_status_badge_class(self):
         """Devuelve la clase CSS de Bootstrap según el estado."""
-        if self.status == 'P':
-            return 'bg-warning text-dark'
-        elif self.status == 'C':
-            return 'bg-primary'
-        elif self.status == 'X':
-            return 'bg-danger'
-        elif self.status == 'F':
-            return 'bg-success'
-        return 'bg-secondary'
+        return STATUS_BADGE_CLASSES.get(self.status, 'bg-secondary')
+
+
+class DailyAppointmentSummary(models.Model):
+    """
+    Resumen diario desnormalizado de citas por (fecha, especialista, servicio, estado).
+    Se mantiene de forma incremental al crear, cambiar de estado o cobrar una cita;
+    `manage.py rebuild_daily_summary` lo reconstruye y verifica contra Appointment.
+    """
+    date = models.DateField(verbose_name="Fecha")
+    specialist = models.ForeignKey(Specialist, on_delete=models.CASCADE, verbose_name="Especialista")
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, verbose_name="Servicio")
+    status = models.CharField(max_length=1, choices=Appointment.STATUS_CHOICES, verbose_name="Estado")
+    count = models.PositiveIntegerField(default=0, verbose_name="Citas")
+    paid_count = models.PositiveIntegerField(default=0, verbose_name="Citas Pagadas")
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Ingresos")
+
+    class Meta:
+        verbose_name = "Resumen Diario"
+        verbose_name_plural = "Resúmenes Diarios"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'specialist', 'service', 'status'], name='unique_daily_summary_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.specialist_id}/{self.service_id}/{self.status}: {self.count}"
+
+    @staticmethod
+    def contribution(state):
+        """(clave, citas, pagadas, ingresos) con que una cita aporta al resumen."""
+        day, specialist_id, service_id, status, is_paid, final_price = state
+        revenue = (final_price or 0) if is_paid else 0
+        return (day, specialist_id, service_id, status), 1, 1 if is_paid else 0, revenue
+
+    @classmethod
+    def apply_changes(cls, before, after):
+        """
+        Resta el aporte de los estados `before` y suma el de `after`, agrupando
+        por clave y aplicando un UPDATE con F() por fila del resumen afectada.
+        """
+        deltas = {}
+        for states, sign in ((before, -1), (after, 1)):
+            for state in states:
+                key, count, paid, revenue = cls.contribution(state)
+                delta = deltas.setdefault(key, [0, 0, 0])
+                delta[0] += sign * count
+                delta[1] += sign * paid
+                delta[2] += sign * revenue
+
+        for (day, specialist_id, service_id, status), (count, paid, revenue) in deltas.items():
+            if not (count or paid or revenue):
+                continue
+            key = dict(date=day, specialist_id=specialist_id, service_id=service_id, status=status)
+            updated = cls.objects.filter(**key).update(
+                count=models.F('count') + count,
+                paid_count=models.F('paid_count') + paid,
+                revenue=models.F('revenue') + revenue,
+            )
+            # Un delta negativo sin fila previa no tiene nada que descontar
+            if not updated and count > 0:
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(count=count, paid_count=paid, revenue=revenue, **key)
+                except IntegrityError:
+                    # Otra transacción creó la fila al mismo tiempo: se suma sobre ella
+                    cls.objects.filter(**key).update(
+                        count=models.F('count') + count,
+                        paid_count=models.F('paid_count') + paid,
+                        revenue=models.F('revenue') + revenue,
+                    )
+
+    @classmethod
+    def expected_rows(cls):
+        """Resumen calculado directamente desde Appointment (para reconstruir o verificar)."""
+        return (
+            Appointment.objects.order_by()
+            .values('date', 'specialist_id', 'service_id', 'status')
+            .annotate(
+                count=models.Count('id'),
+                paid_count=models.Count('id', filter=models.Q(is_paid=True)),
+                revenue=Coalesce(
+                    models.Sum('final_price', filter=models.Q(is_paid=True)),
+                    models.Value(0),
+                    output_field=models.DecimalField(max_digits=12, decimal_places=2),
+                ),
+            )
+        )
+
+
+class AppointmentAudit(models.Model):
+    """Registro de cada transición de estado aplicada a una cita (quién, cuándo, de qué a qué)."""
+    appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, related_name='audit_log', verbose_name="Cita")
+    transition = models.CharField(max_length=20, blank=True, verbose_name="Transición")
+    from_status = models.CharField(max_length=1, choices=Appointment.STATUS_CHOICES, verbose_name="Estado Anterior")
+    to_status = models.CharField(max_length=1, choices=Appointment.STATUS_CHOICES, verbose_name="Estado Nuevo")
+    actor = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name="Usuario"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Fecha")
+
+    class Meta:
+        verbose_name = "Auditoría de Cita"
+        verbose_name_plural = "Auditoría de Citas"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Cita {self.appointment_id}: {self.from_status} -> {self.to_status}"
+
+
+# --- LISTA DE ESPERA ---
+class WaitlistEntry(models.Model):
+    """
+    Paciente que espera un horario para un servicio, con un especialista o con
+    cualquiera, dentro de un rango de fechas. Cuando se cancela una cita,
+    waitlist.backfill_cancelled le asigna el horario liberado.
+    """
+    STATUS_CHOICES = [
+        ('W', 'En Espera'),
+        ('B', 'Cita Asignada'),
+        ('X', 'Retirada'),
+    ]
+    patient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='waitlist_entries', verbose_name="Paciente")
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, verbose_name="Servicio")
+    # Vacío = cualquier especialista que realice el servicio
+    specialist = models.ForeignKey(
+        Specialist, on_delete=models.CASCADE, null=True, blank=True, verbose_name="Especialista"
+    )
+    start_date = models.DateField(verbose_name="Desde")
+    end_date = models.DateField(verbose_name="Hasta")
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES, default='W', verbose_name="Estado")
+    appointment = models.ForeignKey(
+        Appointment, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name="Cita Asignada"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Inscripción")
+
+    class Meta:
+        verbose_name = "Inscripción en Lista de Espera"
+        verbose_name_plural = "Lista de Espera"
+        ordering = ['created_at']
+        indexes = [
+            # Cancelación: status = 'W' AND (specialist = ? OR specialist IS NULL) AND start_date <= ?
+            models.Index(fields=['status', 'specialist', 'start_date'], name='waitlist_status_spec_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(end_date__gte=models.F('start_date')),
+                name='waitlist_end_after_start',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.patient.username} - {self.service} ({self.start_date} a {self.end_date})"
+
+
+# --- AVISOS AL PACIENTE (OUTBOX) ---
+class Notification(models.Model):
+    """
+    Aviso pendiente de envío (outbox). Se escribe en la misma transacción que
+    el cambio que lo origina y `manage.py send_notifications` lo envía después,
+    por lotes y con reintentos, así ninguna vista espera al servidor de correo.
+    """
+    KIND_CHOICES = [
+        ('confirmation', 'Confirmación'),
+        ('reminder', 'Recordatorio'),
+    ]
+    STATUS_CHOICES = [
+        ('P', 'Pendiente'),
+        ('S', 'Enviado'),
+        ('F', 'Fallido'),
+    ]
+    appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, related_name='notifications', verbose_name="Cita")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name="Tipo")
+    recipient = models.EmailField(verbose_name="Destinatario")
+    subject = models.CharField(max_length=200, verbose_name="Asunto")
+    body = models.TextField(verbose_name="Mensaje")
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES, default='P', verbose_name="Estado")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Intentos")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Próximo Intento")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Enviado")
+    last_error = models.TextField(blank=True, verbose_name="Último Error")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Creado")
+
+    class Meta:
+        verbose_name = "Aviso"
+        verbose_name_plural = "Avisos"
+        ordering = ['-created_at']
+        indexes = [
+            # Worker: status = 'P' AND next_attempt_at <= ? ORDER BY next_attempt_at
+            models.Index(fields=['status', 'next_attempt_at'], name='notification_queue_idx'),
+        ]
+        constraints = [
+            # Un aviso de cada tipo por cita: encolar dos veces no duplica envíos
+            models.UniqueConstraint(fields=['appointment', 'kind'], name='notification_appointment_kind_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} - cita {self.appointment_id} ({self.get_status_display()})"
+
+
+# --- CAPACIDADES: QUÉ ESPECIALISTAS REALIZAN CADA SERVICIO ---
+# El mapa completo servicio -> especialistas se arma con una consulta y queda
+# en la caché hasta que cambia la relación (signals.py lo descarta). La versión
+# es un hash del contenido: sirve de ETag y para que el cliente detecte cambios.
+# El descarte solo llega a todos los workers si la caché es compartida
+# (settings.CLINIC_CACHE); el vencimiento acota lo que dura un mapa viejo si no.
+CAPABILITY_MAP_CACHE_KEY = 'clinicapp:capability_map'
+CAPABILITY_MAP_TIMEOUT = 5 * 60
+
+
+def get_capability_map():
+    """Devuelve (versión, {service_id: [specialist_id, ...]})."""
+    cached = cache.get(CAPABILITY_MAP_CACHE_KEY)
+    if cached is None:
+        mapping = {}
+        for service_id, specialist_id in Service.specialists.through.objects.order_by(
+            'service_id', 'specialist_id',
+        ).values_list('service_id', 'specialist_id'):
+            mapping.setdefault(service_id, []).append(specialist_id)
+        version = hashlib.sha1(json.dumps(mapping, sort_keys=True).encode()).hexdigest()[:16]
+        cached = (version, mapping)
+        cache.set(CAPABILITY_MAP_CACHE_KEY, cached, CAPABILITY_MAP_TIMEOUT)
+    return cached
+
+
+def clear_capability_map():
+    """Descarta el mapa cacheado (se vuelve a armar en la próxima consulta)."""
+    cache.delete(CAPABILITY_MAP_CACHE_KEY)
+
+
+def performs_service(specialist_id, service_id):
+    """Indica si el especialista realiza el servicio, sin consultar la base si el mapa está cacheado."""
+    return specialist_id in get_capability_map()[1].get(service_id, ())
+
+
+# --- CALENDARIO DE LOS ESPECIALISTAS ---
+WEEKDAY_CHOICES = [
+    (0, 'Lunes'), (1, 'Martes'), (2, 'Miércoles'), (3, 'Jueves'),
+    (4, 'Viernes'), (5, 'Sábado'), (6, 'Domingo'),
+]
+
+
+class WorkingHours(models.Model):
+    """
+    Tramo de atención semanal de un especialista (un día puede tener varios,
+    ej. mañana y tarde). Un especialista sin tramos atiende en toda la grilla.
+    """
+    specialist = models.ForeignKey(Specialist, on_delete=models.CASCADE, related_name='working_hours', verbose_name="Especialista")
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES, verbose_name="Día de la Semana")
+    start_time = models.TimeField(verbose_name="Desde")
+    end_time = models.TimeField(verbose_name="Hasta")
+
+    class Meta:
+        verbose_name = "Horario de Atención"
+        verbose_name_plural = "Horarios de Atención"
+        ordering = ['specialist', 'weekday', 'start_time']
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(end_time__gt=models.F('start_time')),
+                name='working_hours_end_after_start',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.specialist} - {self.get_weekday_display()} {self.start_time:%H:%M}-{self.end_time:%H:%M}"
+
+
+class TimeOff(models.Model):
+    """Días completos en que el especialista no atiende (vacaciones, licencias)."""
+    KIND_CHOICES = [
+        ('V', 'Vacaciones'),
+        ('E', 'Licencia Médica'),
+        ('O', 'Otro'),
+    ]
+    specialist = models.ForeignKey(Specialist, on_delete=models.CASCADE, related_name='time_off', verbose_name="Especialista")
+    start_date = models.DateField(verbose_name="Desde")
+    end_date = models.DateField(verbose_name="Hasta")
+    kind = models.CharField(max_length=1, choices=KIND_CHOICES, default='V', verbose_name="Tipo")
+    reason = models.CharField(max_length=200, blank=True, verbose_name="Motivo")
+
+    class Meta:
+        verbose_name = "Ausencia"
+        verbose_name_plural = "Ausencias"
+        ordering = ['specialist', 'start_date']
+        indexes = [
+            models.Index(fields=['specialist', 'end_date'], name='timeoff_spec_end_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(end_date__gte=models.F('start_date')),
+                name='time_off_end_after_start',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.specialist} - {self.get_kind_display()} ({self.start_date} a {self.end_date})"
+
+
+class Holiday(models.Model):
+    """Feriado: la clínica no atiende ese día."""
+    date = models.DateField(unique=True, verbose_name="Fecha")
+    name = models.CharField(max_length=100, verbose_name="Nombre")
+
+    class Meta:
+        verbose_name = "Feriado"
+        verbose_name_plural = "Feriados"
+        ordering = ['date']
+
+    def __str__(self):
+        return f"{self.name} ({self.date})"
+
+
+class SpecialistAvailability(models.Model):
+    """
+    Disponibilidad precalculada de un especialista en un día, como los bitsets
+    de availability.DayAvailability. La mantiene availability.refresh_availability
+    (al cambiar citas, horarios, ausencias o feriados). `grid` identifica la
+    grilla con que se calculó: si cambia la configuración, la fila se ignora.
+    """
+    specialist = models.ForeignKey(Specialist, on_delete=models.CASCADE, related_name='availability', verbose_name="Especialista")
+    date = models.DateField(verbose_name="Fecha")
+    grid = models.CharField(max_length=20, verbose_name="Grilla")
+    working_mask = models.BigIntegerField(verbose_name="Slots de Atención")
+    free_mask = models.BigIntegerField(verbose_name="Slots Libres")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Actualizado")
+
+    class Meta:
+        verbose_name = "Disponibilidad Precalculada"
+        verbose_name_plural = "Disponibilidad Precalculada"
+        constraints = [
+            models.UniqueConstraint(fields=['specialist', 'date'], name='availability_specialist_date_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.specialist_id} {self.date}"
 
 
 # --- PERFIL DEL PACIENTE ---\r\n
@@ -0,0 +1,139 @@
+import smtplib
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Appointment, Notification
+
+# --- AVISOS AL PACIENTE ---
+# Los avisos se encolan en Notification dentro de la transacción del cambio
+# (confirmación) o con `manage.py queue_reminders` (recordatorios), con el
+# asunto y el texto ya armados. `manage.py send_notifications` los envía por
+# lotes con una sola conexión SMTP, limitando la tasa y reintentando con
+# espera exponencial los que fallan. Mientras habla con el servidor de correo
+# no mantiene ninguna transacción abierta.
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RATE = 10  # avisos por segundo
+RETRY_BASE_SECONDS = 60
+# Segundos mínimos que un lote tomado queda reservado para su worker
+LEASE_SECONDS = 300
+
+
+def _message(appointment, kind):
+    when = f"{appointment.date:%d/%m/%Y} a las {appointment.time:%H:%M}"
+    if kind == 'confirmation':
+        subject = f"Cita confirmada: {appointment.service.name}"
+        intro = "Su cita fue confirmada."
+    else:
+        subject = f"Recordatorio: su cita de mañana ({appointment.service.name})"
+        intro = "Le recordamos su cita de mañana."
+    body = (
+        f"Hola {appointment.patient.first_name or appointment.patient.username}:\n\n"
+        f"{intro}\n"
+        f"Servicio: {appointment.service.name}\n"
+        f"Especialista: {appointment.specialist.full_name()}\n"
+        f"Fecha: {when}\n"
+    )
+    return Notification(
+        appointment=appointment, kind=kind, recipient=appointment.patient.email, subject=subject, body=body,
+    )
+
+
+def _enqueue(appointments, kind):
+    notifications = [
+        _message(appointment, kind)
+        for appointment in appointments.exclude(patient__email='').select_related('patient', 'service', 'specialist')
+    ]
+    # La restricción única (cita, tipo) descarta los ya encolados
+    Notification.objects.bulk_create(notifications, ignore_conflicts=True)
+    return len(notifications)
+
+
+def enqueue_confirmations(pks):
+    """Encola el aviso de confirmación de las citas dadas (una consulta y un INSERT)."""
+    return _enqueue(Appointment.objects.filter(pk__in=pks), 'confirmation')
+
+
+def queue_reminders(day=None):
+    """
+    Encola recordatorios para las citas Confirmadas de `day` (por defecto,
+    mañana), seleccionadas en una sola consulta. Repetirlo no duplica avisos.
+    Devuelve cuántas citas tienen recordatorio.
+    """
+    day = day or timezone.localdate() + timedelta(days=1)
+    return _enqueue(Appointment.objects.filter(date=day, status='C'), 'reminder')
+
+
+def claim_batch(batch_size, lease_seconds):
+    """
+    Toma hasta `batch_size` avisos vencidos en una transacción corta y les
+    corre next_attempt_at `lease_seconds` hacia adelante (préstamo): ningún
+    otro worker los toma mientras tanto, y si este worker muere se vuelven a
+    tomar cuando vence el préstamo.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        pks = list(
+            Notification.objects.select_for_update(skip_locked=True).filter(
+                status='P', next_attempt_at__lte=now,
+            ).order_by('next_attempt_at').values_list('pk', flat=True)[:batch_size]
+        )
+        if pks:
+            Notification.objects.filter(pk__in=pks).update(next_attempt_at=now + timedelta(seconds=lease_seconds))
+    return list(Notification.objects.filter(pk__in=pks).order_by('pk')) if pks else []
+
+
+def send_pending(batch_size=100, max_attempts=None, rate=None):
+    """
+    Envía un lote de avisos pendientes cuyo próximo intento ya venció.
+    Las filas se toman (claim_batch) y el resultado se guarda en dos
+    transacciones cortas; el envío SMTP y la espera del límite de tasa corren
+    sin transacción abierta, así no se bloquea la base para las reservas.
+    Varios workers pueden correr a la vez. Devuelve (enviados, fallidos).
+    """
+    max_attempts = max_attempts or getattr(settings, 'CLINIC_NOTIFICATION_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    rate = rate or getattr(settings, 'CLINIC_NOTIFICATION_RATE', DEFAULT_RATE)
+    sent = failed = 0
+
+    # El préstamo cubre con holgura lo que tarda el lote al ritmo permitido
+    batch = claim_batch(batch_size, LEASE_SECONDS + 2 * batch_size / rate)
+    if not batch:
+        return sent, failed
+
+    connection = get_connection()
+    try:
+        for notification in batch:
+            started = time.monotonic()
+            message = EmailMessage(
+                notification.subject, notification.body, to=[notification.recipient], connection=connection,
+            )
+            try:
+                message.send()
+            except (smtplib.SMTPException, OSError) as exc:
+                notification.attempts += 1
+                notification.last_error = f"{type(exc).__name__}: {exc}"
+                if notification.attempts >= max_attempts:
+                    notification.status = 'F'
+                else:
+                    delay = RETRY_BASE_SECONDS * 2 ** (notification.attempts - 1)
+                    notification.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+                failed += 1
+            else:
+                notification.attempts += 1
+                notification.status = 'S'
+                notification.sent_at = timezone.now()
+                sent += 1
+            # Limita la tasa de envío (el servidor de correo suele imponer un máximo)
+            time.sleep(max(0, 1 / rate - (time.monotonic() - started)))
+    finally:
+        connection.close()
+        # También si el envío se interrumpe: lo ya enviado queda registrado
+        with transaction.atomic():
+            Notification.objects.bulk_update(
+                batch, ['status', 'attempts', 'next_attempt_at', 'sent_at', 'last_error'],
+            )
+    return sent, failed
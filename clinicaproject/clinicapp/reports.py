@@ -0,0 +1,176 @@
+from calendar import monthrange
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from .availability import compute_availability
+from .models import Appointment, DailyAppointmentSummary, Service, Specialist
+
+# --- REPORTES DE INGRESOS Y OCUPACIÓN ---
+# Todo se calcula en la base de datos con annotate/aggregate sobre el resumen
+# diario (DailyAppointmentSummary), no sobre la tabla de citas. Cada período se
+# resume en contadores sumables (ingresos, citas, canceladas, inasistencias,
+# minutos reservados) para poder combinar meses cerrados cacheados con el
+# período en curso, que siempre se calcula en vivo. Solo se cachean meses
+# calendario completos y ya cerrados (una clave por mes, con expiración), así
+# la caché no crece con cada rango distinto que se consulte.
+
+REPORT_CACHE_PREFIX = 'clinicapp:report'
+# Un mes cerrado puede corregirse después (pagos cargados tarde): se recalcula a diario
+REPORT_CACHE_TIMEOUT = 24 * 60 * 60
+
+COUNTERS = ('revenue', 'appointments', 'paid', 'cancelled', 'no_show', 'booked_minutes')
+
+
+def _counters(today):
+    """Agregados que se calculan para cada dimensión (día, servicio, especialista)."""
+    return {
+        'revenue': Sum('revenue'),
+        'appointments': Sum('count'),
+        'paid': Sum('paid_count'),
+        'cancelled': Sum('count', filter=Q(status='X')),
+        # Inasistencia: la fecha ya pasó y la cita sigue Pendiente o Confirmada
+        'no_show': Sum('count', filter=Q(status__in=Appointment.ACTIVE_STATUSES, date__lt=today)),
+        'booked_minutes': Sum(F('count') * F('service__duration_minutes'), filter=~Q(status='X')),
+    }
+
+
+def _summarize(start, end, today):
+    """Contadores de [start, end] por día, servicio y especialista (tres consultas)."""
+    rollup = DailyAppointmentSummary.objects.filter(date__range=(start, end)).order_by()
+    counters = _counters(today)
+    summary = {}
+    for dimension, field in (('by_day', 'date'), ('by_service', 'service_id'), ('by_specialist', 'specialist_id')):
+        rows = rollup.values(key=F(field)).annotate(**counters)
+        summary[dimension] = {
+            row['key']: {name: row[name] or 0 for name in COUNTERS}
+            for row in rows
+        }
+    return summary
+
+
+def _periods(start, end, today):
+    """
+    Divide [start, end] en meses calendario. Devuelve (inicio, fin, cerrado);
+    un período está cerrado si termina antes de hoy.
+    """
+    periods = []
+    current = start
+    while current <= end:
+        month_end = current.replace(day=monthrange(current.year, current.month)[1])
+        period_end = min(month_end, end)
+        if current < today <= period_end:
+            # El mes en curso se corta: lo anterior a hoy queda cerrado, hoy en adelante es vivo
+            periods.append((current, today - timedelta(days=1), True))
+            periods.append((today, period_end, False))
+        else:
+            periods.append((current, period_end, period_end < today))
+        current = period_end + timedelta(days=1)
+    return periods
+
+
+def _period_summary(start, end, closed, today):
+    """
+    Resumen de un período. Los meses completos y cerrados se guardan en caché
+    (clave por mes); los tramos parciales o abiertos se calculan en vivo.
+    """
+    full_month = start.day == 1 and end.day == monthrange(end.year, end.month)[1]
+    if not (closed and full_month):
+        return _summarize(start, end, today)
+    key = f'{REPORT_CACHE_PREFIX}:{start:%Y-%m}'
+    summary = cache.get(key)
+    if summary is None:
+        summary = _summarize(start, end, today)
+        cache.set(key, summary, REPORT_CACHE_TIMEOUT)
+    return summary
+
+
+def _capacity(specialist_ids, start, end):
+    """
+    Minutos de atención de cada especialista en [start, end] según su horario
+    semanal, ausencias y feriados (compute_availability, cuatro consultas).
+    """
+    days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    computed = compute_availability((specialist_id, day) for specialist_id in specialist_ids for day in days)
+    capacity = dict.fromkeys(specialist_ids, 0)
+    for (specialist_id, _), availability in computed.items():
+        capacity[specialist_id] += availability.working.bit_count() * availability.slot_minutes
+    return capacity
+
+
+def _merge(target, source):
+    for dimension, rows in source.items():
+        merged = target.setdefault(dimension, {})
+        for key, counters in rows.items():
+            into = merged.setdefault(key, dict.fromkeys(COUNTERS, 0))
+            for name in COUNTERS:
+                into[name] += counters[name]
+
+
+def _rate(part, whole):
+    return round(part / whole, 4) if whole else 0.0
+
+
+def _with_rates(counters):
+    row = dict(counters)
+    row['revenue'] = Decimal(row['revenue']).quantize(Decimal('0.01'))
+    row['cancellation_rate'] = _rate(counters['cancelled'], counters['appointments'])
+    row['no_show_rate'] = _rate(counters['no_show'], counters['appointments'])
+    return row
+
+
+def build_report(start, end):
+    """
+    Reporte de ingresos, cancelaciones, inasistencias y ocupación para [start, end].
+
+    Devuelve un dict con 'by_day', 'by_service', 'by_specialist' (listas) y 'totals'.
+    La ocupación de cada especialista es minutos reservados / minutos de atención
+    del rango según su horario, descontando ausencias y feriados.
+    """
+    today = timezone.localdate()
+    merged = {}
+    for period_start, period_end, closed in _periods(start, end, today):
+        _merge(merged, _period_summary(period_start, period_end, closed, today))
+
+    by_day = merged.get('by_day', {})
+    by_service = merged.get('by_service', {})
+    by_specialist = merged.get('by_specialist', {})
+
+    totals = dict.fromkeys(COUNTERS, 0)
+    for counters in by_day.values():
+        for name in COUNTERS:
+            totals[name] += counters[name]
+
+    capacity = _capacity(list(by_specialist), start, end)
+
+    service_names = dict(Service.objects.filter(pk__in=by_service).values_list('pk', 'name'))
+    specialist_names = {
+        pk: f"{first} {last}"
+        for pk, first, last in Specialist.objects.filter(pk__in=by_specialist).values_list('pk', 'first_name', 'last_name')
+    }
+
+    specialists = []
+    for pk, counters in sorted(by_specialist.items()):
+        row = _with_rates(counters)
+        row.update(
+            specialist_id=pk,
+            specialist=specialist_names.get(pk, ''),
+            available_minutes=capacity[pk],
+            utilization=_rate(counters['booked_minutes'], capacity[pk]),
+        )
+        specialists.append(row)
+
+    return {
+        'start': start,
+        'end': end,
+        'by_day': [dict(_with_rates(counters), date=day) for day, counters in sorted(by_day.items())],
+        'by_service': [
+            dict(_with_rates(counters), service_id=pk, service=service_names.get(pk, ''))
+            for pk, counters in sorted(by_service.items())
+        ],
+        'by_specialist': specialists,
+        'totals': _with_rates(totals),
+    }
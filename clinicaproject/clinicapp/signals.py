@@ -0,0 +1,182 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .availability import availability_horizon, refresh_availability
+from .decorators import bump_public_pages_version, revoke_role_claims
+from .events import publish
+from .notifications import enqueue_confirmations
+from .waitlist import backfill_cancelled
+from .models import (
+    Appointment, DailyAppointmentSummary, Holiday, Service, Specialist, TimeOff, WorkingHours,
+    appointments_cancelled, appointments_changed, appointments_confirmed, clear_capability_map, clear_group_names_cache, publish_appointment_changes,
+    appointment_event,
+)
+
+
+# --- INVALIDACIÓN DE ROLES CACHEADOS ---
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_group_names(sender, instance, action, **kwargs):
+    """Si cambian los grupos de un usuario, descarta su frozenset cacheado."""
+    if action in ('post_add', 'post_remove', 'post_clear') and isinstance(instance, User):
+        clear_group_names_cache(instance)
+
+
+# --- REVOCACIÓN DE CLAIMS DE ROL ---
+@receiver(post_save, sender=User)
+def revoke_claims_on_user_change(sender, instance, update_fields=None, **kwargs):
+    """is_active, la contraseña o el staff pueden haber cambiado (el login solo toca last_login)."""
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    revoke_role_claims(instance.pk)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def revoke_claims_on_group_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Cambia el rol: desde el usuario (user.groups) o desde el grupo (group.user_set)."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        revoke_role_claims(instance.pk)
+    elif action == 'pre_clear':
+        for user_id in instance.user_set.values_list('pk', flat=True):
+            revoke_role_claims(user_id)
+    else:
+        for user_id in pk_set:
+            revoke_role_claims(user_id)
+
+
+@receiver([post_save, post_delete], sender=Specialist)
+def revoke_claims_on_specialist_change(sender, instance, **kwargs):
+    """El id de especialista de los claims puede haber cambiado."""
+    if instance.user_id:
+        revoke_role_claims(instance.user_id)
+
+
+# --- INVALIDACIÓN DE PÁGINAS PÚBLICAS ---
+@receiver([post_save, post_delete], sender=Service)
+@receiver([post_save, post_delete], sender=Specialist)
+def invalidate_public_pages(sender, **kwargs):
+    """Inicio, servicios y equipo muestran Service/Specialist: se regeneran al editarlos."""
+    bump_public_pages_version()
+
+
+# --- MAPA DE CAPACIDADES ---
+@receiver(m2m_changed, sender=Service.specialists.through)
+def invalidate_capability_map(sender, action, **kwargs):
+    """Al cambiar qué especialistas realizan un servicio se rearma el mapa (tras confirmar)."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(clear_capability_map)
+
+
+@receiver(post_delete, sender=Service)
+@receiver(post_delete, sender=Specialist)
+def invalidate_capability_map_on_delete(sender, **kwargs):
+    """El borrado en cascada de la relación no envía m2m_changed."""
+    transaction.on_commit(clear_capability_map)
+
+
+# --- BORRADOS EN CASCADA ---
+def cascade_deleted(origin):
+    """
+    Especialistas y servicios que se están borrando cuando un post_delete viene
+    en cascada de ellos (`origin` del signal): {modelo: pks}. Sus filas de
+    resumen y disponibilidad se borran con ellos, así que no hay que
+    recalcularlas (volver a escribirlas rompería la clave foránea).
+    """
+    if isinstance(origin, (Specialist, Service)):
+        return {type(origin): {origin.pk}}
+    if isinstance(origin, QuerySet) and origin.model in (Specialist, Service):
+        # Una sola consulta por borrado, aunque arrastre muchas filas
+        if not hasattr(origin, '_cascade_pks'):
+            origin._cascade_pks = set(origin.values_list('pk', flat=True))
+        return {origin.model: origin._cascade_pks}
+    return {}
+
+
+# --- RESUMEN DIARIO ---
+@receiver(post_delete, sender=Appointment)
+def remove_from_daily_summary(sender, instance, **kwargs):
+    """Al borrar una cita se descuenta su aporte del resumen diario y se avisa a los paneles."""
+    deleted = cascade_deleted(kwargs.get('origin'))
+    specialist_deleted = instance.specialist_id in deleted.get(Specialist, ())
+    state = instance.rollup_state()
+    if not specialist_deleted and instance.service_id not in deleted.get(Service, ()):
+        DailyAppointmentSummary.apply_changes([state], [])
+    if specialist_deleted:
+        # Su disponibilidad desaparece con él: solo se avisa a los paneles
+        event = appointment_event(instance.pk, state, None, instance.time)
+        transaction.on_commit(lambda: publish(event))
+    else:
+        publish_appointment_changes([(instance.pk, state, None, instance.time, None)])
+
+
+# --- DISPONIBILIDAD PRECALCULADA ---
+@receiver(appointments_changed, sender=Appointment)
+def refresh_changed_days(sender, days, **kwargs):
+    """Recalcula solo los (especialista, día) cuyas citas cambiaron, en la misma transacción."""
+    first, last = availability_horizon()
+    refresh_availability((specialist_id, day) for specialist_id, day in days if first <= day < last)
+
+
+def calendar_pairs(instance):
+    """
+    Pares (specialist_id, fecha) dentro del horizonte que afecta un horario,
+    una ausencia o un feriado: solo esos se recalculan al editarlo.
+    """
+    first, last = availability_horizon()
+    if isinstance(instance, Holiday):
+        days = [instance.date] if first <= instance.date < last else []
+        return {(pk, day) for pk in Specialist.objects.values_list('pk', flat=True) for day in days}
+    if isinstance(instance, TimeOff):
+        start, end = max(instance.start_date, first), min(instance.end_date, last - timedelta(days=1))
+        days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    else:
+        # WorkingHours: los días de ese día de la semana
+        offset = (instance.weekday - first.weekday()) % 7
+        days = [first + timedelta(days=offset + 7 * week) for week in range(((last - first).days - offset + 6) // 7)]
+    return {(instance.specialist_id, day) for day in days}
+
+
+@receiver(pre_save, sender=WorkingHours)
+@receiver(pre_save, sender=TimeOff)
+@receiver(pre_save, sender=Holiday)
+def remember_calendar_pairs(sender, instance, raw=False, **kwargs):
+    """Al editar, los días que cubría antes también cambian (se liberan)."""
+    previous = None if raw or instance.pk is None else sender.objects.filter(pk=instance.pk).first()
+    instance._previous_calendar_pairs = calendar_pairs(previous) if previous else set()
+
+
+@receiver([post_save, post_delete], sender=WorkingHours)
+@receiver([post_save, post_delete], sender=TimeOff)
+def refresh_specialist_calendar(sender, instance, **kwargs):
+    """Un horario recalcula sus días de la semana; una ausencia, solo su rango (y el anterior)."""
+    if kwargs.get('raw') or instance.specialist_id in cascade_deleted(kwargs.get('origin')).get(Specialist, ()):
+        return
+    refresh_availability(calendar_pairs(instance) | instance.__dict__.pop('_previous_calendar_pairs', set()))
+
+
+@receiver([post_save, post_delete], sender=Holiday)
+def refresh_holiday(sender, instance, **kwargs):
+    """Un feriado afecta a todos los especialistas, pero solo en su fecha (y la anterior, si se movió)."""
+    if kwargs.get('raw'):
+        return
+    refresh_availability(calendar_pairs(instance) | instance.__dict__.pop('_previous_calendar_pairs', set()))
+
+
+# --- LISTA DE ESPERA ---
+@receiver(appointments_cancelled, sender=Appointment)
+def backfill_from_waitlist(sender, pks, **kwargs):
+    """Los horarios cancelados se asignan a la lista de espera en la misma transacción."""
+    backfill_cancelled(pks)
+
+
+# --- AVISOS AL PACIENTE ---
+@receiver(appointments_confirmed, sender=Appointment)
+def enqueue_confirmation_notices(sender, pks, **kwargs):
+    """El aviso se escribe en el outbox con la confirmación; el envío queda para el worker."""
+    enqueue_confirmations(pks)
@@ -0,0 +1,55 @@
+// clinicapp/static/js/panel_eventos.js
+// Actualiza los paneles de recepción y del estilista con los cambios de citas
+// que llegan por SSE, sin recargar la página completa.
+
+document.addEventListener('DOMContentLoaded', function() {
+    const panel = document.querySelector('[data-events-url]');
+    if (!panel || !window.EventSource) {
+        return;
+    }
+    const aviso = document.getElementById('panel-novedades');
+    const avisoTexto = document.getElementById('panel-novedades-texto');
+    let novedades = 0;
+
+    // --- Aviso de citas que no están en la página (nuevas o movidas) ---
+    function avisarNovedad(texto) {
+        novedades += 1;
+        avisoTexto.textContent = texto || `Hay ${novedades} cambio(s) que no se muestran en esta página.`;
+        aviso.classList.remove('d-none');
+    }
+
+    // --- Actualiza la fila de la cita afectada ---
+    function aplicarCambio(cita) {
+        const fila = panel.querySelector(`[data-appointment-id="${cita.id}"]`);
+        if (!fila) {
+            if (cita.type === 'created' || cita.type === 'rescheduled') {
+                avisarNovedad();
+            }
+            return;
+        }
+
+        const badge = fila.querySelector('.js-status');
+        if (cita.type === 'deleted') {
+            badge.textContent = 'Eliminada';
+            badge.className = 'badge bg-secondary js-status';
+        } else {
+            badge.textContent = cita.is_paid ? `${cita.status_display} (Pagada)` : cita.status_display;
+            badge.className = `badge ${cita.badge_class} js-status`;
+        }
+
+        // Las que ya no están activas (o cambiaron de día) quedan atenuadas
+        const activa = (cita.status === 'P' || cita.status === 'C') && cita.type !== 'deleted' && cita.type !== 'rescheduled';
+        fila.classList.toggle('opacity-50', !activa);
+        if (cita.type === 'rescheduled') {
+            avisarNovedad();
+        }
+    }
+
+    const fuente = new EventSource(panel.dataset.eventsUrl);
+    fuente.addEventListener('appointment', function(evento) {
+        aplicarCambio(JSON.parse(evento.data));
+    });
+    fuente.addEventListener('reload', function() {
+        avisarNovedad('Se perdieron cambios mientras el panel estuvo desconectado.');
+    });
+});
@@ -5,13 +5,13 @@ document.addEventListener('DOMContentLoaded', function() {
     const especialistaSelect = document.getElementById('especialista_id');
     const fechaInput = document.getElementById('fecha_hora');
     
-    // Obtenemos los datos de estilistas y servicios que pasamos desde Django
-    // Esto es un placeholder; en un entorno real, usarías AJAX para obtener datos en vivo.
-    const especialistasPorServicio = {
-        // Ejemplo de cómo se verían los datos si los pasaras:
-        // '1': ['Estilista_A_ID', 'Estilista_B_ID'], // Servicio ID 1
-        // '2': ['Estilista_C_ID']                     // Servicio ID 2
-    };
+    // Mapa servicio -> especialistas que lo realizan, embebido por la vista (json_script).
+    // Los ids se pasan a texto para compararlos con los value de los <option>.
+    const capacidades = JSON.parse(document.getElementById('especialistas-por-servicio').textContent);
+    const especialistasPorServicio = {};
+    Object.entries(capacidades.services).forEach(([servicioId, especialistas]) => {
+        especialistasPorServicio[servicioId] = especialistas.map(String);
+    });
 
     // --- Función de Filtrado de Estilistas ---
     function filtrarEstilistas() {
@@ -63,5 +63,5 @@ document.addEventListener('DOMContentLoaded', function() {
     fechaInput.addEventListener('change', verificarDisponibilidad);
 
     // Ejecutar al cargar para inicializar el filtro
-    // filtrarEstilistas(); 
+    filtrarEstilistas();
 });
\ No newline at end of file
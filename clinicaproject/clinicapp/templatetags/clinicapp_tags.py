@@ -1,7 +1,7 @@
 # clinicapp/templatetags/clinicapp_tags.py
 
 from django import template
-from django.contrib.auth.models import Group
+from clinicapp.models import get_group_names
 
 # 1. Crear la instancia de la biblioteca (este nombre 'register' es obligatorio)
 register = template.Library()
@@ -16,5 +16,5 @@ def is_in_group(user, group_name):
     if not user.is_authenticated:
         return False
         
-    # La lógica robusta para chequear el grupo
-    return user.groups.filter(name=group_name).exists()
\ No newline at end of file
+    # Reutiliza los grupos ya cargados en este request
+    return group_name in get_group_names(user)
\ No newline at end of file
@@ -1,3 +1,1232 @@
-from django.test import TestCase
+import csv
+import re
+import socket
+import threading
+import unittest
+from datetime import time, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.contrib.auth.models import AnonymousUser, Group, User
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.http import HttpResponse, StreamingHttpResponse
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.template import Context, Template
+from django.urls import reverse
+from django.utils import timezone
+
+from .availability import (
+    DayAvailability, check_slot_grid, compute_availability, first_available_slots, get_day_availability,
+    refresh_availability,
+)
+from .decorators import is_in_group, public_page_cache
+from .events import InProcessBroker, get_broker
+from .hashers import ClinicPBKDF2PasswordHasher
+from .forms import AppointmentForm
+from .importers import import_appointments, lookup_tables
+from .notifications import queue_reminders, send_pending
+from .utils import decode_cursor, encode_cursor
+from .reports import REPORT_CACHE_PREFIX, REPORT_CACHE_TIMEOUT, build_report
+from .models import (
+    CAPABILITY_MAP_CACHE_KEY, clear_group_names_cache, get_capability_map, get_group_names,
+    Appointment, AppointmentAudit, DailyAppointmentSummary, Holiday, Notification, Service, Specialist, SpecialistAvailability, TimeOff, WaitlistEntry,
+    WorkingHours,
+)
+
+
+# --- DATOS DE PRUEBA ---
+PASSWORD = 'clave-segura'
+
+
+def make_user(username, group=None, **fields):
+    """Usuario <username>@example.com con PASSWORD; `group` lo agrega a ese grupo."""
+    user = User.objects.create_user(username, f'{username}@example.com', PASSWORD, **fields)
+    if group:
+        user.groups.add(Group.objects.get_or_create(name=group)[0])
+    return user
+
+
+def make_service(name="Limpieza Facial", **fields):
+    fields.setdefault('description', "-")
+    fields.setdefault('price', 100)
+    return Service.objects.create(name=name, **fields)
+
+
+def make_specialist(first_name="Ana", last_name="Lira", **fields):
+    fields.setdefault('specialty', "Facial")
+    fields.setdefault('email', f'{first_name.lower()}@example.com')
+    return Specialist.objects.create(first_name=first_name, last_name=last_name, **fields)
+
+
+def make_clinic(**service_fields):
+    """Paciente 'paciente', servicio "Limpieza Facial" y especialista Ana Lira."""
+    return make_user('paciente'), make_service(**service_fields), make_specialist()
+
+
+class ClinicFixtureMixin:
+    """
+    Datos base de la clínica (make_clinic) en cls.patient, cls.service y
+    cls.specialist, más cls.day dentro de una semana. `service_fields` ajusta
+    el servicio (ej. su duración).
+    """
+    service_fields = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.patient, cls.service, cls.specialist = make_clinic(**cls.service_fields)
+        cls.day = timezone.localdate() + timedelta(days=7)
+
+
+# --- PLANES DE CONSULTA DE LOS PANELES ---
+@unittest.skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN de SQLite")
+class AppointmentQueryPlanTests(ClinicFixtureMixin, TestCase):
+    """
+    Cada consulta de los paneles debe resolverse con un índice sobre
+    clinicapp_appointment, nunca con un recorrido completo de la tabla. Se
+    analizan las consultas que ejecutan las vistas, con sus parámetros.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.today = timezone.localdate()
+        cls.recepcionista = make_user('recepcion', 'Recepcionista')
+        cls.estilista = make_user('estilista', 'Estilista')
+        cls.specialist.user = cls.estilista
+        cls.specialist.save()
+        for offset in range(3):
+            for hour in (10, 11):
+                Appointment.objects.create(
+                    patient=cls.patient, service=cls.service, specialist=cls.specialist,
+                    date=cls.today + timedelta(days=offset), time=time(hour),
+                )
+
+    def view_plans(self, user, url, params=None):
+        """(sql, plan) de cada SELECT a clinicapp_appointment que hace la vista."""
+        table = f'"{Appointment._meta.db_table}"'
+        executed = []
+
+        def capture(execute, sql, sql_params, many, context):
+            executed.append((sql, sql_params))
+            return execute(sql, sql_params, many, context)
+
+        self.client.force_login(user)
+        with connection.execute_wrapper(capture):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        plans = []
+        with connection.cursor() as cursor:
+            for sql, sql_params in executed:
+                if table in sql and sql.lstrip().startswith('SELECT'):
+                    cursor.execute(f'EXPLAIN QUERY PLAN {sql}', sql_params)
+                    plans.append((sql, '\n'.join(row[-1] for row in cursor.fetchall())))
+        self.assertTrue(plans, f"{url} no consultó citas")
+        return plans
+
+    def assertUsesIndex(self, plans, index):
+        table = Appointment._meta.db_table
+        for sql, plan in plans:
+            self.assertIsNone(re.search(rf'\bSCAN {table}\b', plan), f"Recorrido completo de {table}:\n{sql}\n{plan}")
+        self.assertTrue(
+            any(index in plan for _, plan in plans),
+            f"Ninguna consulta usa {index}:\n" + '\n'.join(plan for _, plan in plans),
+        )
+
+    def test_panel_recepcion(self):
+        url = reverse('panel_recepcion')
+        first = self.view_plans(self.recepcionista, url)
+        self.assertUsesIndex(first, 'appt_date_time_idx')
+        cursor = self.client.get(url).context['upcoming'][1]
+        for params in (
+            {'after': encode_cursor(cursor)},
+            {'date': self.today.isoformat()},
+            {'status': 'C', 'specialist': self.specialist.pk},
+            {'service': self.service.pk, 'patient': 'pac', 'after': encode_cursor(cursor)},
+        ):
+            with self.subTest(params=params):
+                # Con filtros SQLite puede preferir otro índice (ej. el de service_id)
+                self.assertUsesIndex(self.view_plans(self.recepcionista, url, params), 'INDEX')
+
+    def test_panel_estilista(self):
+        self.assertUsesIndex(self.view_plans(self.estilista, reverse('panel_estilista')), 'appt_spec_date_time_idx')
+
+    def test_my_appointments(self):
+        self.assertUsesIndex(self.view_plans(self.patient, reverse('my_appointments')), 'appt_patient_date_time_idx')
+
+    def test_available_times_calendar(self):
+        self.assertUsesIndex(
+            self.view_plans(self.patient, reverse('availability_calendar'), {'specialist_id': self.specialist.pk}),
+            'appt_spec_date_time_idx',
+        )
+
+
+# --- PERFIL DE BASE DE DATOS ---
+class DatabaseProfileTests(TestCase):
+    """La conexión usa el perfil configurado en settings (SQLite o PostgreSQL)."""
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', "Perfil SQLite")
+    def test_sqlite_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], connection.settings_dict['OPTIONS']['timeout'] * 1000)
+            cursor.execute("PRAGMA journal_mode")
+            # La base de tests en memoria no admite WAL
+            expected = 'memory' if connection.is_in_memory_db() else 'wal'
+            self.assertEqual(cursor.fetchone()[0], expected)
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', "Perfil PostgreSQL")
+    def test_postgresql_connections(self):
+        settings_dict = connection.settings_dict
+        self.assertTrue(settings_dict['CONN_HEALTH_CHECKS'])
+        if 'pool' in settings_dict['OPTIONS']:
+            self.assertEqual(settings_dict['CONN_MAX_AGE'], 0)
+        else:
+            self.assertGreater(settings_dict['CONN_MAX_AGE'], 0)
+
+
+# --- RESERVAS (CORREN CONTRA CUALQUIER BASE) ---
+class AppointmentBookingTests(ClinicFixtureMixin, TestCase):
+    service_fields = {'duration_minutes': 90}
+
+    def book(self, hour, minute=0, status='P'):
+        appointment = Appointment(
+            patient=self.patient, service=self.service, specialist=self.specialist,
+            date=self.day, time=time(hour, minute), status=status,
+        )
+        appointment.reserve()
+        return appointment
+
+    def test_reserve_sets_end_time(self):
+        self.assertEqual(self.book(10).end_time, time(11, 30))
+
+    def test_same_slot_is_rejected(self):
+        self.book(10)
+        with self.assertRaises(Appointment.SlotTaken):
+            self.book(10)
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_overlapping_interval_is_rejected(self):
+        self.book(10)
+        with self.assertRaises(Appointment.SlotTaken):
+            self.book(11)
+        self.book(12)
+
+    def test_cancelled_slot_can_be_booked_again(self):
+        appointment = self.book(10)
+        appointment.status = 'X'
+        appointment.save()
+        self.book(10)
+
+    def test_bulk_transition_outcomes(self):
+        pending = self.book(10)
+        cancelled = self.book(14)
+        cancelled.status = 'X'
+        cancelled.save()
+        with transaction.atomic():
+            outcomes = Appointment.objects.bulk_transition([pending.pk, cancelled.pk, 0], ('P',), 'C')
+        self.assertEqual(outcomes, {pending.pk: 'ok', cancelled.pk: 'X', 0: 'not_found'})
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, 'C')
+
+    def test_bulk_reschedule_respects_calendar(self):
+        first, second, third = self.book(10), self.book(14), self.book(16)
+        holiday, day_off, free_day = (self.day + timedelta(days=n) for n in (1, 2, 3))
+        Holiday.objects.create(date=holiday, name="Feriado")
+        TimeOff.objects.create(specialist=self.specialist, start_date=day_off, end_date=day_off)
+        Appointment(
+            patient=self.patient, service=self.service, specialist=self.specialist, date=free_day, time=time(16),
+        ).reserve()
+        with transaction.atomic():
+            self.assertEqual(Appointment.objects.bulk_reschedule([first.pk], holiday), {first.pk: 'off_schedule'})
+            self.assertEqual(Appointment.objects.bulk_reschedule([first.pk], day_off), {first.pk: 'off_schedule'})
+            outcomes = Appointment.objects.bulk_reschedule([first.pk, second.pk, third.pk], free_day)
+        self.assertEqual(outcomes, {first.pk: 'ok', second.pk: 'ok', third.pk: 'conflict'})
+        first.refresh_from_db()
+        self.assertEqual(first.date, free_day)
+
+    def test_transition_applies_once(self):
+        appointment = self.book(10)
+        self.assertTrue(appointment.transition('confirm', actor=self.patient))
+        self.assertFalse(appointment.transition('confirm'))
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.status, 'C')
+        audit = AppointmentAudit.objects.get(appointment=appointment)
+        self.assertEqual((audit.from_status, audit.to_status, audit.actor), ('P', 'C', self.patient))
+
+    def test_transition_rejects_stale_state(self):
+        appointment = self.book(10)
+        stale = Appointment.objects.get(pk=appointment.pk)
+        self.assertTrue(appointment.transition('cancel'))
+        # La otra copia todavía cree que está Pendiente: el UPDATE condicional no aplica
+        self.assertFalse(stale.transition('attend'))
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.status, 'X')
+
+    def test_pay_transition(self):
+        appointment = self.book(10)
+        self.assertFalse(appointment.transition('pay', final_price=90))
+        appointment.transition('attend')
+        self.assertTrue(appointment.transition('pay', final_price=90))
+        self.assertFalse(appointment.transition('pay', final_price=90))
+        appointment.refresh_from_db()
+        self.assertEqual((appointment.status, appointment.is_paid, appointment.final_price), ('F', True, 90))
+        call_command('rebuild_daily_summary', '--verify', stdout=StringIO())
+
+    def test_daily_summary_follows_changes(self):
+        appointment = self.book(10)
+        self.book(14)
+        appointment.status = 'F'
+        appointment.is_paid = True
+        appointment.final_price = 90
+        appointment.save()
+        Appointment.objects.filter(time=time(14)).delete()
+        call_command('rebuild_daily_summary', '--verify', stdout=StringIO())
+
+
+# --- IMPORTACIÓN DE CITAS HISTÓRICAS ---
+class ImportAppointmentsTests(ClinicFixtureMixin, TestCase):
+
+    def row(self, hour, status='P', **values):
+        return {
+            'patient': 'paciente', 'service': "Limpieza Facial", 'specialist': 'ana@example.com',
+            'date': self.day.isoformat(), 'time': hour, 'status': status, **values,
+        }
+
+    def run_import(self, *rows):
+        rejected = import_appointments(list(enumerate(rows, start=1)), lookup_tables())
+        return {number: reason for number, reason, _ in rejected}
+
+    def test_accepts_valid_rows(self):
+        self.assertEqual(self.run_import(self.row('10:00'), self.row('11:00'), self.row('10:00', status='F')), {})
+        self.assertEqual(Appointment.objects.active().count(), 2)
+        self.assertEqual(Appointment.objects.get(time=time(11)).end_time, time(12))
+        call_command('rebuild_daily_summary', '--verify', stdout=StringIO())
+
+    def test_rejects_overlapping_intervals(self):
+        Appointment(
+            patient=self.patient, service=self.service, specialist=self.specialist, date=self.day, time=time(14),
+        ).reserve()
+        rejected = self.run_import(self.row('10:00'), self.row('10:30'), self.row('14:30'), self.row('15:00'))
+        self.assertEqual(set(rejected), {2, 3})
+        self.assertEqual(
+            sorted(Appointment.objects.active().values_list('time', flat=True)), [time(10), time(14), time(15)],
+        )
+
+    def test_rejects_malformed_rows(self):
+        rejected = self.run_import(
+            self.row('10:00', patient='nadie'),
+            self.row('diez'),
+            self.row('10:00', status='Z'),
+            self.row('10:00', final_price='gratis'),
+            {'patient': 'paciente'},
+        )
+        self.assertEqual(set(rejected), {1, 2, 3, 4, 5})
+        self.assertFalse(Appointment.objects.exists())
+
+
+# --- CALENDARIO Y DISPONIBILIDAD PRECALCULADA ---
+class SpecialistCalendarTests(ClinicFixtureMixin, TestCase):
+
+    def free_slots(self):
+        return get_day_availability(self.specialist.pk, self.day).free_slots()
+
+    def test_without_schedule_uses_full_grid(self):
+        self.assertEqual(len(self.free_slots()), 9)
+
+    def test_working_hours_limit_slots(self):
+        WorkingHours.objects.create(
+            specialist=self.specialist, weekday=self.day.weekday(), start_time=time(10), end_time=time(12, 30),
+        )
+        WorkingHours.objects.create(
+            specialist=self.specialist, weekday=(self.day.weekday() + 1) % 7, start_time=time(9), end_time=time(18),
+        )
+        self.assertEqual(self.free_slots(), ['10:00', '11:00'])
+        other_day = get_day_availability(self.specialist.pk, self.day + timedelta(days=2))
+        self.assertEqual(other_day.free_slots(), [])
+
+    def test_time_off_and_holidays(self):
+        leave = TimeOff.objects.create(specialist=self.specialist, start_date=self.day, end_date=self.day)
+        self.assertEqual(self.free_slots(), [])
+        leave.delete()
+        holiday = Holiday.objects.create(date=self.day, name="Feriado")
+        self.assertEqual(self.free_slots(), [])
+        holiday.date = self.day + timedelta(days=1)
+        holiday.save()
+        self.assertEqual(len(self.free_slots()), 9)
+
+    def test_bookings_update_stored_row(self):
+        appointment = Appointment(
+            patient=self.patient, service=self.service, specialist=self.specialist, date=self.day, time=time(10),
+        )
+        appointment.reserve()
+        row = SpecialistAvailability.objects.get(specialist=self.specialist, date=self.day)
+        expected = compute_availability([(self.specialist.pk, self.day)])[self.specialist.pk, self.day]
+        self.assertEqual(row.free_mask, expected.free)
+        self.assertNotIn('10:00', self.free_slots())
+        appointment.transition('cancel')
+        self.assertIn('10:00', self.free_slots())
+
+    def test_lookup_is_a_single_query(self):
+        call_command('refresh_availability', stdout=StringIO())
+        with self.assertNumQueries(1):
+            get_day_availability(self.specialist.pk, self.day)
+
+    def test_edits_refresh_only_affected_days(self):
+        other = make_specialist("Bea", "Sosa")
+        moved = self.day + timedelta(days=3)
+
+        def refreshed(change):
+            with mock.patch('clinicapp.signals.refresh_availability', wraps=refresh_availability) as refresh:
+                change()
+            return set().union(*(call.args[0] for call in refresh.call_args_list))
+
+        holiday = Holiday(date=self.day, name="Feriado")
+        self.assertEqual(refreshed(holiday.save), {(self.specialist.pk, self.day), (other.pk, self.day)})
+        holiday.date = moved
+        self.assertEqual(refreshed(holiday.save), {(pk, day) for pk in (self.specialist.pk, other.pk) for day in (self.day, moved)})
+        self.assertEqual(len(self.free_slots()), 9)
+        self.assertEqual(refreshed(holiday.delete), {(self.specialist.pk, moved), (other.pk, moved)})
+
+        leave = TimeOff(specialist=self.specialist, start_date=self.day, end_date=self.day + timedelta(days=1))
+        self.assertEqual(refreshed(leave.save), {(self.specialist.pk, self.day), (self.specialist.pk, self.day + timedelta(days=1))})
+        self.assertEqual(self.free_slots(), [])
+        leave.start_date = leave.end_date
+        self.assertEqual(refreshed(leave.save), {(self.specialist.pk, self.day), (self.specialist.pk, self.day + timedelta(days=1))})
+        self.assertEqual(len(self.free_slots()), 9)
+
+        hours = WorkingHours(specialist=other, weekday=self.day.weekday(), start_time=time(10), end_time=time(12))
+        days = {day for _, day in refreshed(hours.save)}
+        self.assertIn(self.day, days)
+        self.assertEqual({day.weekday() for day in days}, {self.day.weekday()})
+        self.assertEqual(get_day_availability(other.pk, self.day).free_slots(), ['10:00', '11:00'])
+
+    @override_settings(CLINIC_SLOT_MINUTES=5)
+    def test_fine_grid_is_not_stored_and_warns(self):
+        self.assertEqual([w.id for w in check_slot_grid(None)], ['clinicapp.W001'])
+        with mock.patch('clinicapp.availability._unstored_grids', set()), \
+                self.assertLogs('clinicapp.availability', 'WARNING') as logs:
+            self.assertEqual(len(self.free_slots()), 108)
+            self.free_slots()
+        self.assertEqual(len(logs.records), 1)
+        self.assertFalse(SpecialistAvailability.objects.exists())
+
+    def test_delete_specialist_or_service_with_bookings(self):
+        other = make_specialist("Bea", "Sosa")
+        massage = make_service("Masaje", price=80)
+        WorkingHours.objects.create(specialist=self.specialist, weekday=self.day.weekday(), start_time=time(9), end_time=time(18))
+        TimeOff.objects.create(specialist=self.specialist, start_date=self.day + timedelta(days=1), end_date=self.day + timedelta(days=1))
+        for specialist, service, hour in ((self.specialist, self.service, 10), (other, massage, 10), (other, self.service, 11)):
+            Appointment(patient=self.patient, service=service, specialist=specialist, date=self.day, time=time(hour)).reserve()
+
+        # El borrado en cascada no vuelve a escribir filas del especialista o servicio borrado
+        self.specialist.delete()
+        massage.delete()
+        connection.check_constraints()
+        self.assertFalse(SpecialistAvailability.objects.filter(specialist_id=self.specialist.pk).exists())
+        self.assertEqual(DailyAppointmentSummary.objects.get().service, self.service)
+        # El especialista que queda recupera la hora de la cita borrada
+        self.assertEqual(get_day_availability(other.pk, self.day).free_slots(), [
+            slot for slot in DayAvailability().free_slots() if slot != '11:00'
+        ])
+
+        Specialist.objects.filter(pk=other.pk).delete()
+        connection.check_constraints()
+        self.assertFalse(DailyAppointmentSummary.objects.exists())
+
+
+class AvailabilityCalendarTests(ClinicFixtureMixin, TestCase):
+    service_fields = {'duration_minutes': 120}
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.bea = make_specialist("Bea", "Sosa")
+
+    def setUp(self):
+        self.client.force_login(self.patient)
+
+    def calendar(self, **params):
+        return self.client.get(reverse('availability_calendar'), params)
+
+    def test_several_specialists_and_days(self):
+        Appointment(patient=self.patient, service=self.service, specialist=self.specialist, date=self.day, time=time(10)).reserve()
+        Holiday.objects.create(date=self.day + timedelta(days=1), name="Feriado")
+        data = self.calendar(specialist_id=f'{self.specialist.pk},{self.bea.pk}', start=self.day, days=2).json()
+        self.assertEqual((data['start'], data['end']), (self.day.isoformat(), (self.day + timedelta(days=1)).isoformat()))
+        ana = data['calendar'][str(self.specialist.pk)]
+        self.assertEqual(list(ana), [self.day.isoformat(), (self.day + timedelta(days=1)).isoformat()])
+        self.assertNotIn('10:00', ana[self.day.isoformat()])
+        self.assertEqual(len(data['calendar'][str(self.bea.pk)][self.day.isoformat()]), 9)
+        self.assertEqual(ana[(self.day + timedelta(days=1)).isoformat()], [])
+
+    def test_service_duration_needs_consecutive_slots(self):
+        Appointment(patient=self.patient, service=self.service, specialist=self.specialist, date=self.day, time=time(10)).reserve()
+        data = self.calendar(specialist_id=self.specialist.pk, start=self.day, days=1, service_id=self.service.pk).json()
+        # La cita de 10 a 12 deja libre las 9 (solo una hora) y 12 en adelante; la última termina a las 18
+        self.assertEqual(
+            data['calendar'][str(self.specialist.pk)][self.day.isoformat()],
+            ['12:00', '13:00', '14:00', '15:00', '16:00'],
+        )
+
+    def test_invalid_parameters(self):
+        for params in ({'days': 0}, {'days': 32}, {'days': 'x'}, {'start': 'mañana'}, {'specialist_id': 'a'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.calendar(**params).status_code, 400)
+
+    def test_query_count_does_not_grow(self):
+        def count(ids, days):
+            call_command('refresh_availability', stdout=StringIO())
+            with CaptureQueriesContext(connection) as queries:
+                self.calendar(specialist_id=ids, start=self.day, days=days)
+            return len(queries)
+
+        few = count(self.specialist.pk, 1)
+        self.assertEqual(count(f'{self.specialist.pk},{self.bea.pk}', 14), few)
+
+
+# --- CAPACIDADES SERVICIO -> ESPECIALISTA ---
+class ServiceCapabilityTests(ClinicFixtureMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.bea = make_specialist("Bea", "Soto")
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.specialists.add(self.specialist)
+
+    def form(self, specialist):
+        return AppointmentForm(data={
+            'service': self.service.pk, 'specialist': specialist.pk, 'date': self.day.isoformat(), 'time': '10:00',
+        })
+
+    def test_form_rejects_unqualified_specialist(self):
+        self.assertTrue(self.form(self.specialist).is_valid())
+        form = self.form(self.bea)
+        self.assertFalse(form.is_valid())
+        self.assertIn('specialist', form.errors)
+
+    def test_map_is_shared_through_the_cache(self):
+        version, mapping = get_capability_map()
+        self.assertEqual(cache.get(CAPABILITY_MAP_CACHE_KEY), (version, mapping))
+
+    def test_map_endpoint_and_etag(self):
+        url = reverse('service_specialists')
+        response = self.client.get(url)
+        self.assertEqual(response.json()['services'], {str(self.service.pk): [self.specialist.pk]})
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.specialists.add(self.bea)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['services'], {str(self.service.pk): [self.specialist.pk, self.bea.pk]})
+
+
+# --- PRIMERAS HORAS LIBRES ---
+class FirstAvailableTests(ClinicFixtureMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.bea = make_specialist("Bea", "Soto")
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.specialists.add(self.specialist, self.bea)
+
+    def test_merges_specialists_in_time_order(self):
+        WorkingHours.objects.create(specialist=self.bea, weekday=self.day.weekday(), start_time=time(12), end_time=time(18))
+        for hour in (9, 10):
+            Appointment(
+                patient=self.patient, service=self.service, specialist=self.specialist, date=self.day, time=time(hour),
+            ).reserve()
+        found = first_available_slots([self.specialist.pk, self.bea.pk], self.day, self.day, limit=4)
+        self.assertEqual(found, [
+            (self.day, time(11), self.specialist.pk),
+            (self.day, time(12), self.specialist.pk),
+            (self.day, time(12), self.bea.pk),
+            (self.day, time(13), self.specialist.pk),
+        ])
+
+    def test_query_count_does_not_grow(self):
+        self.client.force_login(self.patient)
+        url = reverse('first_available')
+
+        def count(days):
+            call_command('refresh_availability', stdout=StringIO())
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, {'service_id': self.service.pk, 'days': days, 'limit': 10})
+            self.assertEqual(len(response.json()['slots']), 10)
+            return len(queries)
+
+        few = count(2)
+        others = [
+            make_specialist(f"E{n}", "X")
+            for n in range(5)
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.specialists.add(*others)
+        self.assertEqual(count(14), few)
+
+
+# --- LISTA DE ESPERA ---
+class WaitlistTests(ClinicFixtureMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.waiter = make_user('espera')
+        cls.other = make_user('otro')
+        cls.long_service = make_service("Tratamiento", price=300, duration_minutes=180)
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.specialists.add(self.specialist)
+            self.long_service.specialists.add(self.specialist)
+        self.appointment = Appointment(
+            patient=self.patient, service=self.service, specialist=self.specialist, date=self.day, time=time(10),
+        )
+        self.appointment.reserve()
+        # Ocupa 11:00-12:00 para que el tratamiento largo no quepa a las 10:00
+        Appointment(
+            patient=self.other, service=self.service, specialist=self.specialist, date=self.day, time=time(11),
+        ).reserve()
+
+    def wait(self, patient, service, specialist=None):
+        return WaitlistEntry.objects.create(
+            patient=patient, service=service, specialist=specialist, start_date=self.day, end_date=self.day,
+        )
+
+    def test_cancellation_books_first_fitting_waiter(self):
+        too_long = self.wait(self.other, self.long_service, self.specialist)
+        entry = self.wait(self.waiter, self.service)
+        later = self.wait(self.other, self.service, self.specialist)
+        self.assertTrue(self.appointment.transition('cancel'))
+
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'B')
+        self.assertEqual(
+            (entry.appointment.patient, entry.appointment.time, entry.appointment.status), (self.waiter, time(10), 'P'),
+        )
+        too_long.refresh_from_db()
+        later.refresh_from_db()
+        self.assertEqual((too_long.status, later.status), ('W', 'W'))
+
+    def test_bulk_cancellation_backfills(self):
+        entry = self.wait(self.waiter, self.service, self.specialist)
+        with transaction.atomic():
+            Appointment.objects.bulk_transition([self.appointment.pk], ('P', 'C'), 'X')
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'B')
+        self.assertEqual(Appointment.objects.active().filter(patient=self.waiter).count(), 1)
+
+    def test_join_view(self):
+        self.client.force_login(self.waiter)
+        self.assertEqual(self.client.get(reverse('join_waitlist')).status_code, 200)
+        response = self.client.post(reverse('join_waitlist'), {
+            'service': self.service.pk, 'specialist': '', 'start_date': self.day.isoformat(), 'end_date': self.day.isoformat(),
+        })
+        self.assertRedirects(response, reverse('my_appointments'), fetch_redirect_response=False)
+        self.assertTrue(WaitlistEntry.objects.filter(patient=self.waiter, specialist__isnull=True).exists())
+
+    def test_unqualified_specialist_is_skipped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.specialists.remove(self.specialist)
+        entry = self.wait(self.waiter, self.service)
+        self.appointment.transition('cancel')
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'W')
+
+
+# --- VISTAS ASÍNCRONAS (ASGI) ---
+class AsyncViewsTests(ClinicFixtureMixin, TestCase):
+    service_fields = {'duration_minutes': 120}
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = make_user('otro')
+        cls.appointment = Appointment(
+            patient=cls.patient, service=cls.service, specialist=cls.specialist, date=cls.day, time=time(10),
+        )
+        cls.appointment.reserve()
+
+    async def login(self, user):
+        # aforce_login no sirve con sesiones cached_db sobre la caché en base
+        # (SessionStore.aexists consulta la caché de forma síncrona): se inicia
+        # sesión con el cliente síncrono y se comparte la cookie
+        await sync_to_async(self.client.force_login)(user)
+        self.async_client.cookies = self.client.cookies
+
+    async def test_available_times_match_sync_view(self):
+        await self.login(self.patient)
+        for params in (
+            {'specialist_id': self.specialist.pk, 'date': self.day},
+            {'specialist_id': self.specialist.pk, 'date': self.day, 'service_id': self.service.pk},
+            {'specialist_id': self.specialist.pk, 'date': 'mañana'},
+            {'date': self.day},
+        ):
+            with self.subTest(params=params):
+                response = await self.async_client.get(reverse('get_available_times_async'), params)
+                expected = await sync_to_async(self.client.get)(reverse('get_available_times'), params)
+                self.assertEqual(response.json(), expected.json())
+        response = await self.async_client.get(
+            reverse('get_available_times_async'), {'specialist_id': self.specialist.pk, 'date': self.day},
+        )
+        self.assertNotIn('10:00', response.json())
+
+    async def test_appointment_status_only_for_owner(self):
+        url = reverse('appointment_status', args=[self.appointment.pk])
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 302)
+
+        await self.login(self.patient)
+        data = (await self.async_client.get(url)).json()
+        self.assertEqual((data['status'], data['status_display'], data['is_paid']), ('P', 'Pendiente', False))
+
+        await self.login(self.other)
+        self.assertEqual((await self.async_client.get(url)).status_code, 404)
+
+
+# --- FEED DE CAMBIOS (SSE) ---
+class AppointmentEventsTests(ClinicFixtureMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.recepcionista = make_user('recepcion', 'Recepcionista')
+        cls.estilista = make_user('estilista', 'Estilista')
+        cls.specialist.user = cls.estilista
+        cls.specialist.save()
+        cls.bea = make_specialist("Bea", "Sosa")
+
+    def test_broker_replays_after_last_event_id(self):
+        broker = InProcessBroker(history_size=3, queue_size=2)
+        first = broker.publish({'n': 1})
+        broker.publish({'n': 2})
+        subscription = broker.subscribe(first)
+        self.assertEqual(subscription.get(timeout=0)[1], {'n': 2})
+        self.assertIsNone(subscription.get(timeout=0))
+
+        # Un id que ya salió del historial (o de otro proceso) obliga a recargar
+        for n in range(3, 6):
+            broker.publish({'n': n})
+        self.assertTrue(broker.subscribe(first).overflowed)
+        # Un cliente que no lee a tiempo también
+        self.assertTrue(subscription.overflowed)
+        broker.unsubscribe(subscription)
+        self.assertNotIn(subscription, broker.subscriptions)
+
+    def test_changes_are_published_on_commit(self):
+        subscription = get_broker().subscribe()
+        self.addCleanup(get_broker().unsubscribe, subscription)
+        day = timezone.localdate() + timedelta(days=1)
+        with self.captureOnCommitCallbacks() as callbacks:
+            appointment = Appointment(
+                patient=self.patient, service=self.service, specialist=self.specialist, date=day, time=time(10),
+            )
+            appointment.reserve()
+            self.assertIsNone(subscription.get(timeout=0))
+        for callback in callbacks:
+            callback()
+        _, data = subscription.get(timeout=0)
+        self.assertEqual(
+            (data['id'], data['type'], data['specialist_id'], data['date'], data['time']),
+            (appointment.pk, 'created', self.specialist.pk, day.isoformat(), '10:00'),
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.transition('confirm')
+        self.assertEqual(subscription.get(timeout=0)[1]['type'], 'confirmed')
+
+    def test_time_change_is_published_as_rescheduled(self):
+        subscription = get_broker().subscribe()
+        self.addCleanup(get_broker().unsubscribe, subscription)
+        appointment = Appointment.objects.create(
+            patient=self.patient, service=self.service, specialist=self.specialist, date=self.day, time=time(10),
+        )
+        # Instancia leída completa, y otra con la hora diferida (consulta la hora anterior)
+        for instance, new_time in ((Appointment.objects.get(pk=appointment.pk), time(11)),
+                                   (Appointment.objects.defer('time').get(pk=appointment.pk), time(12))):
+            instance.time = new_time
+            with self.captureOnCommitCallbacks(execute=True):
+                instance.save()
+            _, data = subscription.get(timeout=0)
+            self.assertEqual((data['type'], data['time']), ('rescheduled', new_time.strftime('%H:%M')))
+
+        # Sin cambio de hora sigue siendo una actualización
+        instance.final_price = 25
+        with self.captureOnCommitCallbacks(execute=True):
+            instance.save()
+        self.assertEqual(subscription.get(timeout=0)[1]['type'], 'updated')
+
+    def read_events(self, user):
+        """Eventos que el stream entrega a `user` después del último publicado antes de la llamada."""
+        today = timezone.localdate()
+        last_id = get_broker().publish({'specialist_id': None, 'date': None})
+        get_broker().publish({'id': 1, 'specialist_id': self.specialist.pk, 'date': today.isoformat()})
+        get_broker().publish({'id': 2, 'specialist_id': self.bea.pk, 'date': today.isoformat()})
+        get_broker().publish({'id': 3, 'specialist_id': self.specialist.pk, 'date': (today + timedelta(days=1)).isoformat()})
+        self.client.force_login(user)
+        # El stream cierra la conexión a la base; en el test se comparte con la transacción
+        with mock.patch('clinicapp.views.connection'), mock.patch('clinicapp.views.SSE_STREAM_SECONDS', 0.2), \
+                mock.patch('clinicapp.views.SSE_HEARTBEAT_SECONDS', 0.05):
+            response = self.client.get(reverse('appointment_events'), HTTP_LAST_EVENT_ID=last_id)
+            self.assertIsInstance(response, StreamingHttpResponse)
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.startswith('retry: 3000'))
+        return [int(n) for n in re.findall(r'data: \{"id": (\d+)', body)]
+
+    def test_stream_filters_by_role(self):
+        self.assertEqual(self.read_events(self.recepcionista), [1, 2, 3])
+        # El estilista solo ve su agenda de hoy
+        self.assertEqual(self.read_events(self.estilista), [1])
+
+    def test_patients_are_rejected(self):
+        self.client.force_login(self.patient)
+        self.assertEqual(self.client.get(reverse('appointment_events')).status_code, 403)
+
+
+# --- REPORTES ---
+class ReportTests(ClinicFixtureMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Un mes calendario completo, ya cerrado
+        cls.month_end = timezone.localdate().replace(day=1) - timedelta(days=1)
+        cls.month_start = cls.month_end.replace(day=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def book(self, day, hour, status='F'):
+        return Appointment.objects.create(
+            patient=self.patient, service=self.service, specialist=self.specialist,
+            date=day, time=time(hour), end_time=time(hour + 1), status=status,
+        )
+
+    def test_utilization_uses_working_hours_time_off_and_holidays(self):
+        week = self.month_start
+        WorkingHours.objects.create(
+            specialist=self.specialist, weekday=week.weekday(), start_time=time(10), end_time=time(12),
+        )
+        WorkingHours.objects.create(
+            specialist=self.specialist, weekday=(week + timedelta(days=1)).weekday(), start_time=time(9), end_time=time(11),
+        )
+        Holiday.objects.create(date=week + timedelta(days=1), name="Feriado")
+        self.book(week, 10)
+        report = build_report(week, week + timedelta(days=6))
+        row, = report['by_specialist']
+        # Solo cuenta el primer día (2 horas); el segundo es feriado
+        self.assertEqual(row['available_minutes'], 120)
+        self.assertEqual(row['utilization'], 0.5)
+
+        TimeOff.objects.create(specialist=self.specialist, start_date=week, end_date=week)
+        row, = build_report(week, week + timedelta(days=6))['by_specialist']
+        self.assertEqual((row['available_minutes'], row['utilization']), (0, 0.0))
+
+    def test_only_full_closed_months_are_cached(self):
+        self.book(self.month_start, 10)
+        self.book(self.month_end, 11, status='X')
+        after = self.month_end + timedelta(days=3)
+        with mock.patch('clinicapp.reports.cache.set', wraps=cache.set) as cache_set:
+            report = build_report(self.month_start, after)
+        key = f'{REPORT_CACHE_PREFIX}:{self.month_start:%Y-%m}'
+        cache_set.assert_called_once_with(key, mock.ANY, REPORT_CACHE_TIMEOUT)
+        self.assertEqual(report['totals']['appointments'], 2)
+        self.assertEqual(report['totals']['cancelled'], 1)
+
+        # Otro rango que incluye el mismo mes reutiliza la entrada y no crea otra
+        with mock.patch('clinicapp.reports.cache.set', wraps=cache.set) as cache_set:
+            report = build_report(self.month_start, self.month_end + timedelta(days=1))
+        cache_set.assert_not_called()
+        self.assertEqual(report['totals']['appointments'], 2)
+
+
+# --- EXPORTACIÓN CSV ---
+class ExportAppointmentsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recepcionista = make_user('recepcion', 'Recepcionista')
+        # Textos con forma de fórmula, que el CSV debe escapar
+        cls.patient = make_user('paciente', first_name='=HYPERLINK("http://x")', last_name='-2+3')
+        cls.service = make_service("@Limpieza")
+        cls.specialist = make_specialist()
+        cls.day = timezone.localdate() - timedelta(days=3)
+        cls.appointment = Appointment.objects.create(
+            patient=cls.patient, service=cls.service, specialist=cls.specialist,
+            date=cls.day, time=time(10), status='F', final_price=-5, is_paid=True,
+        )
+
+    def test_streams_header_and_escaped_rows(self):
+        self.client.force_login(self.recepcionista)
+        response = self.client.get(reverse('export_appointments'), {'start': self.day, 'end': self.day})
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        header, row = csv.reader(b''.join(response.streaming_content).decode().splitlines())
+        self.assertEqual(header[:4], ["ID Cita", "Fecha", "Hora", "Estado"])
+        self.assertEqual(row[:4], [str(self.appointment.pk), self.day.isoformat(), '10:00:00', "Finalizada (Atendida)"])
+        # Los textos con forma de fórmula llevan una comilla; los números no se tocan
+        self.assertEqual(row[5:7], ['\'=HYPERLINK("http://x")', "'-2+3"])
+        self.assertEqual(row[8], "'@Limpieza")
+        self.assertEqual(row[-2:], ['-5.00', 'True'])
+
+    def test_invalid_range_redirects(self):
+        self.client.force_login(self.recepcionista)
+        response = self.client.get(reverse('export_appointments'), {'start': 'ayer'})
+        self.assertRedirects(response, reverse('panel_recepcion'), fetch_redirect_response=False)
+
+
+# --- PANEL DE RECEPCIÓN (PAGINACIÓN POR CLAVE) ---
+class PanelRecepcionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recepcionista = make_user('recepcion', 'Recepcionista')
+        cls.ana = make_user('ana.paciente', first_name='Ana')
+        cls.beto = make_user('beto', first_name='Roberto')
+        cls.facial = make_service()
+        cls.masaje = make_service("Masaje", price=80)
+        cls.specialists = [make_specialist(f"Esp{n}") for n in range(3)]
+        day = timezone.localdate() + timedelta(days=1)
+        # Varias citas con la misma fecha y hora: el id desempata el orden
+        for offset in range(3):
+            for hour in (10, 11):
+                for n, specialist in enumerate(cls.specialists):
+                    Appointment.objects.create(
+                        patient=cls.ana if n % 2 else cls.beto, service=cls.masaje if n == 2 else cls.facial,
+                        specialist=specialist, date=day + timedelta(days=offset), time=time(hour),
+                        status='C' if hour == 11 else 'P',
+                    )
+
+    def setUp(self):
+        self.client.force_login(self.recepcionista)
+
+    def pages(self, **params):
+        """Recorre todas las páginas siguiendo next_cursor; devuelve los ids en orden."""
+        seen = []
+        while True:
+            response = self.client.get(reverse('panel_recepcion'), params)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(appointment.pk for appointment in response.context['upcoming'])
+            if not response.context['next_cursor']:
+                return seen
+            params['after'] = response.context['next_cursor']
+
+    @mock.patch('clinicapp.views.RECEPCION_PAGE_SIZE', 4)
+    def test_pages_have_no_duplicates_or_gaps(self):
+        expected = list(Appointment.objects.active().order_by('date', 'time', 'pk').values_list('pk', flat=True))
+        self.assertEqual(len(expected), 18)
+        self.assertEqual(self.pages(), expected)
+
+    @mock.patch('clinicapp.views.RECEPCION_PAGE_SIZE', 2)
+    def test_filter_combinations(self):
+        specialist = self.specialists[1]
+        cases = [
+            ({'specialist': specialist.pk}, Appointment.objects.filter(specialist=specialist)),
+            ({'service': self.masaje.pk, 'status': 'C'}, Appointment.objects.filter(service=self.masaje, status='C')),
+            ({'patient': 'ana', 'status': 'P'}, Appointment.objects.filter(patient=self.ana, status='P')),
+            (
+                {'specialist': specialist.pk, 'service': self.facial.pk, 'patient': 'Roberto'},
+                Appointment.objects.none(),
+            ),
+        ]
+        for params, queryset in cases:
+            with self.subTest(params=params):
+                expected = list(queryset.order_by('date', 'time', 'pk').values_list('pk', flat=True))
+                self.assertEqual(self.pages(**params), expected)
+
+    def test_invalid_cursor_redirects(self):
+        for cursor in ('basura', '2024-01-01_25:00:00_1', '2024-01-01_10:00:00_x'):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(reverse('panel_recepcion'), {'after': cursor})
+                self.assertRedirects(response, reverse('panel_recepcion'), fetch_redirect_response=False)
+
+    def test_cursor_keeps_microseconds(self):
+        appointment = Appointment(date=timezone.localdate(), time=time(10, 30, 0, 250), pk=7)
+        self.assertEqual(decode_cursor(encode_cursor(appointment)), (appointment.date, appointment.time, 7))
+
+
+# --- AVISOS (OUTBOX) ---
+class NotificationTests(ClinicFixtureMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.tomorrow = timezone.localdate() + timedelta(days=1)
+
+    def book(self, day, hour, status='P'):
+        appointment = Appointment(
+            patient=self.patient, service=self.service, specialist=self.specialist, date=day, time=time(hour),
+        )
+        appointment.reserve()
+        if status == 'C':
+            appointment.transition('confirm')
+        return appointment
+
+    def test_confirmation_is_queued_then_sent(self):
+        appointment = self.book(self.tomorrow, 10)
+        appointment.transition('confirm')
+        notification = Notification.objects.get(appointment=appointment)
+        self.assertEqual((notification.kind, notification.status), ('confirmation', 'P'))
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(send_pending(rate=1000), (1, 0))
+        self.assertEqual(mail.outbox[0].to, ['paciente@example.com'])
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, 'S')
+        call_command('send_notifications', '--rate', '1000', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_reminders_select_tomorrow_confirmed_once(self):
+        self.book(self.tomorrow, 10, 'C')
+        self.book(self.tomorrow, 12)
+        self.book(self.tomorrow + timedelta(days=1), 10, 'C')
+        with self.assertNumQueries(2):
+            self.assertEqual(queue_reminders(), 1)
+        call_command('queue_reminders', stdout=StringIO())
+        self.assertEqual(Notification.objects.filter(kind='reminder').count(), 1)
+
+    def test_failed_send_is_retried_later(self):
+        # Un puerto local sin servidor: la conexión SMTP se rechaza
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        self.book(self.tomorrow, 10, 'C')
+        with override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1', EMAIL_PORT=port, EMAIL_TIMEOUT=1,
+        ):
+            self.assertEqual(send_pending(rate=1000, max_attempts=2), (0, 1))
+        notification = Notification.objects.get()
+        self.assertEqual((notification.status, notification.attempts), ('P', 1))
+        self.assertGreater(notification.next_attempt_at, timezone.now())
+        self.assertIn('Error', notification.last_error)
+
+
+class BookingDuringSendBackend(BaseEmailBackend):
+    """Backend de correo de prueba: mientras "envía", otro hilo reserva una cita."""
+    booking = None
+    errors = []
+
+    def send_messages(self, messages):
+        def book():
+            try:
+                BookingDuringSendBackend.booking()
+            except Exception as exc:
+                BookingDuringSendBackend.errors.append(exc)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=book)
+        thread.start()
+        thread.join()
+        return len(messages)
+
+
+@override_settings(EMAIL_BACKEND='clinicapp.tests.BookingDuringSendBackend')
+class NotificationConcurrencyTests(TransactionTestCase):
+
+    def test_booking_while_sending(self):
+        patient, service, specialist = make_clinic()
+        day = timezone.localdate() + timedelta(days=1)
+        appointment = Appointment(patient=patient, service=service, specialist=specialist, date=day, time=time(10))
+        appointment.reserve()
+        appointment.transition('confirm')
+
+        BookingDuringSendBackend.errors = []
+        BookingDuringSendBackend.booking = Appointment(
+            patient=patient, service=service, specialist=specialist, date=day, time=time(14),
+        ).reserve
+        self.assertFalse(connection.in_atomic_block)
+        self.assertEqual(send_pending(rate=1000), (1, 0))
+        self.assertEqual(BookingDuringSendBackend.errors, [])
+        self.assertTrue(Appointment.objects.filter(time=time(14)).exists())
+        self.assertEqual(Notification.objects.get().status, 'S')
+
+
+# --- CACHÉ DE PÁGINAS PÚBLICAS ---
+class PublicPageCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        make_service()
+
+    def test_etag_and_not_modified(self):
+        response = self.client.get(reverse('services'))
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertIn('public', response['Cache-Control'])
+        response = self.client.get(reverse('services'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_cached_copy_is_served(self):
+        self.client.get(reverse('services'))
+        # Con la caché en memoria, servir la copia no toca la base
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('services')).status_code, 200)
+        # Un cambio hecho por fuera de las señales no se ve hasta invalidar: la vista no vuelve a correr
+        Service.objects.filter(name="Limpieza Facial").update(name="Peeling")
+        self.assertContains(self.client.get(reverse('services')), "Limpieza Facial")
+
+    def test_unread_query_params_share_the_cached_copy(self):
+        self.client.get(reverse('services'), {'utm_source': 'a'})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('services'), {'utm_source': 'b'}).status_code, 200)
+
+        # Los parámetros que la vista lee sí separan las copias
+        view = public_page_cache(query_params=('page',))(lambda request: HttpResponse(request.GET.get('page', '')))
+        factory = RequestFactory()
+        for page in ('1', '2', '1'):
+            request = factory.get('/', {'page': page, 'x': page})
+            request.user = AnonymousUser()
+            request._messages = CookieStorage(request)
+            self.assertEqual(view(request).content.decode(), page)
+
+    def test_editing_a_service_invalidates(self):
+        etag = self.client.get(reverse('services'))['ETag']
+        make_service("Peeling Químico", price=200)
+        response = self.client.get(reverse('services'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, "Peeling Químico")
+
+    def test_logged_in_users_skip_cache(self):
+        self.client.force_login(make_user('paciente'))
+        self.assertFalse(self.client.get(reverse('services')).has_header('ETag'))
+
+
+# --- HASHER DE CONTRASEÑAS CONFIGURABLE ---
+@override_settings(PASSWORD_HASHERS=['clinicapp.hashers.ClinicPBKDF2PasswordHasher'], CLINIC_PBKDF2_ITERATIONS=1000)
+class PasswordHasherTests(TestCase):
+
+    def test_cost_comes_from_settings(self):
+        self.assertEqual(ClinicPBKDF2PasswordHasher().iterations, 1000)
+        with override_settings(CLINIC_PBKDF2_ITERATIONS=None):
+            self.assertEqual(ClinicPBKDF2PasswordHasher().iterations, PBKDF2PasswordHasher.iterations)
+
+    def test_login_rehashes_with_new_cost(self):
+        user = make_user('paciente')
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+        with override_settings(CLINIC_PBKDF2_ITERATIONS=1200):
+            self.assertTrue(self.client.login(username='paciente', password=PASSWORD))
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1200$'))
+
+    def test_benchmark_login(self):
+        out = StringIO()
+        call_command('benchmark_login', '--hasher', 'pbkdf2:iterations=1000', '--logins', '3', stdout=out)
+        self.assertIn('pbkdf2_sha256:iterations=1000', out.getvalue())
+        for spec in ('md5', 'pbkdf2:rounds=4', 'pbkdf2:iterations=muchas'):
+            with self.subTest(spec=spec), self.assertRaises(CommandError):
+                call_command('benchmark_login', '--hasher', spec, stdout=StringIO())
+
+
+# --- GRUPOS CARGADOS UNA VEZ POR REQUEST ---
+class GroupNamesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(name='Recepcionista')
+        cls.user = make_user('recepcion')
+        cls.user.groups.add(cls.group)
+
+    def test_groups_are_queried_once(self):
+        user = User.objects.get(pk=self.user.pk)
+        template = Template(
+            "{% load clinicapp_tags %}{% is_in_group user 'Recepcionista' as rec %}"
+            "{% is_in_group user 'Estilista' as est %}{{ rec }}/{{ est }}"
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(get_group_names(user), frozenset({'Recepcionista'}))
+            self.assertTrue(is_in_group(user, 'Recepcionista'))
+            self.assertTrue(user.is_recepcionista())
+            self.assertEqual(template.render(Context({'user': user})), 'True/False')
+
+    def test_membership_change_reloads_groups(self):
+        user = User.objects.get(pk=self.user.pk)
+        self.assertIn('Recepcionista', get_group_names(user))
+        # La señal m2m_changed olvida los grupos cacheados de la instancia
+        user.groups.remove(self.group)
+        self.assertEqual(get_group_names(user), frozenset())
+        # Otra instancia del mismo usuario conserva su copia hasta limpiarla
+        other = User.objects.get(pk=self.user.pk)
+        get_group_names(other)
+        user.groups.add(self.group)
+        self.assertEqual(get_group_names(other), frozenset())
+        clear_group_names_cache(other)
+        self.assertEqual(get_group_names(other), frozenset({'Recepcionista'}))
+
+    def test_anonymous_user_needs_no_query(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(get_group_names(AnonymousUser()), frozenset())
+            self.assertFalse(is_in_group(AnonymousUser(), 'Recepcionista'))
+
+
+# --- ROLES EN LA SESIÓN ---
+class RoleClaimsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recepcionista = make_user('recepcion', 'Recepcionista')
+        cls.estilista = make_user('estilista', 'Estilista')
+        cls.specialist = make_specialist(user=cls.estilista)
+
+    def login(self, username):
+        return self.client.post(reverse('login'), {'username': username, 'password': PASSWORD})
+
+    def test_login_redirects_by_role(self):
+        self.assertRedirects(self.login('recepcion'), reverse('panel_recepcion'), fetch_redirect_response=False)
+        self.assertEqual(self.client.session['role_claims']['role'], 'Recepcionista')
+
+    def test_claims_include_specialist(self):
+        self.assertRedirects(self.login('estilista'), reverse('panel_estilista'), fetch_redirect_response=False)
+        self.assertEqual(self.client.session['role_claims']['specialist_id'], self.specialist.pk)
+
+    def test_role_required(self):
+        self.login('estilista')
+        self.assertRedirects(self.client.get(reverse('panel_recepcion')), reverse('home'), fetch_redirect_response=False)
+
+    def test_valid_claims_need_no_query(self):
+        self.login('recepcion')
+        self.client.get(reverse('panel_recepcion'))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('panel_recepcion'))
+        # Ni la sesión ni los grupos se leen de la base (la plantilla sí muestra al usuario)
+        self.assertFalse([q for q in queries if 'auth_group' in q['sql'] or 'django_session' in q['sql']])
+
+    def test_revocation_applies_immediately(self):
+        panel = reverse('panel_recepcion')
+        self.login('recepcion')
+        self.assertEqual(self.client.get(panel).status_code, 200)
+        group = Group.objects.get(name='Recepcionista')
+        group.user_set.remove(self.recepcionista)
+        self.assertRedirects(self.client.get(panel), reverse('home'), fetch_redirect_response=False)
+
+        self.recepcionista.groups.add(group)
+        self.assertEqual(self.client.get(panel).status_code, 200)
+        user = User.objects.get(pk=self.recepcionista.pk)
+        user.is_active = False
+        user.save()
+        self.assertRedirects(self.client.get(panel), f"{reverse('login')}?next={panel}", fetch_redirect_response=False)
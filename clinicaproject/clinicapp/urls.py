@@ -13,6 +13,12 @@ urlpatterns = [
     path('reservar/', views.reserve_appointment, name='reserve_appointment'), 
     path('mis-citas/', views.my_appointments, name='my_appointments'), 
     path('reservar/horas-disponibles/', views.get_available_times_view, name='get_available_times'),
+    path('reservar/calendario/', views.availability_calendar_view, name='availability_calendar'),
+    path('reservar/primeras-horas/', views.first_available_view, name='first_available'),
+    path('reservar/especialistas-por-servicio/', views.service_specialists_view, name='service_specialists'),
+    path('reservar/horas-disponibles/async/', views.get_available_times_async_view, name='get_available_times_async'),
+    path('mis-citas/<int:pk>/estado/', views.appointment_status_view, name='appointment_status'),
+    path('reservar/lista-espera/', views.join_waitlist_view, name='join_waitlist'),
     path('reserva/exitosa/', views.appointment_success, name='appointment_success'),
     path('mis-citas/modificar/<int:pk>/', views.modify_appointment_view, name='modify_appointment'),
     path('mis-citas/cancelar/<int:pk>/', views.cancel_appointment_view, name='cancel_appointment'),
@@ -22,9 +28,13 @@ urlpatterns = [
     # ¡ESTA LÍNEA ES LA QUE DEBISTE ELIMINAR O COMENTAR!
     path('recepcion/login/', views.recepcionista_login_view, name='recepcionista_login'),
     path('panel/recepcion/', views.panel_recepcion_view, name='panel_recepcion'),
+    path('panel/recepcion/acciones/', views.bulk_appointments_view, name='bulk_appointments'),
     path('panel/recepcion/confirmar/<int:pk>/', views.confirm_appointment_view, name='confirm_appointment'),
     path('panel/recepcion/modificar/<int:pk>/', views.modify_appointment_view, name='modify_appointment'), 
     path('panel/recepcion/cobrar/<int:pk>/', views.cobrar_cita_view, name='cobrar_cita'),
+    path('panel/recepcion/reportes/', views.reports_view, name='reports'),
+    path('panel/recepcion/exportar/', views.export_appointments_view, name='export_appointments'),
+    path('panel/eventos/', views.appointment_events_view, name='appointment_events'),
 
     # --- RUTAS DE ESTILISTA (REQUIEREN @estilista_required) ---
     path('panel/estilista/', views.panel_estilista_view, name='panel_estilista'),
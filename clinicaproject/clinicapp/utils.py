@@ -1,38 +1,35 @@
-from datetime import date
-from .models import Appointment
+from datetime import date, time
+from django.db.models import Q
+from .availability import aget_day_availability, get_day_availability
 
-# --- 1. LÓGICA DE TIEMPOS DISPONIBLES (PLACEHOLDER) ---
-def get_available_times(specialist_id, date_str):
+# --- 1. LÓGICA DE TIEMPOS DISPONIBLES ---
+def get_available_times(specialist_id, date_str, duration_minutes=None):
     """
     Función que calcula los horarios disponibles para un especialista en una fecha.
-    (Implementación real requeriría más lógica de horarios de apertura, etc.)
+    Delega en el motor de disponibilidad (availability.py), que representa el día
+    como un bitset de slots y devuelve las horas libres en formato 'HH:MM'.
+    Con duration_minutes solo devuelve las horas donde cabe la cita completa.
     """
-    
-    # Horarios de trabajo fijos (ejemplo)
-    ALL_TIMES = [f"{h:02d}:00" for h in range(9, 18)] # 09:00 a 17:00
-    
     try:
-        # Busca las citas ya reservadas para ese especialista y fecha
-        booked_appointments = Appointment.objects.filter(
-            specialist__id=specialist_id, 
-            date=date_str,
-            status__in=['P', 'C'] # Pendientes o Confirmadas
-        ).values_list('time', flat=True)
-        
-        # Convierte los objetos TimeField a cadenas 'HH:MM:SS' para la comparación
-        booked_times_str = [t.strftime('%H:%M:%S') for t in booked_appointments]
-        
-        # Filtra los horarios fijos
-        available_times = []
-        for time_str in ALL_TIMES:
-             # Compara solo la hora/minuto, que es suficiente para el slot
-            if f"{time_str}:00" not in booked_times_str:
-                available_times.append(time_str)
-
-        return available_times
-        
-    except Exception:
-        # En caso de error (ej. fecha mal formateada o especialista no encontrado)
+        day = date.fromisoformat(date_str) if isinstance(date_str, str) else date_str
+        availability = get_day_availability(specialist_id, day)
+        slots = availability.slots_for(duration_minutes) if duration_minutes else 1
+        return availability.free_slots(slots)
+
+    except (ValueError, TypeError):
+        # En caso de error (ej. fecha mal formateada o especialista inválido)
+        return []
+
+
+async def aget_available_times(specialist_id, date_str, duration_minutes=None):
+    """Versión asíncrona de get_available_times, para las vistas servidas por ASGI."""
+    try:
+        day = date.fromisoformat(date_str) if isinstance(date_str, str) else date_str
+        availability = await aget_day_availability(specialist_id, day)
+        slots = availability.slots_for(duration_minutes) if duration_minutes else 1
+        return availability.free_slots(slots)
+
+    except (ValueError, TypeError):
         return []
 
 
@@ -53,4 +50,51 @@ def calcular_descuento_cumpleaños(user):
         # Si el usuario no tiene perfil de paciente (ej. es Estilista/Recepcionista)
         pass
         
-    return 0.0 # 0% de descuento
\ No newline at end of file
+    return 0.0 # 0% de descuento
+
+
+# --- 3. PAGINACIÓN POR CLAVE (KEYSET) ---
+def encode_cursor(appointment):
+    """
+    Cursor opaco para la cita: 'YYYY-MM-DD_HH:MM:SS[.ffffff]_id'. La hora va
+    completa (isoformat), con microsegundos si los tiene, para no saltear filas.
+    """
+    return f"{appointment.date.isoformat()}_{appointment.time.isoformat()}_{appointment.pk}"
+
+
+def decode_cursor(cursor):
+    """Convierte el cursor en (fecha, hora, id). Lanza ValueError si es inválido."""
+    date_str, time_str, pk = cursor.split('_')
+    return date.fromisoformat(date_str), time.fromisoformat(time_str), int(pk)
+
+
+def keyset_page(queryset, after=None, page_size=50):
+    """
+    Devuelve (citas, cursor_siguiente) ordenando por (date, time, id).
+
+    En vez de OFFSET, continúa después de la última fila vista, así cada
+    página cuesta lo mismo sin importar qué tan lejos se avance.
+    """
+    queryset = queryset.order_by('date', 'time', 'pk')
+    if after:
+        after_date, after_time, after_pk = decode_cursor(after)
+        queryset = queryset.filter(
+            Q(date__gt=after_date)
+            | Q(date=after_date, time__gt=after_time)
+            | Q(date=after_date, time=after_time, pk__gt=after_pk)
+        )
+
+    rows = list(queryset[:page_size + 1])
+    next_cursor = encode_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
+
+
+def bounded_count(queryset, limit):
+    """
+    Cuenta como máximo `limit` filas. Devuelve (total, es_aproximado):
+    si hay más de `limit`, el total se informa como "más de limit".
+    """
+    total = queryset.order_by()[:limit + 1].count()
+    if total > limit:
+        return limit, True
+    return total, False
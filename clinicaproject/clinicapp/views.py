@@ -5,7 +5,10 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
 from django.utils import timezone
-from .decorators import recepcionista_required, estilista_required, admin_or_recepcionista_required
+from .decorators import (
+    recepcionista_required, estilista_required, admin_or_recepcionista_required, is_in_group, public_page_cache,
+    ROLE_HOME, ROLE_ESTILISTA, ROLE_RECEPCIONISTA, get_role_claims, set_role_claims,
+)
 
 # --- ASUMIENDO QUE ESTAS CLASES/FUNCIONES EXISTEN EN ARCHIVOS HERMANOS ---
 from .forms import (
@@ -29,6 +32,7 @@ def calcular_descuento_cumpleaños(user):
 
 # --- VISTAS PÚBLICAS Y DE AUTENTICACIÓN ---
 
+@public_page_cache
 def home(request):
     """Muestra la página de inicio."""
     return render(request, 'clinicapp/home.html', {
@@ -36,6 +40,7 @@ def home(request):
         'specialists': Specialist.objects.all()[:3]
     })
 
+@public_page_cache
 def services_view(request):
     """Muestra todos los tratamientos/servicios."""
     services = Service.objects.all()
@@ -59,13 +64,10 @@ def login_view(request):
     """
     Maneja el inicio de sesión y redirige al usuario al panel de su rol.
     """
-    # 1. Redirección si ya está autenticado
-    if request.user.is_authenticated:
-        if request.user.groups.filter(name='Recepcionista').exists():
-            return redirect('panel_recepcion')
-        if request.user.groups.filter(name='Estilista').exists():
-            return redirect('panel_estilista')
-        return redirect('my_appointments') # Pacientes
+    # 1. Redirección si ya está autenticado (según el rol guardado en la sesión)
+    claims = get_role_claims(request)
+    if claims is not None:
+        return redirect(ROLE_HOME[claims['role']])
 
     # 2. Procesar POST (intento de login)
     if request.method == 'POST':
@@ -75,14 +77,9 @@ def login_view(request):
             login(request, user)
             messages.success(request, f"Bienvenido, {user.username}.")
             
-            # LÓGICA DE REDIRECCIÓN POR ROL
-            if user.groups.filter(name='Recepcionista').exists():
-                return redirect('panel_recepcion')
-            
-            if user.groups.filter(name='Estilista').exists():
-                return redirect('panel_estilista')
-            
-            return redirect('my_appointments') # Si es solo un paciente
+            # LÓGICA DE REDIRECCIÓN POR ROL: los claims quedan en la sesión para los decoradores
+            claims = set_role_claims(request, user)
+            return redirect(ROLE_HOME[claims['role']])
 
         else:
             messages.error(request, "Usuario o contraseña inválidos.")
@@ -145,7 +142,7 @@ def get_available_times_view(request):
 
 def recepcionista_login_view(request):
     """Login específico para el personal de Recepción."""
-    if request.user.is_authenticated and request.user.groups.filter(name='Recepcionista').exists():
+    if request.user.is_authenticated and is_in_group(request.user, 'Recepcionista'):
          return redirect('panel_recepcion')
          
     if request.method == 'POST':
@@ -180,36 +177,6 @@ def panel_recepcion_view(request):
     }
     return render(request, 'clinicapp/panel_recepcion.html', context)
 
-@login_required
-@recepcionista_required
-def confirm_appointment_view(request, pk):
-    """Permite a la recepcionista confirmar (cambiar a 'C') una cita."""
-    cita = get_object_or_404(Appointment, pk=pk)
-    
-    if cita.status == 'P':
-        cita.status = 'C'
-        cita.save()
-        messages.success(request, f"Cita #{pk} CONFIRMADA con éxito para {cita.patient.get_full_name()}.")
-    else:
-        messages.warning(request, f"La Cita #{pk} ya estaba en estado '{cita.get_status_display()}'.")
-        
-    return redirect('panel_recepcion')
-
-@login_required
-@recepcionista_required
-def cancel_appointment_view(request, pk):
-    """Permite a la recepcionista cancelar (cambiar a 'X') una cita."""
-    cita = get_object_or_404(Appointment, pk=pk)
-    
-    if cita.status != 'X':
-        cita.status = 'X'
-        cita.save()
-        messages.success(request, f"Cita #{pk} CANCELADA con éxito para {cita.patient.get_full_name()}.")
-    else:
-        messages.warning(request, f"La Cita #{pk} ya estaba CANCELADA.")
-
-    return redirect('panel_recepcion')
-
 @login_required
 @recepcionista_required
 def modify_appointment_view(request, pk):
@@ -234,55 +201,6 @@ def modify_appointment_view(request, pk):
     }
     return render(request, 'clinicapp/modify_appointment.html', context)
 
-@login_required
-@recepcionista_required
-def cobrar_cita_view(request, pk):
-    """Maneja el proceso de cobro, calcula descuentos y finaliza la cita."""
-    
-    # 1. Obtener la cita
-    cita = get_object_or_404(Appointment.objects.select_related('patient', 'service'), pk=pk)
-    
-    if cita.is_paid:
-        messages.warning(request, f"La Cita #{cita.id} ya fue cobrada y completada.")
-        return redirect('panel_recepcion')
-
-    # 2. Lógica de cálculo de precios y descuentos
-    precio_base = cita.service.price
-    
-    try:
-        tasa_descuento = calcular_descuento_cumpleaños(cita.patient)
-        descuento_aplicado = (tasa_descuento > 0.0)
-    except Exception:
-        tasa_descuento = 0.0
-        descuento_aplicado = False
-        messages.warning(request, "Advertencia: No se pudo verificar el descuento (función auxiliar no disponible).")
-        
-    monto_descuento = precio_base * tasa_descuento
-    precio_final = precio_base - monto_descuento
-    
-    # 3. Procesar el formulario POST (Confirmación de pago)
-    if request.method == 'POST':
-        cita.is_paid = True
-        cita.final_price = precio_final
-        # Opcional: Cambiar estado a 'Finalizada' si tu modelo lo tiene.
-        cita.save()
-        
-        messages.success(request, f"Cobro de Cita #{cita.id} realizado. Total: ${precio_final:.2f}. Cita completada.")
-        return redirect('panel_recepcion')
-
-    # 4. Mostrar la plantilla
-    context = {
-        'cita': cita,
-        'paciente': cita.patient, 
-        'precio_base': precio_base,
-        'tasa_descuento': tasa_descuento * 100, # Para mostrar 20%
-        'monto_descuento': monto_descuento,
-        'precio_final': precio_final,
-        'descuento_aplicado': descuento_aplicado,
-    }
-    
-    return render(request, 'clinicapp/cobrar_cita.html', context)
-
 # --- VISTAS DE ESTILISTA ---
 
 @login_required
@@ -291,9 +209,8 @@ def panel_estilista_view(request):
     """Muestra las citas asignadas al especialista logueado."""
     
     # 1. Encontrar el perfil de Especialista 
-    try:
-        estilista = Specialist.objects.get(email=request.user.email)
-    except Specialist.DoesNotExist:
+    estilista = get_specialist_from_user(request.user)
+    if estilista is None:
         messages.error(request, "Tu cuenta no está vinculada a un perfil de Especialista. Contacta a un administrador.")
         return redirect('home')
         
@@ -321,10 +238,18 @@ from django.contrib.auth import login, logout
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
-from django.db import transaction
+from django.views.decorators.http import condition, require_POST
+from django.db import connection, transaction
+from django.db.models import Q, Value
+from django.db.models.functions import Concat
 from decimal import Decimal
+import json
+import time
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from datetime import date, timedelta
 
 # --- IMPORTACIONES DE ARCHIVOS LOCALES ---
 from .forms import (
@@ -332,10 +257,15 @@ from .forms import (
     AppointmentForm,
     RecepcionistaLoginForm,
     ModifyAppointmentForm,
+    WaitlistForm,
 )
-from .models import Service, Specialist, Appointment, PacienteProfile
+from .models import Service, Specialist, Appointment, PacienteProfile, get_capability_map
 from .decorators import recepcionista_required, estilista_required, is_in_group # Importamos is_in_group
-from .utils import get_available_times, calcular_descuento_cumpleaños # Funciones auxiliares
+from .utils import aget_available_times, get_available_times, calcular_descuento_cumpleaños, keyset_page, bounded_count # Funciones auxiliares
+from .availability import first_available_slots, get_availability_calendar
+from .reports import build_report
+from .exports import export_csv_lines
+from .events import get_broker
 
 
 # --- VISTAS PÚBLICAS Y DE AUTENTICACIÓN ---
@@ -352,18 +282,14 @@ def reserve_appointment(request):
         if form.is_valid():
             appointment = form.save(commit=False)
             appointment.patient = request.user
-            
-            # Validación de superposición (ya se hace en el formulario/utils, pero seguridad extra)
-            if Appointment.objects.filter(
-                specialist=appointment.specialist,
-                date=appointment.date,
-                time=appointment.time,
-                status__in=['P', 'C']
-            ).exists():
+
+            # Inserta directamente: la restricción única decide si el horario sigue libre
+            try:
+                appointment.reserve()
+            except Appointment.SlotTaken:
                 messages.error(request, "La hora seleccionada ya no está disponible.")
                 return redirect('reserve_appointment')
 
-            appointment.save()
             messages.success(request, "Cita reservada con éxito. Pendiente de confirmación.")
             return redirect('appointment_success')
         else:
@@ -373,11 +299,14 @@ def reserve_appointment(request):
                     messages.error(request, f"Error en {field}: {error}")
     else:
         form = AppointmentForm()
-        
+
+    version, capabilities = get_capability_map()
     context = {
         'form': form,
         'services': Service.objects.all(),
         'specialists': Specialist.objects.all(),
+        # Mapa servicio -> especialistas: el formulario filtra en el cliente sin más peticiones
+        'capabilities': {'version': version, 'services': capabilities},
     }
     return render(request, 'clinicapp/reserve_appointment.html', context)
 
@@ -386,12 +315,29 @@ def appointment_success(request):
     return render(request, 'clinicapp/appointment_success.html')
 
 
+@login_required
+def join_waitlist_view(request):
+    """
+    Inscribe al paciente en la lista de espera. Si se cancela una cita que le
+    sirve, el horario se le asigna automáticamente (ver waitlist.py).
+    """
+    if request.method == 'POST':
+        form = WaitlistForm(request.POST)
+        if form.is_valid():
+            entry = form.save(commit=False)
+            entry.patient = request.user
+            entry.save()
+            messages.success(request, "Quedó en la lista de espera. Le asignaremos el primer horario que se libere.")
+            return redirect('my_appointments')
+    else:
+        form = WaitlistForm()
+    return render(request, 'clinicapp/waitlist.html', {'form': form})
+
+
 @login_required
 def my_appointments(request):
     """Lista las citas del paciente logueado."""
-    appointments = Appointment.objects.filter(
-        patient=request.user
-    ).select_related('service', 'specialist').order_by('-date', '-time')
+    appointments = Appointment.objects.for_patient(request.user).select_related('service', 'specialist')
     
     context = {'appointments': appointments}
     return render(request, 'clinicapp/my_appointments.html', context)
@@ -407,10 +353,166 @@ def get_available_times_view(request):
     if not specialist_id or not date_str:
         return JsonResponse([], safe=False)
 
-    available_times = get_available_times(specialist_id, date_str)
+    # Con service_id solo se ofrecen horas donde cabe la duración del tratamiento
+    duration = service_duration(request.GET.get('service_id'))
+    available_times = get_available_times(specialist_id, date_str, duration)
     return JsonResponse(available_times, safe=False)
 
 
+def service_duration(service_id):
+    """Duración en minutos del servicio indicado, o None si no se indicó o no existe."""
+    if not service_id or not str(service_id).isdigit():
+        return None
+    return Service.objects.filter(pk=service_id).values_list('duration_minutes', flat=True).first()
+
+
+@condition(etag_func=lambda request: get_capability_map()[0])
+def service_specialists_view(request):
+    """
+    Vista JSON con el mapa completo servicio -> especialistas que lo realizan:
+    {'version': '...', 'services': {'<service_id>': [specialist_id, ...]}}.
+    La versión es también el ETag, así el cliente revalida con un 304.
+    """
+    version, capabilities = get_capability_map()
+    response = JsonResponse({'version': version, 'services': capabilities})
+    response['Cache-Control'] = 'public, no-cache'
+    return response
+
+
+# --- VISTAS ASÍNCRONAS (ASGI) ---
+# Endpoints JSON que los clientes consultan muy seguido (polling). Bajo
+# uvicorn/daphne cada espera a la base libera el worker para otras peticiones.
+# Bajo WSGI también funcionan, pero sin esa ventaja.
+async def aservice_duration(service_id):
+    """Versión asíncrona de service_duration."""
+    if not service_id or not str(service_id).isdigit():
+        return None
+    return await Service.objects.filter(pk=service_id).values_list('duration_minutes', flat=True).afirst()
+
+
+@login_required
+async def get_available_times_async_view(request):
+    """Horarios disponibles (igual que get_available_times_view), con ORM asíncrono."""
+    specialist_id = request.GET.get('specialist_id')
+    date_str = request.GET.get('date')
+
+    if not specialist_id or not date_str:
+        return JsonResponse([], safe=False)
+
+    duration = await aservice_duration(request.GET.get('service_id'))
+    available_times = await aget_available_times(specialist_id, date_str, duration)
+    return JsonResponse(available_times, safe=False)
+
+
+@login_required
+async def appointment_status_view(request, pk):
+    """Estado actual de una cita del paciente logueado (para refrescar 'Mis citas' sin recargar)."""
+    user = await request.auser()
+    appointment = await Appointment.objects.filter(pk=pk, patient=user).values(
+        'pk', 'status', 'is_paid', 'date', 'time'
+    ).afirst()
+    if appointment is None:
+        return JsonResponse({'error': "Cita no encontrada."}, status=404)
+
+    appointment['status_display'] = dict(Appointment.STATUS_CHOICES)[appointment['status']]
+    return JsonResponse(appointment)
+
+
+# Máximo de días que se pueden pedir en una sola llamada al calendario
+MAX_CALENDAR_DAYS = 31
+
+@login_required
+def availability_calendar_view(request):
+    """
+    Vista AJAX que retorna en una sola llamada las horas libres de uno o varios
+    especialistas para una semana o un mes.
+
+    Parámetros GET:
+      - specialist_id: uno o varios (repetido o separado por comas). Si falta, todos.
+      - start: fecha inicial 'YYYY-MM-DD' (por defecto hoy; nunca antes de hoy).
+      - days: cantidad de días (por defecto 7, máximo MAX_CALENDAR_DAYS).
+      - service_id: opcional; solo horas donde cabe la duración del servicio.
+    """
+    today = timezone.localdate()
+
+    try:
+        start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else today
+        days = int(request.GET.get('days', 7))
+        raw_ids = [v for value in request.GET.getlist('specialist_id') for v in value.split(',') if v]
+        requested_ids = [int(v) for v in raw_ids]
+    except ValueError:
+        return JsonResponse({'error': "Parámetros inválidos."}, status=400)
+
+    if days < 1 or days > MAX_CALENDAR_DAYS:
+        return JsonResponse({'error': f"El rango debe ser de 1 a {MAX_CALENDAR_DAYS} días."}, status=400)
+
+    start = max(start, today)
+    end = start + timedelta(days=days - 1)
+
+    specialists = Specialist.objects.all()
+    if requested_ids:
+        specialists = specialists.filter(pk__in=requested_ids)
+    specialist_ids = list(specialists.values_list('pk', flat=True))
+
+    calendar = get_availability_calendar(
+        specialist_ids, start, end, service_duration(request.GET.get('service_id'))
+    )
+    return JsonResponse({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'calendar': {str(pk): by_day for pk, by_day in calendar.items()},
+    })
+
+
+FIRST_AVAILABLE_DAYS = 14
+MAX_FIRST_AVAILABLE = 20
+
+@login_required
+def first_available_view(request):
+    """
+    Vista AJAX con las primeras horas libres para un servicio entre todos los
+    especialistas que lo realizan, para quien no tiene preferencia.
+
+    Parámetros GET:
+      - service_id: obligatorio.
+      - limit: cuántas horas devolver (por defecto 5, máximo MAX_FIRST_AVAILABLE).
+      - days: días a revisar desde hoy (por defecto FIRST_AVAILABLE_DAYS, máximo MAX_CALENDAR_DAYS).
+    """
+    try:
+        service_id = int(request.GET['service_id'])
+        limit = int(request.GET.get('limit', 5))
+        days = int(request.GET.get('days', FIRST_AVAILABLE_DAYS))
+    except (KeyError, ValueError):
+        return JsonResponse({'error': "Parámetros inválidos."}, status=400)
+
+    if not 1 <= limit <= MAX_FIRST_AVAILABLE or not 1 <= days <= MAX_CALENDAR_DAYS:
+        return JsonResponse({'error': "Parámetros fuera de rango."}, status=400)
+
+    duration = service_duration(service_id)
+    if duration is None:
+        return JsonResponse({'error': "Servicio no encontrado."}, status=404)
+
+    now = timezone.localtime()
+    specialist_ids = get_capability_map()[1].get(service_id, [])
+    found = first_available_slots(
+        specialist_ids, now.date(), now.date() + timedelta(days=days - 1), duration,
+        limit=limit, after=now.replace(tzinfo=None),
+    )
+
+    names = dict(
+        Specialist.objects.filter(pk__in={specialist_id for _, _, specialist_id in found}).annotate(
+            name=Concat('first_name', Value(' '), 'last_name'),
+        ).values_list('pk', 'name')
+    )
+    return JsonResponse({'slots': [
+        {
+            'date': day.isoformat(), 'time': t.strftime('%H:%M'),
+            'specialist_id': specialist_id, 'specialist': names[specialist_id],
+        }
+        for day, t, specialist_id in found
+    ]})
+
+
 # --- VISTAS DE RECEPCIONISTA ---
 
 # Nota: La función is_in_group ahora está en decorators.py y se importa.
@@ -427,6 +529,7 @@ def recepcionista_login_view(request):
             # VERIFICACIÓN DE GRUPO (Usando la función auxiliar is_in_group)
             if is_in_group(user, 'Recepcionista'):
                 login(request, user)
+                set_role_claims(request, user)
                 messages.success(request, f"Bienvenido, {user.username} (Recepcionista).")
                 return redirect('panel_recepcion')
             else:
@@ -470,43 +573,19 @@ def panel_recepcion_view(request):
 @recepcionista_required
 @transaction.atomic
 def confirm_appointment_view(request, pk):
-    """Confirma una cita y notifica al paciente."""
-    appointment = get_object_or_404(Appointment, pk=pk)
+    """Confirma una cita y encola el aviso al paciente (lo envía send_notifications)."""
+    appointment = get_object_or_404(Appointment.objects.select_related('patient'), pk=pk)
     
-    if appointment.status != 'P':
-        messages.warning(request, f"La cita #{pk} ya fue {appointment.get_status_display()}.")
-    else:
-        appointment.status = 'C' # 'C' = Confirmada
-        appointment.save()
+    if appointment.transition('confirm', actor=request.user):
         messages.success(request, f"Cita #{pk} con {appointment.patient.username} ha sido CONFIRMADA.")
+    else:
+        appointment.refresh_from_db(fields=['status'])
+        messages.warning(request, f"La cita #{pk} ya fue {appointment.get_status_display()}.")
         
     # Redirige al panel o a la página anterior
     return redirect('panel_recepcion')
 
 
-@login_required
-@recepcionista_required
-@transaction.atomic
-def cancel_appointment_view(request, pk):
-    """Cancela una cita."""
-    appointment = get_object_or_404(Appointment, pk=pk)
-
-    if appointment.status == 'X':
-        messages.warning(request, f"La cita #{pk} ya estaba cancelada.")
-    else:
-        appointment.status = 'X' # 'X' = Cancelada
-        appointment.save()
-        messages.success(request, f"Cita #{pk} con {appointment.patient.username} ha sido CANCELADA.")
-        
-    # Comprobación de origen (puede ser Recepcionista o Estilista)
-    if is_in_group(request.user, 'Recepcionista'):
-        return redirect('panel_recepcion')
-    elif is_in_group(request.user, 'Estilista'):
-        return redirect('panel_estilista')
-    
-    return redirect('my_appointments') # Fallback o si es un cliente
-
-
 @login_required
 @recepcionista_required
 @transaction.atomic
@@ -566,11 +645,10 @@ def cobrar_cita_view(request, pk):
             messages.error(request, "El monto no puede ser negativo.")
             return redirect('cobrar_cita', pk=pk)
             
-        # 1. Registrar el pago en la cita
-        appointment.final_price = final_price
-        appointment.is_paid = True
-        appointment.status = 'F' # Marcar como finalizada/pagada
-        appointment.save()
+        # 1. Registrar el pago en la cita (queda finalizada y pagada)
+        if not appointment.transition('pay', actor=request.user, final_price=final_price):
+            messages.warning(request, f"La cita #{pk} ya fue cobrada.")
+            return redirect('panel_recepcion')
         
         messages.success(request, f"Pago de ${final_price} registrado con éxito para la cita #{pk}.")
         return redirect('panel_recepcion')
@@ -611,10 +689,9 @@ def cobrar_cita_view(request, pk):
 def panel_estilista_view(request):
     """Muestra las citas asignadas al especialista logueado."""
     
-    # 1. Encontrar el perfil de Especialista (asumo que se vincula por email)
-    try:
-        estilista = Specialist.objects.get(email=request.user.email)
-    except Specialist.DoesNotExist:
+    # 1. Encontrar el perfil de Especialista vinculado al usuario
+    estilista = get_specialist_from_user(request.user)
+    if estilista is None:
         messages.error(request, "Tu cuenta no está vinculada a un perfil de Especialista. Contacta a un administrador.")
         return redirect('home')
         
@@ -638,32 +715,32 @@ def panel_estilista_view(request):
 @transaction.atomic
 def mark_attended_view(request, pk):
     """Permite al estilista marcar una cita como atendida (Finalizada)."""
-    appointment = get_object_or_404(Appointment, pk=pk)
+    appointment = get_object_or_404(Appointment.objects.select_related('patient'), pk=pk)
     
     # Seguridad extra: Solo permite marcar si la cita le pertenece
-    try:
-        estilista = Specialist.objects.get(email=request.user.email)
-        if appointment.specialist != estilista:
-             messages.error(request, "No tienes permiso para modificar esta cita.")
-             return redirect('panel_estilista')
-    except Specialist.DoesNotExist:
+    specialist_id = get_specialist_id(request)
+    if specialist_id is None:
         messages.error(request, "Error de perfil de especialista.")
         return redirect('home')
+    if appointment.specialist_id != specialist_id:
+        messages.error(request, "No tienes permiso para modificar esta cita.")
+        return redirect('panel_estilista')
         
-    if appointment.status == 'F':
-        messages.warning(request, f"La cita #{pk} ya fue marcada como Finalizada.")
-    elif appointment.status == 'X':
-        messages.warning(request, f"La cita #{pk} está Cancelada.")
-    else:
-        # La marca como finalizada. La recepcionista luego la marcará como pagada
-        appointment.status = 'F' 
-        appointment.save()
+    # La marca como finalizada. La recepcionista luego la marcará como pagada
+    if appointment.transition('attend', actor=request.user):
         messages.success(request, f"Cita #{pk} con {appointment.patient.username} marcada como ATENDIDA (Finalizada).")
+    else:
+        appointment.refresh_from_db(fields=['status'])
+        if appointment.status == 'X':
+            messages.warning(request, f"La cita #{pk} está Cancelada.")
+        else:
+            messages.warning(request, f"La cita #{pk} ya fue marcada como Finalizada.")
         
     return redirect('panel_estilista')
 # En clinicapp/views.py
 from .models import Specialist # Asegúrate de importar Specialist
 
+@public_page_cache
 def conoce_equipo(request):
     """Muestra la lista completa de especialistas."""
     context = {'specialists': Specialist.objects.all()}
@@ -695,7 +772,11 @@ def modify_appointment_view(request, pk):
         # ModifyAppointmentForm debe contener los campos necesarios para modificar la cita
         form = ModifyAppointmentForm(request.POST, instance=appointment)
         if form.is_valid():
-            form.save()
+            try:
+                form.save(commit=False).reserve()
+            except Appointment.SlotTaken:
+                messages.error(request, "El especialista ya tiene una cita reservada para esa hora. Por favor, seleccione otra.")
+                return redirect('modify_appointment', pk=pk)
             messages.success(request, f"Cita #{pk} modificada exitosamente.")
             
             # Redirigir al panel de recepción si fue un admin/recepcionista quien la modificó
@@ -719,28 +800,25 @@ def cancel_appointment_view(request, pk):
     Permite a un paciente cancelar su propia cita o a un Admin/Recepcionista cancelar cualquier cita.
     """
     if request.method == 'POST' or request.GET: # Permite GET para el botón simple de cancelar
-        appointment = get_object_or_404(Appointment, pk=pk)
+        appointment = get_object_or_404(Appointment.objects.select_related('patient'), pk=pk)
 
-        is_admin_or_recepcionista = request.user.is_superuser or request.user.is_staff or (hasattr(request.user, 'role') and request.user.role == 'reception')
+        claims = get_role_claims(request)
+        is_admin_or_recepcionista = claims['is_staff'] or claims['role'] == ROLE_RECEPCIONISTA
         
         # Comprobación de Propiedad o Rol
         if not is_admin_or_recepcionista and appointment.patient != request.user:
             messages.error(request, "No tiene permisos para cancelar esta cita.")
             return redirect('my_appointments')
 
-        # Comprobar estado: no se puede cancelar si ya está finalizada o cancelada
-        if appointment.status == 'F':
-            messages.warning(request, f"La cita #{pk} ya ha sido finalizada. No puede cancelarse.")
-            return redirect('panel_recepcion' if is_admin_or_recepcionista else 'my_appointments')
-        
-        if appointment.status == 'X':
-            messages.warning(request, f"La cita #{pk} ya estaba cancelada.")
-            return redirect('panel_recepcion' if is_admin_or_recepcionista else 'my_appointments')
-
-        # Cancelar la cita
-        appointment.status = 'X' # 'X' es el código para Cancelada en models.py
-        appointment.save()
-        messages.success(request, f"Cita #{pk} con {appointment.patient.username} ha sido CANCELADA.")
+        # Cancelar la cita: no se puede si ya está finalizada o cancelada
+        if appointment.transition('cancel', actor=request.user):
+            messages.success(request, f"Cita #{pk} con {appointment.patient.username} ha sido CANCELADA.")
+        else:
+            appointment.refresh_from_db(fields=['status'])
+            if appointment.status == 'F':
+                messages.warning(request, f"La cita #{pk} ya ha sido finalizada. No puede cancelarse.")
+            else:
+                messages.warning(request, f"La cita #{pk} ya estaba cancelada.")
 
         # Redirigir
         return redirect('panel_recepcion' if is_admin_or_recepcionista else 'my_appointments')
@@ -748,15 +826,25 @@ def cancel_appointment_view(request, pk):
     # Si se accede por otro método (ej. POST, pero no se requiere formulario), redirige
     return redirect('home')
 def get_specialist_from_user(user):
-    """Intenta mapear un usuario (asumiendo que es un Estilista) a un objeto Specialist por email."""
+    """Devuelve el Specialist vinculado al usuario (Specialist.user), o None."""
     if not user.is_authenticated:
         return None
     try:
-        # Busca un Specialist cuyo email coincida con el email del User
-        return Specialist.objects.get(email=user.email)
+        # Relación inversa uno a uno: Django la cachea en la instancia del usuario
+        return user.specialist_profile
     except Specialist.DoesNotExist:
         return None
 
+
+def get_specialist_id(request):
+    """
+    Devuelve el id del Specialist del usuario logueado, tomado de los claims
+    de la sesión: las acciones del estilista comparan por clave (specialist_id)
+    sin volver a consultar el perfil.
+    """
+    claims = get_role_claims(request)
+    return claims['specialist_id'] if claims else None
+
 # --- VISTA DEL ESTILISTA MODIFICADA ---
 @estilista_required
 def panel_estilista_view(request):
@@ -765,17 +853,15 @@ def panel_estilista_view(request):
     specialist_obj = get_specialist_from_user(request.user)
 
     if not specialist_obj:
-        messages.error(request, "No se encontró un Specialist asociado a su cuenta. Verifique su email en el Admin.")
+        messages.error(request, "No se encontró un Specialist asociado a su cuenta. Verifique el usuario vinculado en el Admin.")
         return redirect('home')
 
     today = timezone.now().date()
     
     # FILTRO: Citas de HOY, asignadas al Especialista logueado, y solo Pendientes o Confirmadas.
-    stylist_bookings = Appointment.objects.select_related('patient', 'service').filter(
-        specialist=specialist_obj,
-        date=today,
-        status__in=['P', 'C'] 
-    ).order_by('time')
+    stylist_bookings = Appointment.objects.for_specialist_day(
+        specialist_obj.pk, today
+    ).select_related('patient', 'service')
 
     context = {
         'bookings': stylist_bookings,
@@ -784,35 +870,256 @@ def panel_estilista_view(request):
     }
     return render(request, 'clinicapp/panel_estilista.html', context)
 
+# Tamaño de página del panel de recepción y tope del conteo exacto
+RECEPCION_PAGE_SIZE = 50
+RECEPCION_COUNT_LIMIT = 1000
+
+@login_required
+@recepcionista_required
 def panel_recepcion_view(request):
-    """Muestra el panel de recepción con todas las citas próximas o filtradas."""
-    
-    today = timezone.now().date()
-    filter_date_str = request.GET.get('date') # Permite filtrar por fecha
-    
-    # Base Query: Citas desde hoy en adelante, solo Pendientes o Confirmadas.
-    upcoming_appointments = Appointment.objects.select_related('patient', 'service', 'specialist').filter(
-        date__gte=today, 
-        status__in=['P', 'C'] 
+    """
+    Muestra el panel de recepción paginado por clave (date, time, id).
+
+    Filtros GET: date, specialist, service, status (por defecto Pendientes y
+    Confirmadas), patient (nombre o usuario). 'after' es el cursor de la página.
+    Con 'exact_count' se cuenta sin tope; si no, el conteo se corta en
+    RECEPCION_COUNT_LIMIT.
+    """
+    today = timezone.localdate()
+    filters = {key: request.GET.get(key, '').strip() for key in ('date', 'specialist', 'service', 'status', 'patient')}
+
+    citas = Appointment.objects.all()
+
+    # El filtro de estado se mantiene aunque se filtre por fecha
+    if filters['status'] in dict(Appointment.STATUS_CHOICES):
+        citas = citas.filter(status=filters['status'])
+    else:
+        citas = citas.active()
+
+    try:
+        if filters['date']:
+            citas = citas.filter(date=date.fromisoformat(filters['date']))
+        else:
+            citas = citas.filter(date__gte=today)
+        if filters['specialist']:
+            citas = citas.filter(specialist_id=int(filters['specialist']))
+        if filters['service']:
+            citas = citas.filter(service_id=int(filters['service']))
+    except ValueError:
+        messages.error(request, "Filtro inválido.")
+        return redirect('panel_recepcion')
+
+    if filters['patient']:
+        citas = citas.filter(
+            Q(patient__first_name__icontains=filters['patient'])
+            | Q(patient__last_name__icontains=filters['patient'])
+            | Q(patient__username__icontains=filters['patient'])
+        )
+
+    if request.GET.get('exact_count'):
+        total, total_is_approx = citas.count(), False
+    else:
+        total, total_is_approx = bounded_count(citas, RECEPCION_COUNT_LIMIT)
+
+    # El nombre del especialista se arma en la base de datos, no por fila en la plantilla
+    page = citas.select_related('patient', 'service').annotate(
+        specialist_name=Concat('specialist__first_name', Value(' '), 'specialist__last_name')
     )
-    
-    # Aplicar filtro por fecha si existe (sobrescribe la lógica por defecto si se usa el filtro)
-    if filter_date_str:
-        try:
-            filter_date = date.fromisoformat(filter_date_str)
-            upcoming_appointments = Appointment.objects.select_related('patient', 'service', 'specialist').filter(date=filter_date)
+    try:
+        upcoming, next_cursor = keyset_page(page, request.GET.get('after'), RECEPCION_PAGE_SIZE)
+    except ValueError:
+        messages.error(request, "Página inválida.")
+        return redirect('panel_recepcion')
 
-        except ValueError:
-            messages.error(request, "Formato de fecha inválido.")
-            return redirect('panel_recepcion')
+    # Filtros actuales sin el cursor, para armar los enlaces de paginación
+    query = request.GET.copy()
+    query.pop('after', None)
 
-    # Ordenar por fecha, hora y especialista
-    upcoming_appointments = upcoming_appointments.order_by('date', 'time', 'specialist__last_name')
-    
     context = {
-        'upcoming': upcoming_appointments,
+        'upcoming': upcoming,
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('after'),
+        'filters': filters,
+        'filter_query': query.urlencode(),
+        'total': total,
+        'total_is_approx': total_is_approx,
+        'specialists': Specialist.objects.only('first_name', 'last_name'),
+        'services': Service.objects.only('name'),
+        'status_choices': Appointment.STATUS_CHOICES,
     }
     return render(request, 'clinicapp/panel_recepcion.html', context)
+# Acciones masivas de recepción que son transiciones de Appointment.TRANSITIONS
+BULK_TRANSITIONS = ('confirm', 'cancel')
+
+@login_required
+@recepcionista_required
+@require_POST
+@transaction.atomic
+def bulk_appointments_view(request):
+    """
+    Confirma, cancela o reprograma varias citas en una sola transacción.
+
+    POST: action ('confirm', 'cancel' o 'reschedule'), ids (repetido) y,
+    para 'reschedule', date (nueva fecha; se conserva la hora de cada cita).
+    Responde JSON con el resultado por id si se pide 'application/json';
+    si no, resume el resultado en mensajes y vuelve al panel.
+    """
+    action = request.POST.get('action')
+    wants_json = 'application/json' in request.headers.get('Accept', '')
+
+    def fail(message):
+        if wants_json:
+            return JsonResponse({'error': message}, status=400)
+        messages.error(request, message)
+        return redirect('panel_recepcion')
+
+    try:
+        ids = sorted({int(pk) for pk in request.POST.getlist('ids')})
+    except ValueError:
+        return fail("Identificadores de cita inválidos.")
+    if not ids:
+        return fail("Seleccione al menos una cita.")
+
+    if action in BULK_TRANSITIONS:
+        rule = Appointment.TRANSITIONS[action]
+        outcomes = Appointment.objects.bulk_transition(
+            ids, rule['from'], rule['to'], actor=request.user, transition=action
+        )
+    elif action == 'reschedule':
+        try:
+            new_date = date.fromisoformat(request.POST.get('date', ''))
+        except ValueError:
+            return fail("Indique una fecha válida para reprogramar.")
+        if new_date < timezone.localdate():
+            return fail("La nueva fecha no puede ser en el pasado.")
+        outcomes = Appointment.objects.bulk_reschedule(ids, new_date)
+    else:
+        return fail("Acción no válida.")
+
+    if wants_json:
+        return JsonResponse({'action': action, 'results': {str(pk): result for pk, result in outcomes.items()}})
+
+    applied = [pk for pk, result in outcomes.items() if result == 'ok']
+    skipped = [pk for pk, result in outcomes.items() if result != 'ok']
+    if applied:
+        messages.success(request, f"{len(applied)} cita(s) actualizadas: " + ", ".join(f"#{pk}" for pk in applied))
+    if skipped:
+        messages.warning(request, "Sin cambios: " + ", ".join(f"#{pk} ({outcomes[pk]})" for pk in skipped))
+    return redirect('panel_recepcion')
+
+
+# Máximo de días por reporte
+MAX_REPORT_DAYS = 366
+
+@login_required
+@recepcionista_required
+def reports_view(request):
+    """
+    Reporte JSON de ingresos, ocupación, cancelaciones e inasistencias.
+    Parámetros GET: start y end ('YYYY-MM-DD'); por defecto, el mes en curso.
+    """
+    today = timezone.localdate()
+    try:
+        start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else today.replace(day=1)
+        end = date.fromisoformat(request.GET['end']) if request.GET.get('end') else today
+    except ValueError:
+        return JsonResponse({'error': "Fechas inválidas."}, status=400)
+
+    if end < start or (end - start).days >= MAX_REPORT_DAYS:
+        return JsonResponse({'error': f"El rango debe ser de 1 a {MAX_REPORT_DAYS} días."}, status=400)
+
+    return JsonResponse(build_report(start, end))
+
+
+@login_required
+@recepcionista_required
+def export_appointments_view(request):
+    """
+    Descarga en CSV las citas y pagos de un rango (start, end en GET).
+    La respuesta se envía en streaming a medida que se leen las filas.
+    """
+    try:
+        start = date.fromisoformat(request.GET.get('start', ''))
+        end = date.fromisoformat(request.GET.get('end', ''))
+    except ValueError:
+        messages.error(request, "Indique un rango de fechas válido para exportar.")
+        return redirect('panel_recepcion')
+    if end < start:
+        messages.error(request, "La fecha final no puede ser anterior a la inicial.")
+        return redirect('panel_recepcion')
+
+    response = StreamingHttpResponse(export_csv_lines(start, end), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="citas_{start.isoformat()}_{end.isoformat()}.csv"'
+    return response
+
+
+# --- FEED DE CAMBIOS EN TIEMPO REAL (SSE) ---
+# Segundos entre comentarios "ping" (mantienen viva la conexión en proxies)
+SSE_HEARTBEAT_SECONDS = 15
+# Tras este tiempo se cierra el stream y el navegador se reconecta solo
+# (con Last-Event-ID), así un worker WSGI no queda tomado indefinidamente.
+SSE_STREAM_SECONDS = 300
+
+
+def _sse_stream(subscription, accepts):
+    """Genera los mensajes SSE de la suscripción que pasan el filtro `accepts`."""
+    broker = get_broker()
+    # El stream no usa la base: se libera la conexión mientras el panel está abierto
+    connection.close()
+    deadline = time.monotonic() + SSE_STREAM_SECONDS
+    try:
+        yield "retry: 3000\n\n"
+        while time.monotonic() < deadline:
+            if subscription.overflowed:
+                yield "event: reload\ndata: {}\n\n"
+                return
+            event = subscription.get(timeout=SSE_HEARTBEAT_SECONDS)
+            if event is None:
+                yield ": ping\n\n"
+                continue
+            event_id, data = event
+            if accepts(data):
+                yield f"id: {event_id}\nevent: appointment\ndata: {json.dumps(data)}\n\n"
+    finally:
+        broker.unsubscribe(subscription)
+
+
+async def _asse_stream(stream):
+    """Adapta el generador para servidores ASGI sin bloquear el event loop."""
+    next_chunk = sync_to_async(next, thread_sensitive=False)
+    try:
+        while (chunk := await next_chunk(stream, None)) is not None:
+            yield chunk
+    finally:
+        stream.close()
+
+
+@login_required
+def appointment_events_view(request):
+    """
+    Stream SSE con los cambios de citas (creada, confirmada, cancelada, atendida,
+    cobrada...). Recepción recibe todos; el estilista solo los de su agenda de hoy.
+    """
+    claims = get_role_claims(request)
+    if claims['role'] == ROLE_RECEPCIONISTA:
+        accepts = lambda data: True
+    elif claims['role'] == ROLE_ESTILISTA and claims['specialist_id']:
+        specialist_id, today = claims['specialist_id'], timezone.localdate().isoformat()
+        accepts = lambda data: data['specialist_id'] == specialist_id and data['date'] == today
+    else:
+        return JsonResponse({'error': "Solo disponible para el personal."}, status=403)
+
+    subscription = get_broker().subscribe(request.headers.get('Last-Event-ID'))
+    stream = _sse_stream(subscription, accepts)
+    if isinstance(request, ASGIRequest):
+        stream = _asse_stream(stream)
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@public_page_cache
 def conoce_equipo_view(request):
     """Muestra la lista de especialistas."""
     # Obtiene todos los especialistas para mostrarlos en la plantilla
@@ -0,0 +1,68 @@
+from datetime import datetime
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .availability import is_slot_available
+from .models import Appointment, WaitlistEntry, performs_service
+
+# --- LISTA DE ESPERA: REASIGNACIÓN DE HORARIOS CANCELADOS ---
+# Al cancelarse una cita (signals.py, dentro de la misma transacción) se buscan
+# las inscripciones en espera para ese especialista (o para cualquiera) cuyo
+# rango incluye la fecha, por orden de llegada, con el índice
+# waitlist_status_spec_idx. La primera a la que le cabe el servicio en el
+# horario liberado recibe la cita (Pendiente, como una reserva normal).
+
+# Inscripciones que se revisan como máximo por horario liberado
+MAX_CANDIDATES = 20
+
+
+def candidates(specialist_id, day, exclude_patient_id=None):
+    """Inscripciones en espera que aceptan ese especialista y esa fecha, de la más antigua a la más nueva."""
+    entries = WaitlistEntry.objects.filter(
+        Q(specialist_id=specialist_id) | Q(specialist__isnull=True),
+        status='W', start_date__lte=day, end_date__gte=day,
+    )
+    if exclude_patient_id is not None:
+        entries = entries.exclude(patient_id=exclude_patient_id)
+    return entries.select_related('service').select_for_update(of=('self',)).order_by('created_at')[:MAX_CANDIDATES]
+
+
+def backfill_slot(specialist_id, day, t, exclude_patient_id=None):
+    """
+    Asigna el horario (especialista, fecha, hora) a la primera inscripción que
+    pueda tomarlo. Devuelve la cita creada, o None si nadie lo tomó.
+    """
+    now = timezone.localtime()
+    if datetime.combine(day, t) <= now.replace(tzinfo=None):
+        return None
+
+    for entry in candidates(specialist_id, day, exclude_patient_id):
+        if entry.specialist_id is None and not performs_service(specialist_id, entry.service_id):
+            continue
+        if not is_slot_available(specialist_id, day, t, entry.service.duration_minutes):
+            continue
+        appointment = Appointment(
+            patient_id=entry.patient_id, service=entry.service, specialist_id=specialist_id, date=day, time=t,
+        )
+        try:
+            appointment.reserve()
+        except Appointment.SlotTaken:
+            continue
+        entry.status = 'B'
+        entry.appointment = appointment
+        entry.save(update_fields=['status', 'appointment'])
+        return appointment
+    return None
+
+
+def backfill_cancelled(pks):
+    """Ofrece a la lista de espera los horarios de las citas canceladas dadas. Devuelve las citas creadas."""
+    booked = []
+    for specialist_id, day, t, patient_id in Appointment.objects.filter(pk__in=pks).values_list(
+        'specialist_id', 'date', 'time', 'patient_id',
+    ):
+        appointment = backfill_slot(specialist_id, day, t, exclude_patient_id=patient_id)
+        if appointment is not None:
+            booked.append(appointment)
+    return booked
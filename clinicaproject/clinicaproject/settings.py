@@ -76,12 +76,49 @@ WSGI_APPLICATION = 'clinicaproject.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Perfil elegido con CLINIC_DB_ENGINE:
+#   sqlite   (por defecto) clínica de un solo servidor. WAL deja leer mientras se
+#            escribe, busy_timeout espera al lock en vez de fallar, y las
+#            transacciones IMMEDIATE toman el lock de escritura al empezar.
+#   postgres varios workers de gunicorn. Conexiones persistentes (CONN_MAX_AGE)
+#            con health checks, o pool de psycopg 3 con CLINIC_DB_POOL=1.
+# Los tests corren igual contra ambos: CLINIC_DB_ENGINE=postgres python manage.py test
+CLINIC_DB_ENGINE = os.environ.get('CLINIC_DB_ENGINE', 'sqlite')
+
+if CLINIC_DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('CLINIC_DB_NAME', 'clinica'),
+            'USER': os.environ.get('CLINIC_DB_USER', 'clinica'),
+            'PASSWORD': os.environ.get('CLINIC_DB_PASSWORD', ''),
+            'HOST': os.environ.get('CLINIC_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('CLINIC_DB_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get('CLINIC_DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if os.environ.get('CLINIC_DB_POOL') == '1':
+        # El pool reemplaza a las conexiones persistentes (Django exige CONN_MAX_AGE = 0)
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('CLINIC_DB_POOL_MIN', 2)),
+            'max_size': int(os.environ.get('CLINIC_DB_POOL_MAX', 10)),
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('CLINIC_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # busy_timeout, en segundos
+                'timeout': int(os.environ.get('CLINIC_DB_BUSY_TIMEOUT', 20)),
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            },
+        }
     }
-}
 
 
 # Password validation
@@ -102,6 +139,97 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# --- HASH DE CONTRASEÑAS ---
+# Algoritmo preferido (pbkdf2, argon2 o bcrypt) y su costo, por variables de entorno.
+# argon2 requiere 'argon2-cffi' y bcrypt requiere 'bcrypt'. Los demás hashers quedan
+# en la lista para verificar contraseñas antiguas, que se rehashean al iniciar sesión.
+# Para elegir el costo: python manage.py benchmark_login
+CLINIC_PASSWORD_HASHER = os.environ.get('CLINIC_PASSWORD_HASHER', 'pbkdf2')
+CLINIC_PBKDF2_ITERATIONS = int(os.environ.get('CLINIC_PBKDF2_ITERATIONS', 0)) or None
+CLINIC_ARGON2_TIME_COST = int(os.environ.get('CLINIC_ARGON2_TIME_COST', 0)) or None
+CLINIC_ARGON2_MEMORY_COST = int(os.environ.get('CLINIC_ARGON2_MEMORY_COST', 0)) or None
+CLINIC_ARGON2_PARALLELISM = int(os.environ.get('CLINIC_ARGON2_PARALLELISM', 0)) or None
+CLINIC_BCRYPT_ROUNDS = int(os.environ.get('CLINIC_BCRYPT_ROUNDS', 0)) or None
+
+_CLINIC_HASHERS = {
+    'pbkdf2': 'clinicapp.hashers.ClinicPBKDF2PasswordHasher',
+    'argon2': 'clinicapp.hashers.ClinicArgon2PasswordHasher',
+    'bcrypt': 'clinicapp.hashers.ClinicBCryptSHA256PasswordHasher',
+}
+PASSWORD_HASHERS = [_CLINIC_HASHERS[CLINIC_PASSWORD_HASHER]] + [
+    path for name, path in _CLINIC_HASHERS.items() if name != CLINIC_PASSWORD_HASHER
+] + [
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+
+# --- CACHÉ COMPARTIDA ---
+# Las páginas públicas, el mapa servicio -> especialistas y las sesiones
+# cached_db se invalidan desde signals.py en el proceso que guarda el cambio:
+# la caché tiene que ser compartida por todos los workers, o los demás seguirían
+# sirviendo datos viejos (ej. el formulario de reserva aceptaría o rechazaría
+# especialistas según un mapa desactualizado). Además debe vivir en memoria: una
+# página pública servida desde la caché no debe costar consultas a la base.
+# CLINIC_CACHE elige el backend:
+#   redis (por defecto si hay CLINIC_REDIS_URL): Redis compartido (requiere el paquete redis).
+#   locmem (por defecto sin CLINIC_REDIS_URL): memoria del proceso; solo sirve con un
+#     único proceso (desarrollo, tests).
+#   db: tabla de la base, solo si no hay Redis. Crearla al desplegar con
+#     python manage.py createcachetable
+CLINIC_REDIS_URL = os.environ.get('CLINIC_REDIS_URL', '')
+CLINIC_CACHE = os.environ.get('CLINIC_CACHE', 'redis' if CLINIC_REDIS_URL else 'locmem')
+_CLINIC_CACHES = {
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CLINIC_REDIS_URL or 'redis://localhost:6379/0',
+    },
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'clinicapp_cache',
+    },
+}
+CACHES = {'default': _CLINIC_CACHES[CLINIC_CACHE]}
+
+
+# --- SESIONES ---
+# cached_db (por defecto): la sesión se lee de la caché y solo se escribe en la base.
+#   Con Redis (o locmem) leer la sesión y los claims de rol no consulta la base;
+#   con CLINIC_CACHE=db cada request lee la tabla de la caché.
+# signed_cookies: la sesión viaja firmada en la cookie, sin consultas (no cifrada).
+CLINIC_SESSION_BACKEND = os.environ.get('CLINIC_SESSION_BACKEND', 'cached_db')
+SESSION_ENGINE = f'django.contrib.sessions.backends.{CLINIC_SESSION_BACKEND}'
+
+# Registrar cada transición de estado de las citas en AppointmentAudit
+CLINIC_APPOINTMENT_AUDIT = os.environ.get('CLINIC_APPOINTMENT_AUDIT', '1') == '1'
+
+# Segundos que valen los claims de rol guardados en la sesión antes de revalidarse
+CLINIC_ROLE_CLAIMS_MAX_AGE = int(os.environ.get('CLINIC_ROLE_CLAIMS_MAX_AGE', 120))
+
+# Semanas hacia adelante de disponibilidad precalculada (manage.py refresh_availability la avanza)
+CLINIC_AVAILABILITY_WEEKS = int(os.environ.get('CLINIC_AVAILABILITY_WEEKS', 8))
+
+
+# --- CORREO Y AVISOS ---
+# Los avisos se envían con manage.py send_notifications (nunca dentro de una vista).
+# Por defecto se muestran en consola. Para probar con un SMTP local:
+#   python -m aiosmtpd -n -l localhost:1025
+#   CLINIC_EMAIL_BACKEND=django.core.mail.backends.smtp.EmailBackend CLINIC_EMAIL_PORT=1025
+EMAIL_BACKEND = os.environ.get('CLINIC_EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = os.environ.get('CLINIC_EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('CLINIC_EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.environ.get('CLINIC_EMAIL_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('CLINIC_EMAIL_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('CLINIC_EMAIL_TLS') == '1'
+EMAIL_TIMEOUT = int(os.environ.get('CLINIC_EMAIL_TIMEOUT', 10))
+DEFAULT_FROM_EMAIL = os.environ.get('CLINIC_FROM_EMAIL', 'Clínica Estética <no-responder@clinica.local>')
+
+# Intentos por aviso antes de marcarlo Fallido, y avisos por segundo como máximo
+CLINIC_NOTIFICATION_MAX_ATTEMPTS = int(os.environ.get('CLINIC_NOTIFICATION_MAX_ATTEMPTS', 5))
+CLINIC_NOTIFICATION_RATE = float(os.environ.get('CLINIC_NOTIFICATION_RATE', 10))
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/